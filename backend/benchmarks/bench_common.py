@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the backend benchmark scripts
+"""
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+UTILS_DIR = BACKEND_DIR / "utils"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def add_utils_to_path():
+    """Make the flat backend/utils imports work from the benchmarks directory"""
+    for path in (str(UTILS_DIR), str(BACKEND_DIR)):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def time_call(fn, repeat=5, warmup=1):
+    """
+    Time a callable
+
+    Returns:
+        Dict with the min/median/max wall time in milliseconds
+    """
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'min_ms': min(timings),
+        'median_ms': statistics.median(timings),
+        'max_ms': max(timings)
+    }
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """
+    Nearest-rank percentiles of a list of measurements
+
+    Returns:
+        Dict like {'p50': ..., 'p95': ..., 'p99': ...}
+    """
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        rank = max(1, -(-point * len(ordered) // 100))
+        result[f'p{point}'] = ordered[rank - 1]
+    return result
+
+
+def write_results(name, results):
+    """Write benchmark results to results/<name>.json and return the path"""
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    path = RESULTS_DIR / f"{name}.json"
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Payload size and encode time of each response encoding
+
+Builds geographical-data and batch-prediction shaped payloads at several
+sizes and measures every serializer available in response_encoding, with
+and without compression.
+
+Usage:
+    python benchmarks/bench_encoding.py [--sizes 300,5000,50000] [--repeat 5]
+"""
+import argparse
+import gzip
+import json
+import random
+
+from bench_common import add_utils_to_path, time_call, write_results
+
+add_utils_to_path()
+
+import response_encoding  # noqa: E402
+
+
+def make_geo_payload(n_rows, seed=42):
+    """Payload shaped like /api/geographical-data"""
+    rng = random.Random(seed)
+    levels = ['Low', 'Medium', 'High', 'Extreme']
+    rows = [{
+        'lat': rng.uniform(-60, 70),
+        'lon': rng.uniform(-180, 180),
+        'fire_occurred': rng.random() < 0.5,
+        'fire_weather_index': rng.gauss(15, 10),
+        'temperature': rng.gauss(25, 8),
+        'humidity': rng.uniform(10, 90),
+        'wind_speed': rng.gammavariate(2, 8),
+        'frp': rng.expovariate(1 / 20),
+        'risk_level': rng.choice(levels),
+        'fire_probability': rng.random()
+    } for _ in range(n_rows)]
+    return {'success': True, 'data': rows, 'count': n_rows, 'source': 'real_data'}
+
+
+def make_batch_payload(n_rows, seed=42):
+    """Payload shaped like /predict/batch"""
+    rng = random.Random(seed)
+    levels = ['Low', 'Medium', 'High', 'Extreme']
+    predictions = []
+    for i in range(n_rows):
+        probability = rng.random()
+        predictions.append({
+            'fire_risk': levels[min(int(probability * 4), 3)],
+            'probability': probability,
+            'prediction': int(probability > 0.5),
+            'confidence': abs(probability - 0.5) + 0.5,
+            'model_used': 'SimpleLogisticRegression',
+            'input_processed': True,
+            'index': i
+        })
+    return {'predictions': predictions, 'total_processed': n_rows}
+
+
+def serializers():
+    """Available serializers as name -> callable"""
+    available = {
+        'json_stdlib_indent': lambda p: json.dumps(p, indent=2).encode('utf-8'),
+        'json_stdlib': lambda p: json.dumps(p, separators=(',', ':')).encode('utf-8'),
+    }
+    if response_encoding.orjson is not None:
+        available['orjson'] = response_encoding.dumps_json
+    if response_encoding.is_installed('msgpack'):
+        available['msgpack'] = response_encoding.dumps_msgpack
+    if response_encoding.is_installed('pyarrow'):
+        available['arrow_ipc'] = response_encoding.dumps_arrow
+    return available
+
+
+def compressors():
+    """Available compressors as name -> callable"""
+    available = {
+        'identity': lambda body: body,
+        'gzip': lambda body: gzip.compress(body, compresslevel=response_encoding.GZIP_LEVEL),
+    }
+    if response_encoding.is_installed('brotli'):
+        brotli = response_encoding.optional_module('brotli')
+        available['br'] = lambda body: brotli.compress(body, quality=response_encoding.BROTLI_QUALITY)
+    return available
+
+
+def run(sizes, repeat):
+    results = []
+    for payload_name, factory in (('geographical', make_geo_payload), ('batch', make_batch_payload)):
+        for n_rows in sizes:
+            payload = factory(n_rows)
+            for ser_name, serialize in serializers().items():
+                body = serialize(payload)
+                encode = time_call(lambda: serialize(payload), repeat=repeat)
+                for comp_name, compress_body in compressors().items():
+                    compressed = compress_body(body)
+                    compress_timing = time_call(lambda: compress_body(body), repeat=repeat)
+                    results.append({
+                        'payload': payload_name,
+                        'rows': n_rows,
+                        'format': ser_name,
+                        'compression': comp_name,
+                        'bytes': len(compressed),
+                        'encode_ms': encode['median_ms'],
+                        'compress_ms': compress_timing['median_ms'],
+                        'total_ms': encode['median_ms'] + compress_timing['median_ms']
+                    })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', default='300,5000,50000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = run(sizes, args.repeat)
+
+    print(f"{'payload':<13}{'rows':>8}  {'format':<19}{'compression':<12}{'bytes':>12}{'total ms':>10}")
+    for r in results:
+        print(f"{r['payload']:<13}{r['rows']:>8}  {r['format']:<19}{r['compression']:<12}"
+              f"{r['bytes']:>12}{r['total_ms']:>10.2f}")
+
+    path = write_results('encoding', results)
+    print(f"\n💾 Results written to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Memory profile of the API routes and training/scoring CLIs with budgets
+
+Each case (a route or CLI entry point at one input size) runs in fresh
+interpreters, so figures are not inflated by earlier cases: once untraced
+for RSS and once under tracemalloc, whose bookkeeping takes memory of its
+own. The app, the synthetic inputs and the scored dataset are set up first;
+then the case runs once, cold, and records:
+  - peak_mb        highest traced Python/NumPy allocation during the case
+  - retained_mb    traced allocations still held once the response or
+                   result is dropped (caches, leaks)
+  - rss_peak_mb    process high-water RSS, which is what the OOM killer sees
+  - rss_growth_mb  RSS after the case minus RSS before it
+  - top_sites      source lines holding the most memory in the largest
+                   snapshot taken while the case ran (sampled as traced
+                   memory grows, so close to the peak)
+
+Cases are compared against memory_budget.json, keyed "<case>.<size>" or
+just "<case>" for every size; the script exits non-zero when a budget is
+exceeded.
+
+Usage:
+    python benchmarks/bench_memory.py [--only predict_batch,analytics] [--top 5]
+    python benchmarks/bench_memory.py --list
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from bench_common import BACKEND_DIR, add_utils_to_path, write_results
+
+DEFAULT_BUDGET = Path(__file__).resolve().parent / "memory_budget.json"
+MB = 1024 * 1024
+# Frames kept per traced allocation
+TRACE_FRAMES = 10
+# Dataset sizes of the analytics and dataset scoring cases
+DATASET_ROWS = (100000, 1000000)
+
+# Grid requests cover California; the resolution sets the cell count
+GRID_BBOX = [-125.0, 32.0, -114.0, 42.0]
+
+BUDGET_METRICS = ('peak_mb', 'retained_mb', 'rss_peak_mb')
+
+
+def quiet():
+    """Keep the app's start-up and training prints off the JSON output"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def app_client(max_batch_size=100000):
+    from bench_suite import load_app
+    os.environ.setdefault('PYROCAST_JOB_DIR', tempfile.mkdtemp(prefix='pyrocast-jobs-'))
+    return load_app(max_batch_size).test_client()
+
+
+def scored_dataset(client, n_rows):
+    """Swap in a synthetic dataset and score it before the measurement"""
+    from bench_suite import check_ok
+    import utils.app as app_module
+
+    # Loads the data service and starts the scoring job
+    check_ok(client.get('/api/risk-scoring/status'))
+    from data_service import data_service, generate_mock_frame
+
+    data_service.use_dataframe(generate_mock_frame(n_rows))
+    app_module.get_risk_scoring_job().run()
+    return data_service
+
+
+def mock_records(n_rows, features=None):
+    from data_service import generate_mock_frame
+    frame = generate_mock_frame(n_rows, seed=7)
+    return frame[features].to_dict('records') if features else frame.to_dict('records')
+
+
+# Each case takes the input size, does its set-up and returns the callable
+# that is measured
+
+def case_predict(n_requests):
+    from bench_suite import check_ok
+    client = app_client()
+
+    def run():
+        # Distinct conditions, so the prediction cache fills up as in service
+        return [check_ok(client.post('/predict', json={
+            "temperature": 20 + i * 0.01, "humidity": 28.3, "wind_speed": 15.7
+        })) for i in range(n_requests)]
+    return run
+
+
+def case_predict_batch(n_rows):
+    from bench_suite import check_ok
+    from simple_model import KEY_FEATURES
+    client = app_client(max_batch_size=n_rows)
+    payload = {'data': mock_records(n_rows, KEY_FEATURES)}
+    return lambda: check_ok(client.post('/predict/batch', json=payload))
+
+
+def case_predict_sweep(n_cells):
+    from bench_suite import check_ok
+    client = app_client()
+    side = max(1, int(round(n_cells ** 0.5)))
+    payload = {
+        'base': {"temperature": 30, "humidity": 30, "wind_speed": 15},
+        'sweep': [
+            {'feature': 'temperature', 'values': [10 + 40 * i / side for i in range(side)]},
+            {'feature': 'humidity', 'values': [5 + 90 * i / side for i in range(side)]}
+        ]
+    }
+    return lambda: check_ok(client.post('/predict/sweep', json=payload))
+
+
+def case_predict_grid(n_cells):
+    from bench_suite import check_ok
+    client = app_client()
+    width, height = GRID_BBOX[2] - GRID_BBOX[0], GRID_BBOX[3] - GRID_BBOX[1]
+    payload = {
+        'bbox': GRID_BBOX,
+        'resolution': (width * height / n_cells) ** 0.5,
+        'inputs': {"temperature": 30, "humidity": 25, "wind_speed": 20}
+    }
+    return lambda: check_ok(client.post('/predict/grid', json=payload))
+
+
+def case_jobs(n_rows):
+    from bench_suite import check_ok
+    from simple_model import KEY_FEATURES
+    client = app_client()
+    payload = {'data': mock_records(n_rows, KEY_FEATURES)}
+
+    def run():
+        job = client.post('/jobs', json=payload).get_json()
+        while True:
+            status = check_ok(client.get(job['status_url'])).get_json()['data']['status']
+            if status not in ('queued', 'running'):
+                break
+            time.sleep(0.05)
+        return check_ok(client.get(job['results_url'])).get_data()
+    return run
+
+
+def analytics_case(path):
+    def case(n_rows):
+        from bench_suite import check_ok
+        client = app_client()
+        scored_dataset(client, n_rows)
+        return lambda: check_ok(client.get(path))
+    return case
+
+
+def case_train(n_rows):
+    from simple_model import train_model
+    records = mock_records(n_rows)
+
+    def run():
+        with quiet():
+            return train_model(records, epochs=5)
+    return run
+
+
+def case_score_dataset(n_rows):
+    from data_service import data_service, generate_mock_frame
+    from risk_scoring import RiskScoringJob
+    from simple_predict import SimpleWildfirePredictionService
+
+    with quiet():
+        job = RiskScoringJob(data_service, SimpleWildfirePredictionService())
+    data_service.use_dataframe(generate_mock_frame(n_rows))
+    return lambda: job.run(force=True)
+
+
+def case_neighbor_index(n_rows):
+    from data_service import generate_mock_frame
+    from neighbors import NeighborIndex
+    frame = generate_mock_frame(n_rows, seed=3)
+
+    def run():
+        index = NeighborIndex.from_frame(frame)
+        return index, index.query_self()
+    return run
+
+
+CASES = {
+    'predict': (case_predict, (1, 1000)),
+    'predict_batch': (case_predict_batch, (1000, 10000, 50000)),
+    'predict_sweep': (case_predict_sweep, (100, 40000)),
+    'predict_grid': (case_predict_grid, (100000, 1000000)),
+    'jobs': (case_jobs, (1000, 10000)),
+    'analytics.dataset_stats': (analytics_case('/api/dataset-stats'), DATASET_ROWS),
+    'analytics.correlations': (analytics_case('/api/correlations'), DATASET_ROWS),
+    'analytics.geographical_data': (analytics_case('/api/geographical-data'), DATASET_ROWS),
+    'analytics.outlier_analysis': (analytics_case('/api/outlier-analysis'), DATASET_ROWS),
+    'analytics.feature_distributions': (analytics_case('/api/feature-distributions'), DATASET_ROWS),
+    'analytics.risk_distribution': (analytics_case('/api/risk-distribution'), DATASET_ROWS),
+    'analytics.historical_trends': (analytics_case('/api/historical-trends'), DATASET_ROWS),
+    'analytics.dashboard': (analytics_case('/api/dashboard'), DATASET_ROWS),
+    'cli.train': (case_train, (1000, 10000)),
+    'cli.score_dataset': (case_score_dataset, DATASET_ROWS),
+    'cli.neighbor_index': (case_neighbor_index, DATASET_ROWS),
+}
+
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return peak_rss()
+
+
+def peak_rss():
+    """High-water RSS of this process in bytes"""
+    import resource
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def top_sites(snapshot, limit):
+    """Source lines with the most traced memory, outside the import system"""
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ))
+    sites = []
+    for stat in snapshot.statistics('lineno')[:limit]:
+        frame = stat.traceback[0]
+        sites.append({
+            'site': f"{frame.filename}:{frame.lineno}",
+            'size_mb': stat.size / MB,
+            'count': stat.count
+        })
+    return sites
+
+
+class PeakSampler:
+    """
+    Snapshots traced memory whenever it grows past the largest snapshot so
+    far, so the allocation sites can be reported near the peak rather than
+    only for what is left when the case returns
+    """
+
+    def __init__(self, interval=0.005, growth=1.1):
+        self.interval = interval
+        self.growth = growth
+        self.snapshot = None
+        self.snapshot_size = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="peak-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        current, _ = tracemalloc.get_traced_memory()
+        if current > max(self.snapshot_size * self.growth, MB):
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_size = current
+
+
+def measure_rss(run):
+    """Run a case once untraced and collect its RSS figures"""
+    gc.collect()
+    rss_before = current_rss()
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    return {
+        'seconds': seconds,
+        'rss_peak_mb': peak_rss() / MB,
+        'rss_growth_mb': (current_rss() - rss_before) / MB
+    }
+
+
+def measure_traced(run, top):
+    """Run a case once under tracemalloc and collect its allocation figures"""
+    gc.collect()
+    tracemalloc.start(TRACE_FRAMES)
+    with PeakSampler() as sampler:
+        result = run()
+    _, peak = tracemalloc.get_traced_memory()
+
+    del result
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'peak_mb': peak / MB,
+        'retained_mb': retained / MB,
+        'sites_snapshot_mb': sampler.snapshot_size / MB,
+        'top_sites': top_sites(sampler.snapshot, top) if sampler.snapshot else []
+    }
+
+
+def run_child(name, size, top, traced):
+    """Set up and measure one case in this interpreter"""
+    add_utils_to_path()
+    os.chdir(BACKEND_DIR)
+    setup, _ = CASES[name]
+    with quiet():
+        run = setup(size)
+    print(json.dumps(measure_traced(run, top) if traced else measure_rss(run)))
+
+
+def run_child_process(name, size, top, traced):
+    command = [sys.executable, __file__, '--child', name, '--size', str(size), '--top', str(top)]
+    if traced:
+        command.append('--traced')
+    output = subprocess.run(command, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"{name}.{size} failed:\n{output.stderr[-2000:]}")
+    # Background threads may log after the measurement; it is the last JSON line
+    lines = [line for line in output.stdout.splitlines() if line.startswith('{')]
+    return json.loads(lines[-1])
+
+
+def run_case(name, size, top):
+    """
+    Measure a case in two fresh interpreters: one untraced for RSS, since
+    tracemalloc and the snapshots add memory of their own, and one traced
+    """
+    result = run_child_process(name, size, top, traced=False)
+    result.update(run_child_process(name, size, top, traced=True))
+    return result
+
+
+def case_budget(budget, key, name):
+    entry = dict(budget.get('default', {}))
+    entry.update(budget.get(name, {}))
+    entry.update(budget.get(key, {}))
+    return entry
+
+
+def selected_cases(only):
+    if not only:
+        return list(CASES)
+    prefixes = [prefix for prefix in only.split(',') if prefix]
+    names = [name for name in CASES if any(name.startswith(prefix) for prefix in prefixes)]
+    if not names:
+        raise SystemExit(f"❌ No case matches {only}")
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--only', default='', help="Comma-separated case name prefixes")
+    parser.add_argument('--sizes', default='', help="Override the input sizes of the selected cases")
+    parser.add_argument('--top', type=int, default=5, help="Allocation sites reported per case")
+    parser.add_argument('--budget', default=str(DEFAULT_BUDGET))
+    parser.add_argument('--list', action='store_true', help="List the cases and their sizes")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--traced', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.size, args.top, args.traced)
+        return
+    if args.list:
+        for name, (_, sizes) in CASES.items():
+            print(f"{name:<36}{', '.join(str(size) for size in sizes)}")
+        return
+
+    with open(args.budget) as f:
+        budget = json.load(f)
+    override = [int(size) for size in args.sizes.split(',') if size]
+
+    results = {}
+    failures = []
+    print(f"{'case':<44}{'peak MB':>10}{'retained':>10}{'RSS peak':>10}{'RSS +':>9}")
+    for name in selected_cases(args.only):
+        for size in override or CASES[name][1]:
+            key = f"{name}.{size}"
+            result = run_case(name, size, args.top)
+            limits = case_budget(budget, key, name)
+            over = [m for m in BUDGET_METRICS if m in limits and result[m] > limits[m]]
+            result['budget'] = limits
+            result['over_budget'] = over
+            results[key] = result
+            if over:
+                failures.append(key)
+
+            status = '  ❌ OVER BUDGET: ' + ', '.join(
+                f"{m} {result[m]:.1f} > {limits[m]}" for m in over) if over else ''
+            print(f"{key:<44}{result['peak_mb']:>10.1f}{result['retained_mb']:>10.1f}"
+                  f"{result['rss_peak_mb']:>10.1f}{result['rss_growth_mb']:>9.1f}{status}")
+            if over:
+                for site in result['top_sites']:
+                    print(f"    {site['size_mb']:>8.1f} MB  {site['site']}")
+
+    path = write_results('memory', {'created_at': time.time(), 'cases': results, 'budget': budget})
+    print(f"\n💾 Results written to {path}")
+
+    if failures:
+        print(f"❌ Memory budget exceeded: {', '.join(failures)}")
+        sys.exit(1)
+    print("✅ Memory within budget")
+
+
+if __name__ == '__main__':
+    main()
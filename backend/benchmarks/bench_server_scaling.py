@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Throughput of serve.py as the worker count grows
+
+Starts the production server with 1, 2, 4, ... workers (up to the core
+count), drives POST /predict from several client processes with keep-alive
+connections, and reports requests per second for each worker count.
+
+Usage:
+    python benchmarks/bench_server_scaling.py [--workers 1,2,4] [--duration 5]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from bench_common import BACKEND_DIR, write_results
+
+PAYLOAD = json.dumps({
+    "temperature": 32.5,
+    "humidity": 28.3,
+    "wind_speed": 15.7,
+    "pressure": 1008.2,
+    "fire_weather_index": 16.8
+})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not become ready")
+
+
+def client_loop(port, duration, connections, results):
+    """One client process: round-robin over keep-alive connections"""
+    conns = [http.client.HTTPConnection('127.0.0.1', port, timeout=30) for _ in range(connections)]
+    headers = {'Content-Type': 'application/json'}
+    completed = 0
+    errors = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        for conn in conns:
+            try:
+                conn.request('POST', '/predict', body=PAYLOAD, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status == 200:
+                    completed += 1
+                else:
+                    errors += 1
+            except OSError:
+                errors += 1
+                conn.close()
+    results.put((completed, errors))
+
+
+def measure(workers, threads, duration, clients):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, 'serve.py', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--threads', str(threads)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(port)
+        # Give every worker time to finish warming up
+        time.sleep(1 + workers * 0.5)
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=client_loop, args=(port, duration, 4, results))
+            for _ in range(clients)
+        ]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    completed = sum(t[0] for t in totals)
+    return {
+        'workers': workers,
+        'threads': threads,
+        'clients': clients,
+        'requests': completed,
+        'errors': sum(t[1] for t in totals),
+        'requests_per_second': completed / elapsed
+    }
+
+
+def main():
+    cores = os.cpu_count() or 1
+    default_workers = ','.join(str(n) for n in (1, 2, 4, 8, 16) if n <= cores) or '1'
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', default=default_workers)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--clients', type=int, default=max(2, cores))
+    args = parser.parse_args()
+
+    results = []
+    for workers in (int(n) for n in args.workers.split(',')):
+        result = measure(workers, args.threads, args.duration, args.clients)
+        results.append(result)
+        print(f"workers={workers:<3} {result['requests_per_second']:>10.1f} req/s  "
+              f"errors={result['errors']}")
+
+    baseline = results[0]['requests_per_second']
+    for result in results:
+        result['speedup'] = result['requests_per_second'] / baseline if baseline else None
+
+    path = write_results('server_scaling', {'cores': cores, 'results': results})
+    print(f"\n💾 Results written to {path}")
+
+
+if __name__ == '__main__':
+    main()
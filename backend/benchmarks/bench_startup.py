@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark with an import-time budget
+
+Each run starts a fresh interpreter and measures:
+  - import time of utils.app
+  - time to the first /predict response (from interpreter start)
+  - time to the first analytics response, which loads the dataset
+and checks that the prediction path did not import any forbidden module
+(pandas). Medians over the runs are compared against startup_budget.json;
+the script exits non-zero when a budget is exceeded.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--budget startup_budget.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from bench_common import BACKEND_DIR, write_results
+
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, 'utils')
+from utils.app import app
+imported = time.perf_counter()
+client = app.test_client()
+client.post('/predict', json={"temperature": 32.5, "humidity": 28.3, "wind_speed": 15.7})
+first_predict = time.perf_counter()
+predict_modules = sorted(m for m in sys.modules if '.' not in m)
+client.get('/api/dataset-stats')
+first_analytics = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_predict_ms": (first_predict - start) * 1000,
+    "first_analytics_ms": (first_analytics - start) * 1000,
+    "predict_modules": predict_modules
+}))
+'''
+
+
+def run_probe():
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=BACKEND_DIR,
+        capture_output=True, text=True, check=True
+    ).stdout
+    # The app prints start-up banners; the measurement is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', default=str(Path(__file__).parent / 'startup_budget.json'))
+    args = parser.parse_args()
+
+    with open(args.budget) as f:
+        budget = json.load(f)
+
+    runs = [run_probe() for _ in range(args.runs)]
+    results = {
+        metric: statistics.median(run[metric] for run in runs)
+        for metric in ('import_ms', 'first_predict_ms', 'first_analytics_ms')
+    }
+    forbidden = sorted(
+        set(budget.get('forbidden_on_predict_path', [])).intersection(runs[0]['predict_modules'])
+    )
+    results['forbidden_imported'] = forbidden
+
+    failures = []
+    for metric, value in results.items():
+        if metric in budget:
+            status = 'OK' if value <= budget[metric] else 'OVER BUDGET'
+            if status != 'OK':
+                failures.append(metric)
+            print(f"{metric:<22}{value:>10.1f} ms  (budget {budget[metric]} ms)  {status}")
+    if forbidden:
+        failures.append('forbidden_imported')
+        print(f"❌ Prediction path imported: {', '.join(forbidden)}")
+
+    path = write_results('startup', {'runs': runs, 'medians': results, 'budget': budget})
+    print(f"\n💾 Results written to {path}")
+
+    if failures:
+        print(f"❌ Start-up budget exceeded: {', '.join(failures)}")
+        sys.exit(1)
+    print("✅ Start-up within budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite with baseline regression checks
+
+Runs in-process against the Flask app and measures:
+  - /predict latency percentiles (p50/p95/p99) on distinct inputs that
+    miss the prediction cache, and on a repeated input that hits it
+  - /predict/batch throughput (rows/s) at several batch sizes
+  - analytics endpoint latency on synthetic datasets of several sizes,
+    generated the same way as the mock dataset
+  - simple_model training time on synthetic records
+  - gradient-boosted tree engine throughput on a synthetic ensemble
+
+Every measurement is a named metric that is either lower- or higher-is-better.
+--save-baseline stores the run as a JSON baseline; --compare checks a run
+against a baseline and exits non-zero when any metric regressed by more than
+--threshold. Baselines are machine specific: record them on the machine that
+runs the comparison.
+
+Usage:
+    python benchmarks/bench_suite.py [--rows 100000,1000000,10000000] [--save-baseline]
+    python benchmarks/bench_suite.py --compare [--threshold 0.2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+from bench_common import add_utils_to_path, percentiles, time_call, write_results
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "suite.json"
+
+PREDICT_PAYLOAD = {"temperature": 32.5, "humidity": 28.3, "wind_speed": 15.7}
+
+ANALYTICS_ENDPOINTS = [
+    '/api/dataset-stats',
+    '/api/correlations',
+    '/api/geographical-data',
+    '/api/outlier-analysis',
+    '/api/feature-distributions',
+    '/api/risk-distribution',
+    '/api/historical-trends',
+]
+
+LOWER = 'lower'
+HIGHER = 'higher'
+
+
+def metric(value, unit, better=LOWER):
+    return {'value': value, 'unit': unit, 'better': better}
+
+
+def load_app(max_batch_size):
+    """Import the app with limits that do not interfere with the measurements"""
+    os.environ['PYROCAST_MAX_BATCH_SIZE'] = str(max_batch_size)
+    os.environ['PYROCAST_PROFILE_SAMPLE_RATE'] = '0'
+    add_utils_to_path()
+    with contextlib.redirect_stdout(io.StringIO()):
+        from utils.app import app
+    return app
+
+
+def check_ok(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}")
+    return response
+
+
+def distinct_payload(i):
+    """A /predict payload in its own prediction cache bucket for each i < 95000"""
+    return dict(PREDICT_PAYLOAD, temperature=10 + (i % 500) * 0.1, humidity=5 + (i // 500) * 0.5)
+
+
+def bench_predict(client, n_requests):
+    for _ in range(min(20, n_requests)):
+        check_ok(client.post('/predict', json=PREDICT_PAYLOAD))
+
+    def timed(payloads):
+        timings = []
+        for payload in payloads:
+            start = time.perf_counter()
+            check_ok(client.post('/predict', json=payload))
+            timings.append((time.perf_counter() - start) * 1000)
+        return percentiles(timings)
+
+    # Misses first: the warm-up payload is outside the distinct buckets
+    misses = timed([distinct_payload(i) for i in range(n_requests)])
+    hits = timed([PREDICT_PAYLOAD] * n_requests)
+
+    results = {f'predict.{name}_ms': metric(value, 'ms') for name, value in misses.items()}
+    results.update(
+        (f'predict.cache_hit.{name}_ms', metric(value, 'ms')) for name, value in hits.items()
+    )
+    return results
+
+
+def bench_predict_batch(client, batch_sizes, repeat):
+    from data_service import generate_mock_frame
+    from simple_model import KEY_FEATURES
+
+    frame = generate_mock_frame(max(batch_sizes), seed=7)[KEY_FEATURES]
+    records = frame.to_dict('records')
+
+    results = {}
+    for size in batch_sizes:
+        payload = {'data': records[:size]}
+        timing = time_call(lambda: check_ok(client.post('/predict/batch', json=payload)), repeat=repeat)
+        results[f'predict_batch.{size}.rows_per_s'] = metric(
+            size / (timing['median_ms'] / 1000), 'rows/s', HIGHER
+        )
+    return results
+
+
+def wait_for_risk_scores(data_service, timeout):
+    """Block until the background job has scored the current dataset"""
+    deadline = time.monotonic() + timeout
+    while data_service.risk_scores_data_version != data_service.data_version:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Timed out waiting for dataset risk scores")
+        time.sleep(0.05)
+
+
+def bench_analytics(client, row_counts, repeat):
+    # The first request loads the data service and starts the scoring job
+    check_ok(client.get('/api/dataset-stats'))
+    from data_service import data_service, generate_mock_frame
+
+    original = data_service.df
+    results = {}
+    try:
+        for n_rows in row_counts:
+            data_service.use_dataframe(generate_mock_frame(n_rows))
+            prefix = f'analytics.{n_rows}'
+
+            # The first dashboard request after the swap computes every
+            # section from scratch and wakes the scoring job for the new data
+            start = time.perf_counter()
+            check_ok(client.get('/api/dashboard?sections=' + ','.join(
+                path.rsplit('/', 1)[1] for path in ANALYTICS_ENDPOINTS
+            )))
+            results[f'{prefix}.dashboard_cold_ms'] = metric((time.perf_counter() - start) * 1000, 'ms')
+            wait_for_risk_scores(data_service, timeout=max(60, n_rows / 20000))
+            results[f'{prefix}.score_dataset_s'] = metric(time.perf_counter() - start, 's')
+
+            for path in ANALYTICS_ENDPOINTS:
+                timing = time_call(lambda: check_ok(client.get(path)), repeat=repeat)
+                results[f'{prefix}.{path.rsplit("/", 1)[1]}_ms'] = metric(timing['median_ms'], 'ms')
+    finally:
+        data_service.use_dataframe(original)
+    return results
+
+
+def bench_training(row_counts, epochs):
+    from data_service import generate_mock_frame
+    from simple_model import train_model
+
+    results = {}
+    for n_rows in row_counts:
+        records = generate_mock_frame(n_rows, seed=11).to_dict('records')
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            train_model(records, epochs=epochs)
+        results[f'training.{n_rows}.seconds'] = metric(time.perf_counter() - start, 's')
+    return results
+
+
+def synthetic_ensemble(n_trees, depth, n_features, seed=5):
+    """Complete random trees in the flat model format"""
+    import numpy as np
+    from tree_ensemble import TreeEnsemble
+
+    rng = np.random.RandomState(seed)
+    n_nodes = 2 ** (depth + 1) - 1
+    n_splits = 2 ** depth - 1
+    local = np.arange(n_nodes)
+    offsets = np.repeat(np.arange(n_trees) * n_nodes, n_nodes)
+    is_split = np.tile(local < n_splits, n_trees)
+    children = offsets + 2 * np.tile(local, n_trees) + 1
+    return TreeEnsemble(
+        roots=np.arange(n_trees) * n_nodes,
+        feature=np.where(is_split, rng.randint(n_features, size=len(offsets)), -1),
+        threshold=rng.uniform(0, 60, len(offsets)),
+        left=np.where(is_split, children, -1),
+        right=np.where(is_split, children + 1, -1),
+        default_left=np.ones(len(offsets), dtype=int),
+        value=np.where(is_split, 0.0, rng.normal(0, 0.1, len(offsets)))
+    )
+
+
+def bench_tree_engine(row_counts, n_trees, depth, repeat):
+    import numpy as np
+
+    ensemble = synthetic_ensemble(n_trees, depth, n_features=5)
+    results = {}
+    for n_rows in row_counts:
+        matrix = np.random.RandomState(3).uniform(0, 60, (n_rows, 5))
+        timing = time_call(lambda: ensemble.predict_proba(matrix), repeat=repeat)
+        results[f'tree_engine.{n_trees}x{depth}.{n_rows}.rows_per_s'] = metric(
+            n_rows / (timing['median_ms'] / 1000), 'rows/s', HIGHER)
+    return results
+
+
+def compare(current, baseline, threshold):
+    """
+    Compare metrics against a baseline
+
+    Returns:
+        List of (name, baseline_value, current_value, relative_change,
+        regressed) for the metrics present in both
+    """
+    rows = []
+    for name, entry in current.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['value'], entry['value']
+        if not before:
+            continue
+        change = (after - before) / before
+        worse = change if entry['better'] == LOWER else -change
+        rows.append((name, before, after, change, worse > threshold))
+    return rows
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(',') if size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=500, help="Single /predict requests")
+    parser.add_argument('--batch-sizes', default='1,10,100,1000,10000')
+    parser.add_argument('--rows', default='100000,1000000,10000000', help="Synthetic analytics dataset sizes")
+    parser.add_argument('--train-rows', default='1000,5000')
+    parser.add_argument('--epochs', type=int, default=200)
+    parser.add_argument('--tree-rows', default='10000,100000', help="Rows scored by the tree engine")
+    parser.add_argument('--trees', type=int, default=200)
+    parser.add_argument('--tree-depth', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the baseline")
+    parser.add_argument('--compare', action='store_true', help="Fail on regressions against the baseline")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    batch_sizes = parse_sizes(args.batch_sizes)
+    app = load_app(max(batch_sizes))
+    client = app.test_client()
+
+    metrics = {}
+    print("⏱️  /predict latency...")
+    metrics.update(bench_predict(client, args.requests))
+    print("⏱️  /predict/batch throughput...")
+    metrics.update(bench_predict_batch(client, batch_sizes, args.repeat))
+    print("⏱️  Analytics endpoints...")
+    metrics.update(bench_analytics(client, parse_sizes(args.rows), args.repeat))
+    print("⏱️  Model training...")
+    metrics.update(bench_training(parse_sizes(args.train_rows), args.epochs))
+    print("⏱️  Tree engine...")
+    metrics.update(bench_tree_engine(parse_sizes(args.tree_rows), args.trees, args.tree_depth, args.repeat))
+
+    print(f"\n{'metric':<48}{'value':>14}  unit")
+    for name, entry in metrics.items():
+        print(f"{name:<48}{entry['value']:>14.2f}  {entry['unit']}")
+
+    run = {
+        'created_at': time.time(),
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count()
+        },
+        'metrics': metrics
+    }
+    path = write_results('suite', run)
+    print(f"\n💾 Results written to {path}")
+
+    if args.save_baseline:
+        baseline_path = Path(args.baseline)
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"💾 Baseline written to {baseline_path}")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(metrics, baseline['metrics'], args.threshold)
+        print(f"\n{'metric':<48}{'baseline':>12}{'current':>12}{'change':>9}")
+        for name, before, after, change, regressed in rows:
+            flag = '  ❌ REGRESSION' if regressed else ''
+            print(f"{name:<48}{before:>12.2f}{after:>12.2f}{change:>+9.1%}{flag}")
+
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            print(f"❌ {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"✅ No regressions above {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
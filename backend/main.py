@@ -2,6 +2,9 @@
 """
 Wildfire Risk Prediction API
 A Flask-based REST API for predicting wildfire risk based on environmental conditions.
+
+This starts the single-process development server. For production use
+serve.py, which runs pre-forked, warmed-up workers.
 """
 
 import sys
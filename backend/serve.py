@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Production server for the Wildfire Risk Prediction API
+
+A pre-fork master binds the listening socket once and runs the app in
+several worker processes, each serving requests from a bounded thread pool.
+A worker only accepts a connection when one of its threads is free, so
+connections wait in the shared backlog for whichever worker can take them,
+and a client gets --header-timeout seconds to send its request head. On
+Linux, connections that have sent nothing yet are not accepted at all.
+Workers import and warm the app (model, dataset, risk scores, a test
+request) before they start accepting connections, and report readiness to
+the master over a pipe.
+
+Signals handled by the master:
+    SIGHUP           rolling restart: start a replacement, wait until it is
+                     warm, then gracefully stop the old worker, one at a time
+    SIGTERM/SIGINT   graceful shutdown: workers finish in-flight requests
+                     within the graceful timeout, then are killed
+
+Usage:
+    python serve.py --bind 0.0.0.0:5000 --workers 4 --threads 8
+
+Every option can also be set through the matching PYROCAST_* environment
+variable. Platforms without os.fork run a single threaded worker.
+
+Workers share nothing at runtime: each has its own caches, event stream
+broker and, when PYROCAST_STATION_FEED is set, its own station monitor, so
+station alerts are logged once per worker (see utils/station_monitor.py).
+"""
+import argparse
+import importlib
+import logging
+import math
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(levelname)s %(message)s')
+logger = logging.getLogger('pyrocast.serve')
+
+# Seconds the accept loop waits for a free request thread before polling
+# for shutdown again
+ACCEPT_WAIT = 0.5
+
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Run the API with pre-forked workers")
+    parser.add_argument('--app', default=env('PYROCAST_APP', 'utils.app:app'),
+                        help="module:attribute of the Flask app")
+    parser.add_argument('--bind', default=env('PYROCAST_BIND', '0.0.0.0:5000'),
+                        help="host:port to listen on")
+    parser.add_argument('--workers', type=int, default=int(env('PYROCAST_WORKERS', os.cpu_count() or 1)),
+                        help="number of worker processes")
+    parser.add_argument('--threads', type=int, default=int(env('PYROCAST_THREADS', 4)),
+                        help="request threads per worker")
+    parser.add_argument('--backlog', type=int, default=int(env('PYROCAST_BACKLOG', 2048)),
+                        help="listen backlog of the shared socket")
+    parser.add_argument('--timeout', type=float, default=float(env('PYROCAST_TIMEOUT', 30)),
+                        help="seconds a client connection may stay idle")
+    parser.add_argument('--header-timeout', type=float, default=float(env('PYROCAST_HEADER_TIMEOUT', 5)),
+                        help="seconds a client may take to send its request line and headers")
+    parser.add_argument('--graceful-timeout', type=float, default=float(env('PYROCAST_GRACEFUL_TIMEOUT', 30)),
+                        help="seconds workers get to finish in-flight requests on stop")
+    parser.add_argument('--warmup-timeout', type=float, default=float(env('PYROCAST_WARMUP_TIMEOUT', 120)),
+                        help="seconds a new worker may take to become ready")
+    return parser.parse_args(argv)
+
+
+def parse_bind(bind):
+    host, _, port = bind.rpartition(':')
+    return (host or '0.0.0.0').strip('[]'), int(port)
+
+
+def create_listener(bind, backlog):
+    """Bind the socket shared by all workers"""
+    host, port = parse_bind(bind)
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def load_app(app_path):
+    module_name, _, attribute = app_path.partition(':')
+    module = importlib.import_module(module_name)
+    return module, getattr(module, attribute or 'app')
+
+
+def warm_up(module, app):
+    """
+    Make sure the first real request does not pay for cold caches
+
+    Calls the module's warm_up() hook if it defines one, then sends a health
+    check through the app.
+    """
+    start = time.perf_counter()
+    hook = getattr(module, 'warm_up', None)
+    if hook is not None:
+        hook()
+    response = app.test_client().get('/health')
+    if response.status_code != 200:
+        raise RuntimeError(f"Warm-up health check failed with status {response.status_code}")
+    logger.info(f"Worker warmed up in {time.perf_counter() - start:.2f}s")
+
+
+def make_worker_server(listener, app, threads, timeout, header_timeout=5.0):
+    """werkzeug server on the inherited socket, handling requests on a thread pool"""
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    class RequestHandler(WSGIRequestHandler):
+        # HTTP/1.1 framing (chunked streaming responses); werkzeug closes
+        # every connection after one response, so there is no keep-alive
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            self.connection.settimeout(header_timeout)
+
+        def parse_request(self):
+            # The request head has arrived; the body and response get the
+            # full timeout
+            parsed = super().parse_request()
+            self.connection.settimeout(self.timeout)
+            return parsed
+
+    RequestHandler.timeout = timeout
+
+    class PooledWSGIServer(BaseWSGIServer):
+        multithread = True
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+            self.free_threads = threading.Semaphore(threads)
+            # Workers race to accept from the shared socket; the loser
+            # must not block in accept()
+            self.socket.setblocking(False)
+            if hasattr(socket, 'TCP_DEFER_ACCEPT'):
+                # Linux: connections are only accepted once the client has
+                # sent data, so idle connects never take a request thread
+                self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_DEFER_ACCEPT,
+                                       max(1, math.ceil(header_timeout)))
+
+        def _handle_request_noblock(self):
+            # Accept only when a pool thread is free, leaving the connection
+            # in the backlog for another worker otherwise. The wait is short
+            # so serve_forever still notices shutdown().
+            if not self.free_threads.acquire(timeout=ACCEPT_WAIT):
+                return
+            try:
+                request, client_address = self.get_request()
+            except OSError:
+                self.free_threads.release()
+                return
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                self.free_threads.release()
+
+    host, port = listener.getsockname()[:2]
+    return PooledWSGIServer(host, port, app, handler=RequestHandler, fd=listener.fileno())
+
+
+def run_worker(listener, options, ready_fd=None):
+    """Worker process body: import, warm up, signal readiness, serve"""
+    module, app = load_app(options.app)
+    warm_up(module, app)
+
+    server = make_worker_server(listener, app, options.threads, options.timeout, options.header_timeout)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever to return, so call it off-thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    if ready_fd is not None:
+        os.write(ready_fd, b'1')
+        os.close(ready_fd)
+
+    logger.info(f"Worker serving on {options.bind} with {options.threads} threads")
+    server.serve_forever()
+
+    # Let in-flight requests complete before exiting
+    server.pool.shutdown(wait=True)
+    logger.info("Worker stopped")
+
+
+class Master:
+    """Pre-fork master process supervising the workers"""
+
+    def __init__(self, listener, options):
+        self.listener = listener
+        self.options = options
+        self.workers = {}  # pid -> start time
+        self.stopping = False
+        self.reload_requested = False
+
+    def spawn_worker(self):
+        """
+        Fork a worker and wait until it is warm
+
+        Returns:
+            pid of the ready worker, or None if it failed to warm up
+        """
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+                signal.signal(sig, signal.SIG_DFL)
+            exit_code = 0
+            try:
+                run_worker(self.listener, self.options, write_fd)
+            except Exception:
+                logger.exception("Worker failed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+
+        os.close(write_fd)
+        try:
+            ready, _, _ = select.select([read_fd], [], [], self.options.warmup_timeout)
+            signalled = bool(ready) and os.read(read_fd, 1) == b'1'
+        except InterruptedError:
+            signalled = False
+        finally:
+            os.close(read_fd)
+
+        if not signalled:
+            logger.error(f"Worker {pid} did not become ready, killing it")
+            self._kill(pid, signal.SIGKILL)
+            self._reap(pid, timeout=5)
+            return None
+
+        self.workers[pid] = time.time()
+        logger.info(f"Worker {pid} ready ({len(self.workers)}/{self.options.workers})")
+        return pid
+
+    def _kill(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self, pid, timeout):
+        """Wait up to `timeout` seconds for a worker to exit"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                return True
+            if done:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def stop_worker(self, pid):
+        """Gracefully stop a worker, killing it after the graceful timeout"""
+        self.workers.pop(pid, None)
+        self._kill(pid, signal.SIGTERM)
+        if not self._reap(pid, self.options.graceful_timeout):
+            logger.warning(f"Worker {pid} did not stop in time, killing it")
+            self._kill(pid, signal.SIGKILL)
+            self._reap(pid, timeout=5)
+
+    def rolling_restart(self):
+        """Replace every worker one by one, never dropping below capacity"""
+        logger.info("Rolling restart")
+        for old_pid in list(self.workers):
+            if self.stopping:
+                return
+            new_pid = self.spawn_worker()
+            if new_pid is None:
+                logger.error("Replacement worker failed, aborting rolling restart")
+                return
+            self.stop_worker(old_pid)
+        logger.info("Rolling restart complete")
+
+    def reap_dead_workers(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self.workers.pop(pid, None) is not None:
+                logger.warning(f"Worker {pid} exited unexpectedly (status {status})")
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        logger.info(f"Master listening on {self.options.bind}, starting {self.options.workers} workers")
+        while not self.stopping:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.rolling_restart()
+            self.reap_dead_workers()
+            while len(self.workers) < self.options.workers and not self.stopping:
+                if self.spawn_worker() is None:
+                    time.sleep(1)
+            time.sleep(0.2)
+
+        logger.info("Shutting down workers")
+        for pid in list(self.workers):
+            self._kill(pid, signal.SIGTERM)
+        deadline = time.time() + self.options.graceful_timeout
+        for pid in list(self.workers):
+            if not self._reap(pid, max(deadline - time.time(), 0)):
+                self._kill(pid, signal.SIGKILL)
+                self._reap(pid, timeout=5)
+        self.workers.clear()
+        self.listener.close()
+
+    def _on_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    listener = create_listener(options.bind, options.backlog)
+
+    if not hasattr(os, 'fork'):
+        logger.warning("os.fork is not available, running a single worker")
+        run_worker(listener, options)
+        return
+
+    Master(listener, options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ Uses minimal dependencies to avoid import issues
 """
 
 try:
-    from flask import Flask, request, jsonify
+    from flask import Flask, request
     from flask_cors import CORS
     FLASK_AVAILABLE = True
 except ImportError:
@@ -26,13 +26,26 @@ if FLASK_AVAILABLE:
     app = Flask(__name__)
     CORS(app)  # Enable CORS for frontend communication
 
+    # Request metrics and the /metrics endpoint; installed before the
+    # encoding hook so response sizes are recorded after compression
+    from metrics import BATCH_SIZE, install_metrics
+    install_metrics(app)
+
+    # Negotiated serialization (JSON/MessagePack/Arrow) and compression
+    from response_encoding import api_response, install_response_encoding
+    install_response_encoding(app)
+
+    # Priority lanes and load shedding for the prediction endpoints
+    from admission import AdmissionRejected, install_admission_control
+    admission_controller = install_admission_control(app)
+
     # Initialize prediction service
     predictor = SimpleWildfirePredictionService()
 
     @app.route('/health', methods=['GET'])
     def health_check():
         """Health check endpoint"""
-        return jsonify({
+        return api_response({
             "status": "healthy",
             "message": "Wildfire Risk Prediction API is running",
             "version": "1.0.0",
@@ -40,6 +53,7 @@ if FLASK_AVAILABLE:
         })
 
     @app.route('/predict', methods=['POST'])
+    @admission_controller.limit('single')
     def predict_fire_risk():
         """
         Predict wildfire risk based on environmental conditions
@@ -49,28 +63,29 @@ if FLASK_AVAILABLE:
             data = request.get_json()
             
             if not data:
-                return jsonify({"error": "No data provided"}), 400
+                return api_response({"error": "No data provided"}), 400
             
             # Validate that at least some data is provided
             required_any = ['temperature', 'temp_mean', 'humidity', 'humidity_min', 'wind_speed', 'wind_speed_max']
             if not any(field in data for field in required_any):
-                return jsonify({
+                return api_response({
                     "error": "Please provide at least temperature, humidity, and wind speed data"
                 }), 400
             
             # Make prediction
             prediction_result = predictor.predict(data)
             
-            return jsonify(prediction_result)
+            return api_response(prediction_result)
             
         except ValueError as ve:
             logger.error(f"Validation error: {str(ve)}")
-            return jsonify({"error": f"Invalid input: {str(ve)}"}), 400
+            return api_response({"error": f"Invalid input: {str(ve)}"}), 400
         except Exception as e:
             logger.error(f"Prediction error: {str(e)}")
-            return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
+            return api_response({"error": f"Prediction failed: {str(e)}"}), 500
 
     @app.route('/predict/batch', methods=['POST'])
+    @admission_controller.limit('batch')
     def predict_batch():
         """
         Predict wildfire risk for multiple locations
@@ -79,42 +94,37 @@ if FLASK_AVAILABLE:
             request_data = request.get_json()
             
             if not request_data or 'data' not in request_data:
-                return jsonify({"error": "No data array provided"}), 400
+                return api_response({"error": "No data array provided"}), 400
             
             data_list = request_data['data']
-            predictions = []
+            if not isinstance(data_list, list):
+                return api_response({"error": "'data' must be an array of records"}), 400
+            BATCH_SIZE.observe(len(data_list))
+            admission_controller.check_batch_size(len(data_list))
             
-            for i, data_point in enumerate(data_list):
-                try:
-                    result = predictor.predict(data_point)
-                    result['index'] = i
-                    predictions.append(result)
-                except Exception as e:
-                    predictions.append({
-                        'index': i,
-                        'error': str(e),
-                        'fire_risk': 'Unknown',
-                        'probability': None
-                    })
+            # Validated columnwise; invalid rows get an error result with an error_code
+            predictions = predictor.predict_batch(data_list)
             
-            return jsonify({
+            return api_response({
                 "predictions": predictions,
                 "total_processed": len(predictions)
             })
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"Batch prediction error: {str(e)}")
-            return jsonify({"error": f"Batch prediction failed: {str(e)}"}), 500
+            return api_response({"error": f"Batch prediction failed: {str(e)}"}), 500
 
     @app.route('/model/info', methods=['GET'])
     def model_info():
         """Get information about the current model"""
         try:
             info = predictor.get_model_info()
-            return jsonify(info)
+            return api_response(info)
         except Exception as e:
             logger.error(f"Model info error: {str(e)}")
-            return jsonify({"error": f"Could not retrieve model info: {str(e)}"}), 500
+            return api_response({"error": f"Could not retrieve model info: {str(e)}"}), 500
 
 def test_api():
     """Test the API without Flask"""
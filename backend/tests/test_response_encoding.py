@@ -0,0 +1,32 @@
+"""Negotiated response encodings"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+
+from response_encoding import dumps_arrow  # noqa: E402
+
+pa = pytest.importorskip('pyarrow')
+ipc = pytest.importorskip('pyarrow.ipc')
+
+SUCCESS = {"fire_risk": "High", "probability": 0.8, "prediction": 1, "confidence": 0.8,
+           "model_used": "SimpleLogisticRegression", "input_processed": True, "index": 0}
+ERROR = {"index": 1, "error": "temp_mean: expected a number", "error_code": "invalid_type",
+         "fire_risk": "Unknown", "probability": None}
+
+
+def decode(body):
+    table = ipc.open_stream(pa.BufferReader(body)).read_all()
+    return table, json.loads(table.schema.metadata[b'payload'])
+
+
+@pytest.mark.parametrize('rows', [[SUCCESS, ERROR], [ERROR, SUCCESS]])
+def test_arrow_batch_keeps_error_and_success_fields(rows):
+    table, metadata = decode(dumps_arrow({"predictions": rows, "total_processed": 2}))
+
+    assert set(table.column_names) == set(SUCCESS) | set(ERROR)
+    assert table.to_pylist() == [{name: row.get(name) for name in table.column_names} for row in rows]
+    assert metadata == {"total_processed": 2}
@@ -0,0 +1,57 @@
+"""What-if sweeps against a model trained with location context features"""
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+
+from simple_model import train_model  # noqa: E402
+from simple_predict import SimpleWildfirePredictionService  # noqa: E402
+from sweep import run_sweep  # noqa: E402
+
+
+@pytest.fixture
+def context_model(tmp_path):
+    rng = np.random.default_rng(0)
+    records = [
+        {
+            'temp_mean': rng.uniform(5, 40), 'humidity_min': rng.uniform(5, 90),
+            'wind_speed_max': rng.uniform(0, 30), 'pressure_mean': rng.uniform(990, 1030),
+            'fire_weather_index': rng.uniform(0, 30), 'lat': rng.uniform(34, 36),
+            'lon': rng.uniform(-119, -117), 'frp': rng.uniform(0, 50), 'occured': int(rng.random() < 0.4)
+        }
+        for _ in range(400)
+    ]
+    model_data = train_model(records, epochs=20, context_radius_km=50,
+                             context_index_path=tmp_path / "model.neighbors.npz")
+    model_path = tmp_path / "model.json"
+    model_path.write_text(json.dumps(model_data))
+    return SimpleWildfirePredictionService(str(model_path))
+
+
+BASE = {'temp_mean': 30, 'humidity_min': 25, 'wind_speed_max': 15, 'pressure_mean': 1010,
+        'fire_weather_index': 12, 'lat': 35.0, 'lon': -118.0}
+
+
+def test_sweep_reports_context_contributions(context_model):
+    result = run_sweep(context_model, BASE, [{'feature': 'temp_mean', 'start': 10, 'stop': 40, 'step': 10}])
+
+    assert result['shape'] == [4]
+    contributions = result['contributions']
+    assert set(contributions['base']) >= {'nearby_fire_count', 'nearby_mean_frp', 'nearby_fire_rate'}
+    assert all(isinstance(term, float) for term in contributions['base'].values())
+    assert len(contributions['axes']['temp_mean']) == 4
+
+
+def test_sweep_over_location(context_model):
+    result = run_sweep(context_model, BASE, [
+        {'feature': 'lat', 'values': [35.0, 60.0]},
+        {'feature': 'temp_mean', 'values': [20, 30]}
+    ])
+
+    assert result['shape'] == [2, 2]
+    assert 'lat' not in result['contributions']['axes']
+    assert len(result['contributions']['axes']['temp_mean']) == 2
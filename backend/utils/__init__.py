@@ -1,22 +1,29 @@
 # Backend Utils Package for Pyro Cast AI
 
-# Import available modules
-try:
-    from .preprocessing import PyroCastAIPreprocessor
-except ImportError:
-    PyroCastAIPreprocessor = None
+# Modules are imported on first attribute access (PEP 562), so importing
+# utils.app does not pull in pandas through the preprocessor
+_LAZY_ATTRIBUTES = {
+    'PyroCastAIPreprocessor': ('.preprocessing', 'PyroCastAIPreprocessor'),
+    'PyroCastAIModelTrainer': ('.model', 'PyroCastAIModelTrainer'),
+    'SimpleWildfirePredictionService': ('.predict', 'SimpleWildfirePredictionService'),
+    'PyroCastAIPredictionService': ('.predict', 'SimpleWildfirePredictionService'),  # Alias for backward compatibility
+}
 
-try:
-    from .model import PyroCastAIModelTrainer
-except ImportError:
-    PyroCastAIModelTrainer = None
 
-try:
-    from .predict import SimpleWildfirePredictionService
-    PyroCastAIPredictionService = SimpleWildfirePredictionService  # Alias for backward compatibility
-except ImportError:
-    PyroCastAIPredictionService = None
-    SimpleWildfirePredictionService = None
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    import importlib
+
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    try:
+        value = getattr(importlib.import_module(module_name, __name__), attribute)
+    except ImportError:
+        value = None
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     'PyroCastAIPreprocessor',
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Admission control and load shedding for the prediction endpoints
+
+Work is admitted through priority lanes, each with its own concurrency limit
+and bounded wait queue, so a few large batch requests cannot starve the
+single-row /predict calls. When a lane is saturated, requests are rejected
+at once rather than left to time out:
+
+    429  the lane's wait queue is full
+    503  a queued request waited longer than the queue timeout
+
+Both carry a Retry-After estimate. Oversized batches are rejected with 413
+before any scoring: by their Content-Length before a slot is taken or the
+body is parsed, and by their row count once parsed.
+
+Configuration (environment):
+    PYROCAST_MAX_BATCH_SIZE          rows per /predict/batch request (10000)
+    PYROCAST_MAX_BATCH_BYTES         /predict/batch body size (1 KiB per
+                                     allowed row)
+    PYROCAST_SINGLE_CONCURRENCY      concurrent single predictions (8)
+    PYROCAST_SINGLE_QUEUE            queued single predictions (64)
+    PYROCAST_BATCH_CONCURRENCY       concurrent batch predictions (2)
+    PYROCAST_BATCH_QUEUE             queued batch predictions (4)
+    PYROCAST_QUEUE_TIMEOUT           seconds a request may wait queued (2)
+"""
+import functools
+import math
+import os
+import threading
+import time
+
+from metrics import counter, gauge
+
+# Body bytes allowed per batch row when PYROCAST_MAX_BATCH_BYTES is unset
+MAX_ROW_BYTES = 1024
+
+ADMISSION_REJECTIONS = counter(
+    'pyrocast_admission_rejections_total', 'Requests rejected by admission control', ('lane', 'reason'))
+ADMISSION_QUEUE_DEPTH = gauge(
+    'pyrocast_admission_queue_depth', 'Requests waiting for an admission slot', ('lane',))
+ADMISSION_IN_FLIGHT = gauge(
+    'pyrocast_admission_in_flight', 'Requests holding an admission slot', ('lane',))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted"""
+
+    def __init__(self, message, status, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Lane:
+    """
+    Concurrency limit with a bounded wait queue
+
+    Keeps an exponentially weighted average of service time to estimate how
+    long a rejected client should wait before retrying.
+    """
+
+    def __init__(self, name, concurrency, max_queue, queue_timeout):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.avg_service_time = 0.05
+        self._cond = threading.Condition()
+
+        ADMISSION_QUEUE_DEPTH.set_function(lambda: self.waiting, name)
+        ADMISSION_IN_FLIGHT.set_function(lambda: self.active, name)
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained"""
+        backlog = self.active + self.waiting
+        estimate = backlog * self.avg_service_time / max(self.concurrency, 1)
+        return max(1, math.ceil(estimate))
+
+    def acquire(self):
+        with self._cond:
+            if self.active < self.concurrency and self.waiting == 0:
+                self.active += 1
+                return
+            if self.waiting >= self.max_queue:
+                ADMISSION_REJECTIONS.inc(self.name, 'queue_full')
+                raise AdmissionRejected(
+                    f"Too many {self.name} requests in progress", 429, self.retry_after())
+
+            self.waiting += 1
+            try:
+                admitted = self._cond.wait_for(
+                    lambda: self.active < self.concurrency, timeout=self.queue_timeout)
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                ADMISSION_REJECTIONS.inc(self.name, 'queue_timeout')
+                raise AdmissionRejected(
+                    f"Timed out waiting for a {self.name} slot", 503, self.retry_after())
+            self.active += 1
+
+    def release(self, service_time):
+        with self._cond:
+            self.active -= 1
+            self.avg_service_time += 0.2 * (service_time - self.avg_service_time)
+            self._cond.notify()
+
+    def status(self):
+        return {
+            'concurrency': self.concurrency,
+            'max_queue': self.max_queue,
+            'active': self.active,
+            'waiting': self.waiting,
+            'avg_service_ms': self.avg_service_time * 1000
+        }
+
+
+class AdmissionController:
+    """Per-process admission lanes for single and batch scoring"""
+
+    def __init__(self, max_batch_size=None, single_concurrency=None, single_queue=None,
+                 batch_concurrency=None, batch_queue=None, queue_timeout=None, max_batch_bytes=None):
+        env = os.environ.get
+        self.max_batch_size = max_batch_size or int(env('PYROCAST_MAX_BATCH_SIZE', 10000))
+        self.max_batch_bytes = max_batch_bytes or int(
+            env('PYROCAST_MAX_BATCH_BYTES', self.max_batch_size * MAX_ROW_BYTES))
+        queue_timeout = queue_timeout if queue_timeout is not None else float(env('PYROCAST_QUEUE_TIMEOUT', 2))
+        self.lanes = {
+            'single': Lane(
+                'single',
+                single_concurrency or int(env('PYROCAST_SINGLE_CONCURRENCY', 8)),
+                single_queue if single_queue is not None else int(env('PYROCAST_SINGLE_QUEUE', 64)),
+                queue_timeout
+            ),
+            'batch': Lane(
+                'batch',
+                batch_concurrency or int(env('PYROCAST_BATCH_CONCURRENCY', 2)),
+                batch_queue if batch_queue is not None else int(env('PYROCAST_BATCH_QUEUE', 4)),
+                queue_timeout
+            )
+        }
+
+    def check_batch_size(self, size):
+        """Reject batches above the configured maximum with 413"""
+        if size > self.max_batch_size:
+            ADMISSION_REJECTIONS.inc('batch', 'too_large')
+            raise AdmissionRejected(
+                f"Batch of {size} rows exceeds the maximum of {self.max_batch_size}", 413)
+
+    def check_batch_bytes(self, content_length):
+        """Reject batch bodies above the configured size with 413"""
+        if content_length is not None and content_length > self.max_batch_bytes:
+            ADMISSION_REJECTIONS.inc('batch', 'too_large')
+            raise AdmissionRejected(
+                f"Batch body of {content_length} bytes exceeds the maximum of {self.max_batch_bytes}", 413)
+
+    def limit(self, lane_name, check_body=False):
+        """
+        Decorator running a view inside an admission slot of a lane
+
+        Args:
+            lane_name: 'single' or 'batch'
+            check_body: Reject oversized batch bodies by Content-Length
+                before waiting for a slot
+        """
+        lane = self.lanes[lane_name]
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if check_body:
+                    from flask import request
+                    self.check_batch_bytes(request.content_length)
+                lane.acquire()
+                start = time.perf_counter()
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    lane.release(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def status(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_batch_bytes': self.max_batch_bytes,
+            'lanes': {name: lane.status() for name, lane in self.lanes.items()}
+        }
+
+
+def install_admission_control(app, controller=None):
+    """
+    Register the rejection handler on a Flask app
+
+    Returns:
+        The AdmissionController; decorate views with controller.limit(lane)
+    """
+    from response_encoding import api_response
+
+    controller = controller or AdmissionController()
+
+    @app.errorhandler(AdmissionRejected)
+    def handle_admission_rejected(error):
+        response = api_response({"error": str(error)}, error.status)
+        if error.retry_after is not None:
+            response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
+    return controller
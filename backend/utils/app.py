@@ -7,7 +7,7 @@ Uses minimal dependencies to avoid import issues
 # Import Flask and check availability
 try:
     import flask
-    from flask import Flask, request, jsonify
+    from flask import Flask, Response, redirect, request, send_file
     from flask_cors import CORS
     FLASK_AVAILABLE = True
     print(f"✅ Flask version {flask.__version__} is available")
@@ -16,9 +16,11 @@ except ImportError as e:
     print(f"❌ Flask import error: {e}")
     print("⚠️  Running in test mode")
 
+import hashlib
 import json
 import logging
 import os
+import threading
 from pathlib import Path
 
 # Import our prediction service
@@ -42,6 +44,12 @@ except ImportError:
                     "wind_effect": "High risk"
                 }
             }
+        
+        def validate_batch(self, records):
+            return None
+        
+        def predict_batch(self, records, validated=None):
+            return [dict(self.predict(record), index=i) for i, record in enumerate(records)]
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -53,6 +61,26 @@ app = Flask(__name__) if FLASK_AVAILABLE else None
 if FLASK_AVAILABLE:
     CORS(app)  # Enable CORS for frontend communication
 
+    # Request metrics and the /metrics endpoint; installed before the
+    # encoding hook so response sizes are recorded after compression
+    from metrics import BATCH_SIZE, install_metrics
+    install_metrics(app)
+
+    # Opt-in cProfile captures and slow-request log with phase timings
+    from profiling import install_profiling, phase
+    install_profiling(app)
+
+    # Negotiated serialization (JSON/MessagePack/Arrow) and compression
+    from response_encoding import api_response, install_response_encoding
+    install_response_encoding(app)
+
+    # Request filters shared by the map sample and dashboard endpoints
+    from dashboard import parse_filters
+
+    # Priority lanes and load shedding for the prediction endpoints
+    from admission import AdmissionRejected, install_admission_control
+    admission_controller = install_admission_control(app)
+
     # Initialize prediction service
     try:
         prediction_service = SimpleWildfirePredictionService()
@@ -61,116 +89,373 @@ if FLASK_AVAILABLE:
         logger.error(f"❌ Failed to initialize prediction service: {e}")
         prediction_service = None
 
-    # Initialize data service
-    try:
-        from data_service import data_service
-        DATA_SERVICE_AVAILABLE = True
-        logger.info("✅ Data service loaded successfully")
-    except ImportError:
-        DATA_SERVICE_AVAILABLE = False
-        logger.warning("⚠️  Data service not available")
+    # Versioned regional models and shadow candidates; without a registry
+    # manifest this serves prediction_service alone
+    model_registry = None
+    if prediction_service is not None:
+        from model_registry import ModelRegistry, UnknownModel
+        model_registry = ModelRegistry.from_env(prediction_service)
+
+    # Background scoring of very large datasets
+    job_manager = None
+    if prediction_service is not None:
+        from jobs import JobManager
+        job_manager = JobManager(prediction_service)
+        job_manager.recover()
+
+    # The data service (pandas plus the dataset load) and the analytics built
+    # on it are created on first use, so importing the app and serving
+    # predictions stays cheap. serve.py loads them in warm_up().
+    analytics = {}
+    analytics_lock = threading.Lock()
+
+    def _load_analytics():
+        try:
+            from data_service import data_service
+            logger.info("✅ Data service loaded successfully")
+        except ImportError:
+            logger.warning("⚠️  Data service not available")
+            analytics.update(data_service=None, risk_scoring_job=None, dashboard_builder=None,
+                             event_broker=None, stream_server=None, station_monitor=None)
+            return
+
+        # Live views subscribe to risk deltas over server-sent events
+        from event_stream import EventBroker, StreamServer
+        event_broker = EventBroker()
+        stream_server = StreamServer.from_env(event_broker)
+        stream_server.start()
+        
+        # Keep model risk columns on the dataset in sync with the model
+        risk_scoring_job = None
+        if prediction_service is not None:
+            from risk_scoring import RiskScoringJob, build_risk_delta
+            risk_scoring_job = RiskScoringJob(data_service, prediction_service)
+            risk_scoring_job.add_listener(
+                lambda update: event_broker.publish('risk', build_risk_delta(data_service, update))
+            )
+            risk_scoring_job.start()
+
+        # Continuous rescoring of monitored stations (PYROCAST_STATION_FEED);
+        # boundary crossings are published as 'alert' events
+        station_monitor = None
+        if prediction_service is not None:
+            from station_monitor import monitor_from_env
+            station_monitor = monitor_from_env(prediction_service, event_broker)
+            if station_monitor is not None:
+                station_monitor.start()
+
+        from dashboard import DashboardBuilder
+        dashboard_builder = DashboardBuilder(data_service, before_build=refresh_risk_scores)
+
+        analytics.update(
+            event_broker=event_broker,
+            stream_server=stream_server,
+            station_monitor=station_monitor,
+            risk_scoring_job=risk_scoring_job,
+            dashboard_builder=dashboard_builder,
+            data_service=data_service
+        )
+
+    def get_data_service():
+        """Data service, loaded on first call; None if unavailable"""
+        if 'data_service' not in analytics:
+            with analytics_lock:
+                if 'data_service' not in analytics:
+                    _load_analytics()
+        return analytics['data_service']
+
+    def get_risk_scoring_job():
+        get_data_service()
+        return analytics['risk_scoring_job']
+
+    def get_dashboard_builder():
+        get_data_service()
+        return analytics['dashboard_builder']
+
+    def refresh_risk_scores():
+        """Nudge the scoring job if the model or data changed"""
+        risk_scoring_job = analytics.get('risk_scoring_job')
+        if risk_scoring_job is not None:
+            risk_scoring_job.refresh_if_stale()
 
     @app.route('/health', methods=['GET'])
     def health_check():
         """Health check endpoint"""
-        return jsonify({
+        return api_response({
             "status": "healthy",
             "message": "Wildfire Risk Prediction API is running",
             "version": "1.0.0",
-            "model_info": predictor.get_model_info()
+            "model_info": prediction_service.get_model_info()
         })
 
     @app.route('/predict', methods=['POST'])
+    @admission_controller.limit('single')
     def predict_fire_risk():
         """
         Predict wildfire risk based on environmental conditions
+        
+        With the prediction cache enabled, inputs are rounded to the cache
+        precision before scoring and the response lists the values scored
+        as 'scored_inputs' (see prediction_cache.py).
         """
         try:
             # Get JSON data from request
-            data = request.get_json()
+            with phase('parse'):
+                data = request.get_json()
             
             if not data:
-                return jsonify({"error": "No data provided"}), 400
+                return api_response({"error": "No data provided"}), 400
             
             # Validate that at least some data is provided
-            required_any = ['temperature', 'temp_mean', 'humidity', 'humidity_min', 'wind_speed', 'wind_speed_max']
-            if not any(field in data for field in required_any):
-                return jsonify({
-                    "error": "Please provide at least temperature, humidity, and wind speed data"
-                }), 400
+            with phase('validate'):
+                required_any = ['temperature', 'temp_mean', 'humidity', 'humidity_min', 'wind_speed', 'wind_speed_max']
+                has_required = isinstance(data, dict) and any(field in data for field in required_any)
+                if not has_required:
+                    return api_response({
+                        "error": "Please provide at least temperature, humidity, and wind speed data"
+                    }), 400
+                model = model_registry.route(data)
+                validated = model.service.validate_batch([data])
+            if validated is not None and not validated.valid[0]:
+                error = validated.errors()[0]
+                return api_response({"error": f"Invalid input: {error['error']}", "error_code": error['error_code']}), 400
             
             # Make prediction
-            prediction_result = predictor.predict(data)
+            with phase('score'):
+                prediction_result = model_registry.predict(data, model)
             
-            return jsonify(prediction_result)
+            with phase('serialize'):
+                return api_response(prediction_result)
             
         except ValueError as ve:
             logger.error(f"Validation error: {str(ve)}")
-            return jsonify({"error": f"Invalid input: {str(ve)}"}), 400
+            return api_response({"error": f"Invalid input: {str(ve)}"}), 400
+        except UnknownModel as e:
+            return api_response({"error": f"Unknown model: {e.args[0]}", "error_code": "unknown_model"}), 400
         except Exception as e:
             logger.error(f"Prediction error: {str(e)}")
-            return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
+            return api_response({"error": f"Prediction failed: {str(e)}"}), 500
 
     @app.route('/predict/batch', methods=['POST'])
+    @admission_controller.limit('batch', check_body=True)
     def predict_batch():
         """
         Predict wildfire risk for multiple locations
         """
         try:
-            request_data = request.get_json()
+            with phase('parse'):
+                request_data = request.get_json()
             
             if not request_data or 'data' not in request_data:
-                return jsonify({"error": "No data array provided"}), 400
+                return api_response({"error": "No data array provided"}), 400
             
             data_list = request_data['data']
-            predictions = []
+            if not isinstance(data_list, list):
+                return api_response({"error": "'data' must be an array of records"}), 400
+            BATCH_SIZE.observe(len(data_list))
+            admission_controller.check_batch_size(len(data_list))
             
-            for i, data_point in enumerate(data_list):
-                try:
-                    result = predictor.predict(data_point)
-                    result['index'] = i
-                    predictions.append(result)
-                except Exception as e:
-                    predictions.append({
-                        'index': i,
-                        'error': str(e),
-                        'fire_risk': 'Unknown',
-                        'probability': None
-                    })
+            # Rows are validated by the model they are routed to; invalid
+            # rows get an error result with an error_code
+            groups, predictions = model_registry.route_batch(data_list, model_id=request_data.get('model_id'))
+            for model_id, rows in groups.items():
+                with phase('validate'):
+                    validated = model_registry.get(model_id).service.validate_batch(
+                        model_registry.group_records(data_list, rows))
+                with phase('score'):
+                    model_registry.predict_group(model_id, data_list, rows, predictions, validated=validated)
             
-            return jsonify({
-                "predictions": predictions,
-                "total_processed": len(predictions)
-            })
+            with phase('serialize'):
+                return api_response({
+                    "predictions": predictions,
+                    "total_processed": len(predictions)
+                })
             
+        except AdmissionRejected:
+            raise
+        except UnknownModel as e:
+            return api_response({"error": f"Unknown model: {e.args[0]}", "error_code": "unknown_model"}), 400
         except Exception as e:
             logger.error(f"Batch prediction error: {str(e)}")
-            return jsonify({"error": f"Batch prediction failed: {str(e)}"}), 500
+            return api_response({"error": f"Batch prediction failed: {str(e)}"}), 500
+
+    @app.route('/predict/sweep', methods=['POST'])
+    @admission_controller.limit('batch')
+    def predict_sweep():
+        """
+        What-if grid: vary one or two features around a base condition
+        
+        Body: {"base": {...}, "sweep": [{"feature": "humidity", "start": 10,
+        "stop": 60, "step": 5}, ...]}
+        """
+        try:
+            with phase('parse'):
+                request_data = request.get_json(silent=True)
+            if not request_data or 'sweep' not in request_data:
+                return api_response({"error": "Provide a 'sweep' list and optionally a 'base' condition"}), 400
+            
+            from sweep import run_sweep
+            with phase('score'):
+                result = run_sweep(prediction_service, request_data.get('base'), request_data['sweep'])
+            with phase('serialize'):
+                return api_response({"success": True, "data": result})
+        
+        except ValueError as ve:
+            return api_response({"success": False, "error": f"Invalid sweep: {str(ve)}"}), 400
+        except Exception as e:
+            logger.error(f"Sweep error: {str(e)}")
+            return api_response({"error": f"Sweep failed: {str(e)}"}), 500
+
+    @app.route('/predict/grid', methods=['POST'])
+    @admission_controller.limit('batch')
+    def predict_grid():
+        """
+        Score every cell of a bbox grid and return a binary raster
+        
+        Body: {"bbox": [min_lon, min_lat, max_lon, max_lat], "resolution": deg,
+        "inputs": {"temperature": 30, "humidity": [...] | {"dtype": "float32",
+        "data": base64}}, "dtype": "uint8" | "float16"}
+        """
+        try:
+            from raster import (RASTER_MIMETYPE, RasterGrid, encode_raster,
+                                max_raster_cells, resolve_inputs, score_grid)
+            
+            with phase('parse'):
+                request_data = request.get_json(silent=True)
+                if not request_data:
+                    return api_response({"error": "No grid specification provided"}), 400
+                grid = RasterGrid.from_spec(request_data)
+                if grid.n_cells > max_raster_cells():
+                    return api_response({
+                        "error": f"Grid of {grid.n_cells} cells exceeds the limit of {max_raster_cells()}"
+                    }), 413
+                inputs = resolve_inputs(prediction_service, request_data.get('inputs', {}), grid.n_cells)
+            
+            with phase('score'):
+                data = score_grid(prediction_service, grid, inputs, request_data.get('dtype', 'uint8'))
+            
+            with phase('serialize'):
+                response = Response(encode_raster(grid, data), mimetype=RASTER_MIMETYPE)
+                response.headers['X-Model-Version'] = prediction_service.model_version
+                return response
+        
+        except ValueError as ve:
+            return api_response({"error": f"Invalid grid request: {str(ve)}"}), 400
+        except Exception as e:
+            logger.error(f"Grid scoring error: {str(e)}")
+            return api_response({"error": f"Grid scoring failed: {str(e)}"}), 500
+
+    @app.route('/jobs', methods=['POST'])
+    def submit_job():
+        """
+        Submit a dataset for background scoring
+        
+        Accepts {"data": [...]} as JSON, or a multipart upload with a 'file'
+        field holding JSON lines, a JSON array or CSV (format taken from the
+        'format' field or the file extension).
+        """
+        try:
+            if job_manager is None:
+                return api_response({"error": "Prediction service not available"}), 503
+            
+            if 'file' in request.files:
+                upload = request.files['file']
+                input_format = request.form.get('format') or Path(upload.filename or '').suffix.lstrip('.').lower()
+                state = job_manager.submit_file(upload, input_format)
+            else:
+                request_data = request.get_json(silent=True)
+                if not request_data or not isinstance(request_data.get('data'), list):
+                    return api_response({"error": "Provide a 'data' array or upload a 'file'"}), 400
+                state = job_manager.submit_records(request_data['data'])
+            
+            return api_response({
+                "success": True,
+                "job_id": state['id'],
+                "status": state['status'],
+                "status_url": f"/jobs/{state['id']}",
+                "results_url": f"/jobs/{state['id']}/results"
+            }), 202
+        except ValueError as ve:
+            return api_response({"error": str(ve)}), 400
+        except Exception as e:
+            logger.error(f"Job submission error: {str(e)}")
+            return api_response({"error": f"Job submission failed: {str(e)}"}), 500
+
+    @app.route('/jobs', methods=['GET'])
+    def list_jobs():
+        """List known scoring jobs, newest first"""
+        if job_manager is None:
+            return api_response({"error": "Prediction service not available"}), 503
+        return api_response({"success": True, "data": job_manager.store.list()})
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        """Get status and progress of a scoring job"""
+        if job_manager is None:
+            return api_response({"error": "Prediction service not available"}), 503
+        try:
+            return api_response({"success": True, "data": job_manager.get_status(job_id)})
+        except KeyError:
+            return api_response({"error": "Job not found"}), 404
+
+    @app.route('/jobs/<job_id>', methods=['DELETE'])
+    def cancel_job(job_id):
+        """Cancel a queued or running scoring job"""
+        if job_manager is None:
+            return api_response({"error": "Prediction service not available"}), 503
+        try:
+            return api_response({"success": True, "data": job_manager.cancel(job_id)})
+        except KeyError:
+            return api_response({"error": "Job not found"}), 404
+
+    @app.route('/jobs/<job_id>/results', methods=['GET'])
+    def get_job_results(job_id):
+        """Stream the results of a completed job as JSON lines"""
+        if job_manager is None:
+            return api_response({"error": "Prediction service not available"}), 503
+        try:
+            state = job_manager.get_status(job_id)
+        except KeyError:
+            return api_response({"error": "Job not found"}), 404
+        if state['status'] != 'completed':
+            return api_response({
+                "error": f"Job is {state['status']}",
+                "data": state
+            }), 409
+        return Response(job_manager.iter_results(job_id), mimetype='application/x-ndjson')
 
     @app.route('/model/info', methods=['GET'])
     def model_info():
         """Get information about the current model"""
         try:
-            info = predictor.get_model_info()
-            return jsonify(info)
+            info = prediction_service.get_model_info()
+            return api_response(info)
         except Exception as e:
             logger.error(f"Model info error: {str(e)}")
-            return jsonify({"error": f"Could not retrieve model info: {str(e)}"}), 500
+            return api_response({"error": f"Could not retrieve model info: {str(e)}"}), 500
+
+    @app.route('/models', methods=['GET'])
+    def list_models():
+        """Models in the registry, their regions and shadow pairs"""
+        if model_registry is None:
+            return api_response({"error": "Prediction service not available"}), 503
+        return api_response({"success": True, "data": model_registry.describe()})
 
     @app.route('/api/dataset-stats', methods=['GET'])
     def get_dataset_stats():
         """Get comprehensive dataset statistics"""
         try:
-            if DATA_SERVICE_AVAILABLE:
+            data_service = get_data_service()
+            if data_service is not None:
                 stats = data_service.get_dataset_statistics()
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": stats,
                     "source": "real_data"
                 })
             else:
                 # Mock data fallback
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": {
                         "total_records": 118858,
@@ -186,22 +471,23 @@ if FLASK_AVAILABLE:
                 })
         except Exception as e:
             logger.error(f"Error getting dataset stats: {str(e)}")
-            return jsonify({"error": "Failed to get dataset statistics"}), 500
+            return api_response({"error": "Failed to get dataset statistics"}), 500
 
     @app.route('/api/correlations', methods=['GET'])
     def get_correlations():
         """Get feature correlations with fire occurrence"""
         try:
-            if DATA_SERVICE_AVAILABLE:
+            data_service = get_data_service()
+            if data_service is not None:
                 correlations = data_service.get_correlation_data()
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": correlations,
                     "source": "real_data"
                 })
             else:
                 # Mock correlation data
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": {
                         "correlations": {
@@ -223,22 +509,42 @@ if FLASK_AVAILABLE:
                 })
         except Exception as e:
             logger.error(f"Error getting correlations: {str(e)}")
-            return jsonify({"error": "Failed to get correlations"}), 500
+            return api_response({"error": "Failed to get correlations"}), 500
 
     @app.route('/api/geographical-data', methods=['GET'])
     def get_geographical_data():
-        """Get geographical fire occurrence data"""
+        """
+        Get geographical fire occurrence data
+        
+        The sample is deterministic for given sample_size, risk_level and
+        optional seed, so responses carry an ETag and may be cached.
+        """
         try:
-            sample_size = request.args.get('sample_size', 300, type=int)
+            try:
+                filters = parse_filters(request.args.to_dict())
+            except ValueError as ve:
+                return api_response({"error": str(ve)}), 400
+            sample_size = filters.get('sample_size', 300)
+            risk_levels = filters.get('risk_level', [])
+            seed = filters.get('seed')
             
-            if DATA_SERVICE_AVAILABLE:
-                geo_data = data_service.get_geographical_data(sample_size)
-                return jsonify({
-                    "success": True,
-                    "data": geo_data,
-                    "count": len(geo_data),
-                    "source": "real_data"
-                })
+            data_service = get_data_service()
+            if data_service is not None:
+                refresh_risk_scores()
+                with phase('score'):
+                    geo_data = data_service.get_geographical_data(sample_size, risk_levels=risk_levels, seed=seed)
+                    version = data_service.sample_version(sample_size, risk_levels, seed)
+                with phase('serialize'):
+                    response = api_response({
+                        "success": True,
+                        "data": geo_data,
+                        "count": len(geo_data),
+                        "source": "real_data"
+                    })
+                # Weak: the encoded bytes depend on the negotiated format
+                response.set_etag(hashlib.sha1(repr(version).encode('utf-8')).hexdigest()[:16], weak=True)
+                response.headers['Cache-Control'] = 'public, max-age=60'
+                return response.make_conditional(request)
             else:
                 # Mock geographical data
                 import random
@@ -253,7 +559,7 @@ if FLASK_AVAILABLE:
                         "humidity": random.uniform(10, 90),
                         "wind_speed": random.uniform(5, 30)
                     })
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": mock_data,
                     "count": len(mock_data),
@@ -261,22 +567,23 @@ if FLASK_AVAILABLE:
                 })
         except Exception as e:
             logger.error(f"Error getting geographical data: {str(e)}")
-            return jsonify({"error": "Failed to get geographical data"}), 500
+            return api_response({"error": "Failed to get geographical data"}), 500
 
     @app.route('/api/outlier-analysis', methods=['GET'])
     def get_outlier_analysis():
         """Get outlier detection results"""
         try:
-            if DATA_SERVICE_AVAILABLE:
+            data_service = get_data_service()
+            if data_service is not None:
                 outliers = data_service.get_outlier_analysis()
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": outliers,
                     "source": "real_data"
                 })
             else:
                 # Mock outlier data
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": {
                         "temp_mean": {"outlier_count": 3338, "percentage": 2.81},
@@ -288,22 +595,23 @@ if FLASK_AVAILABLE:
                 })
         except Exception as e:
             logger.error(f"Error getting outlier analysis: {str(e)}")
-            return jsonify({"error": "Failed to get outlier analysis"}), 500
+            return api_response({"error": "Failed to get outlier analysis"}), 500
 
     @app.route('/api/feature-distributions', methods=['GET'])
     def get_feature_distributions():
         """Get feature statistical distributions"""
         try:
-            if DATA_SERVICE_AVAILABLE:
+            data_service = get_data_service()
+            if data_service is not None:
                 distributions = data_service.get_feature_distributions()
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": distributions,
                     "source": "real_data"
                 })
             else:
                 # Mock distribution data
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": {
                         "temp_mean": {"mean": 24.57, "std": 5.50, "min": -49.05, "max": 41.55},
@@ -315,22 +623,24 @@ if FLASK_AVAILABLE:
                 })
         except Exception as e:
             logger.error(f"Error getting feature distributions: {str(e)}")
-            return jsonify({"error": "Failed to get feature distributions"}), 500
+            return api_response({"error": "Failed to get feature distributions"}), 500
 
     @app.route('/api/risk-distribution', methods=['GET'])
     def get_risk_distribution():
         """Get risk level distribution"""
         try:
-            if DATA_SERVICE_AVAILABLE:
+            data_service = get_data_service()
+            if data_service is not None:
+                refresh_risk_scores()
                 risk_dist = data_service.get_risk_distribution()
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": risk_dist,
                     "source": "real_data"
                 })
             else:
                 # Mock risk distribution
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": {
                         "distribution": [
@@ -344,22 +654,160 @@ if FLASK_AVAILABLE:
                 })
         except Exception as e:
             logger.error(f"Error getting risk distribution: {str(e)}")
-            return jsonify({"error": "Failed to get risk distribution"}), 500
+            return api_response({"error": "Failed to get risk distribution"}), 500
+
+    @app.route('/api/dashboard', methods=['GET', 'POST'])
+    def get_dashboard():
+        """
+        Compute several analytics sections in one request
+        
+        GET takes comma separated ?sections= plus sample_size/risk_level/seed
+        filters; POST takes {"sections": [...], "filters": {...}}.
+        """
+        try:
+            dashboard_builder = get_dashboard_builder()
+            if dashboard_builder is None:
+                return api_response({"success": False, "error": "Data service not available"}), 503
+            
+            # The builder validates sections and filters (ValueError -> 400)
+            if request.method == 'POST':
+                with phase('parse'):
+                    body = request.get_json(silent=True) or {}
+                if not isinstance(body, dict):
+                    return api_response({"success": False, "error": "Body must be an object"}), 400
+                sections = body.get('sections')
+                filters = body.get('filters')
+            else:
+                sections = request.args.get('sections')
+                filters = {name: request.args[name] for name in ('sample_size', 'risk_level', 'seed')
+                           if name in request.args}
+            
+            with phase('score'):
+                dashboard = dashboard_builder.build(sections, filters)
+            with phase('serialize'):
+                return api_response({
+                    "success": True,
+                    "data": dashboard,
+                    "source": "real_data"
+                })
+        except ValueError as ve:
+            return api_response({"success": False, "error": str(ve)}), 400
+        except Exception as e:
+            logger.error(f"Error building dashboard: {str(e)}")
+            return api_response({"error": "Failed to build dashboard"}), 500
+
+    @app.route('/api/risk-scoring/status', methods=['GET'])
+    def get_risk_scoring_status():
+        """Get the state of the dataset model scoring job"""
+        risk_scoring_job = get_risk_scoring_job()
+        if risk_scoring_job is None:
+            return api_response({"success": False, "error": "Risk scoring job not running"}), 503
+        return api_response({
+            "success": True,
+            "data": risk_scoring_job.get_status()
+        })
+
+    @app.route('/api/stream/status', methods=['GET'])
+    def get_stream_status():
+        """Where to subscribe for live updates, and how many are connected"""
+        get_data_service()
+        stream_server = analytics.get('stream_server')
+        if stream_server is None or stream_server.error is not None or not stream_server.enabled:
+            return api_response({"success": False, "error": "Event stream not available"}), 503
+        event_broker = analytics['event_broker']
+        return api_response({
+            "success": True,
+            "data": {
+                "port": stream_server.port,
+                "path": stream_server.path,
+                "subscribers": event_broker.subscriber_count,
+                "last_event_id": event_broker.last_event_id
+            }
+        })
+
+    @app.route('/api/stations/status', methods=['GET'])
+    def get_station_monitor_status():
+        """Observation, rescoring and alert lag counters of the station monitor"""
+        get_data_service()
+        station_monitor = analytics.get('station_monitor')
+        if station_monitor is None:
+            return api_response({"success": False, "error": "Station monitor not running"}), 503
+        return api_response({"success": True, "data": station_monitor.get_status()})
+
+    def get_tile_store():
+        """Reader for the pre-rendered tile pyramid (built by tiles.py)"""
+        if 'tile_store' not in analytics:
+            from tiles import TileStore
+            analytics.setdefault('tile_store', TileStore())
+        return analytics['tile_store']
+
+    @app.route('/tiles/manifest.json', methods=['GET'])
+    def get_tile_manifest():
+        """Current tile pyramid version and zoom range"""
+        manifest = get_tile_store().manifest()
+        if manifest is None:
+            return api_response({"success": False, "error": "No tile pyramid has been built"}), 404
+        response = api_response({
+            "success": True,
+            "data": {
+                "version": manifest['version'],
+                "model_version": manifest['model_version'],
+                "min_zoom": manifest['min_zoom'],
+                "max_zoom": manifest['max_zoom'],
+                "tile_size": manifest['tile_size'],
+                "built_at": manifest['built_at'],
+                "tile_count": len(manifest['tiles']),
+                "url_template": f"/tiles/{manifest['version']}/{{z}}/{{x}}/{{y}}.png"
+            }
+        })
+        response.headers['Cache-Control'] = 'public, max-age=60'
+        return response
+
+    @app.route('/tiles/<version>/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+    def get_tile(version, z, x, y):
+        """
+        One risk tile; versioned URLs are immutable and cached for a year
+
+        Requests for another version are redirected to the current one
+        with a short cache lifetime, so stale map layers refresh on their
+        own and a versioned URL never serves different content.
+        """
+        tile_store = get_tile_store()
+        manifest = tile_store.manifest()
+        if manifest is None:
+            return api_response({"error": "No tile pyramid has been built"}), 404
+
+        if version != manifest['version']:
+            response = redirect(f"/tiles/{manifest['version']}/{z}/{x}/{y}.png")
+            response.headers['Cache-Control'] = 'public, max-age=60'
+            return response
+
+        path = tile_store.tile_path(z, x, y, manifest)
+        try:
+            response = (send_file(path, mimetype='image/png', conditional=True) if path is not None
+                        else Response(tile_store.EMPTY_TILE, mimetype='image/png'))
+        except FileNotFoundError:
+            # The build deleted it after a newer manifest replaced this one
+            return api_response({"error": "Tile version no longer available"}), 404
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        response.headers['X-Tile-Version'] = manifest['version']
+        return response
 
     @app.route('/api/historical-trends', methods=['GET'])
     def get_historical_trends():
         """Get historical fire trends"""
         try:
-            if DATA_SERVICE_AVAILABLE:
+            data_service = get_data_service()
+            if data_service is not None:
                 trends = data_service.get_historical_trends()
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": trends,
                     "source": "real_data"
                 })
             else:
                 # Mock historical trends
-                return jsonify({
+                return api_response({
                     "success": True,
                     "data": [
                         {"month": "Jan", "fires": 15, "riskLevel": 25},
@@ -379,7 +827,23 @@ if FLASK_AVAILABLE:
                 })
         except Exception as e:
             logger.error(f"Error getting historical trends: {str(e)}")
-            return jsonify({"error": "Failed to get historical trends"}), 500
+            return api_response({"error": "Failed to get historical trends"}), 500
+
+    def warm_up():
+        """
+        Load caches before serving traffic (used by serve.py)
+        
+        Scores the dataset, fills the dashboard cache and runs one prediction
+        so the first real requests do not pay for cold state.
+        """
+        risk_scoring_job = get_risk_scoring_job()
+        if risk_scoring_job is not None and not risk_scoring_job.is_current():
+            risk_scoring_job.run()
+        dashboard_builder = get_dashboard_builder()
+        if dashboard_builder is not None:
+            dashboard_builder.build()
+        if prediction_service is not None:
+            prediction_service.predict({"temperature": 25.0, "humidity": 40.0, "wind_speed": 10.0})
 
 def test_api():
     """Test the API without Flask"""
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Gradient-boosted tree training and export
+
+Trains an xgboost classifier on the wildfire dataset and exports it to the
+flat tree format evaluated by tree_ensemble.TreeEnsemble, so serving needs
+only NumPy. The exported JSON has model_type 'GradientBoostedTrees', which
+makes SimpleWildfirePredictionService use the tree engine.
+
+xgboost is only needed here, at training time.
+
+Usage:
+    python utils/boosted_model.py [--trees 200] [--depth 4] [--output ../boosted_wildfire_model.json]
+
+Serve the result by pointing the prediction service at it, e.g. copying it
+to ../pyro_cast_ai_model.json.
+"""
+import argparse
+import json
+import math
+from pathlib import Path
+
+from simple_model import KEY_FEATURES, load_csv_data
+
+BOOSTED_MODEL_TYPE = 'GradientBoostedTrees'
+
+
+def _feature_index(split, features):
+    """Column index of a split feature: a feature name or xgboost's 'f<i>'"""
+    if split in features:
+        return features.index(split)
+    if split.startswith('f') and split[1:].isdigit():
+        return int(split[1:])
+    raise ValueError(f"Unknown split feature '{split}'")
+
+
+def flatten_xgboost_dump(tree_dumps, features):
+    """
+    Convert xgboost JSON tree dumps to flat node arrays
+
+    Args:
+        tree_dumps: Booster.get_dump(dump_format='json') output, one JSON
+            string per tree
+        features: Model feature names, in column order
+
+    Returns:
+        Dict of 'roots' plus the per-node arrays of the 'trees' format
+    """
+    arrays = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'default_left', 'value')}
+    roots = []
+
+    for dump in tree_dumps:
+        # xgboost numbers nodes per tree; give them global indices
+        nodes = {}
+        stack = [json.loads(dump)]
+        while stack:
+            node = stack.pop()
+            nodes[node['nodeid']] = node
+            stack.extend(node.get('children', []))
+        offset = len(arrays['feature'])
+        index = {nodeid: offset + i for i, nodeid in enumerate(sorted(nodes))}
+        roots.append(index[0])
+
+        for nodeid in sorted(nodes):
+            node = nodes[nodeid]
+            if 'leaf' in node:
+                arrays['feature'].append(-1)
+                arrays['threshold'].append(0.0)
+                arrays['left'].append(-1)
+                arrays['right'].append(-1)
+                arrays['default_left'].append(0)
+                arrays['value'].append(float(node['leaf']))
+            else:
+                arrays['feature'].append(_feature_index(node['split'], features))
+                arrays['threshold'].append(float(node['split_condition']))
+                arrays['left'].append(index[node['yes']])
+                arrays['right'].append(index[node['no']])
+                arrays['default_left'].append(int(node['missing'] == node['yes']))
+                arrays['value'].append(0.0)
+
+    return dict(roots=roots, **arrays)
+
+
+def parse_base_score(value):
+    """
+    base_score from a Booster config: "0.5" on older xgboost, a bracketed
+    vector such as "[4.984375E-1]" on current releases
+    """
+    values = value.strip().strip('[]').split(',')
+    if len(values) != 1:
+        raise ValueError(f"Expected a single base_score, got {value}")
+    return float(values[0])
+
+
+def export_xgboost(booster, features, accuracy):
+    """
+    Model JSON dict for a trained binary:logistic xgboost Booster
+
+    Args:
+        booster: xgboost.Booster
+        features: Model feature names, in training column order
+        accuracy: Held-out accuracy to record
+    """
+    from tree_ensemble import TreeEnsemble
+
+    config = json.loads(booster.save_config())
+    objective = config['learner']['objective']['name']
+    if objective != 'binary:logistic':
+        raise ValueError(f"Only binary:logistic models can be exported, not {objective}")
+    # base_score is a probability for logistic objectives; trees add margins
+    base_probability = parse_base_score(config['learner']['learner_model_param']['base_score'])
+    base_score = math.log(base_probability / (1.0 - base_probability))
+
+    trees = flatten_xgboost_dump(booster.get_dump(dump_format='json'), features)
+    ensemble = TreeEnsemble(trees['roots'], trees['feature'], trees['threshold'], trees['left'],
+                            trees['right'], trees['default_left'], trees['value'], base_score=base_score)
+    return {
+        'model_type': BOOSTED_MODEL_TYPE,
+        'features': list(features),
+        'accuracy': accuracy,
+        'objective': objective,
+        'base_score': base_score,
+        'n_trees': ensemble.n_trees,
+        'max_depth': ensemble.max_depth,
+        'trees': ensemble.to_dict()
+    }
+
+
+def train_boosted_model(data, key_features=KEY_FEATURES, n_trees=200, max_depth=4, learning_rate=0.1):
+    """
+    Train an xgboost classifier on a list of records and export it
+
+    Args:
+        data: List of dicts with the key features and an 'occured' label
+        key_features: Feature names used by the model
+        n_trees: Boosting rounds
+        max_depth: Maximum tree depth
+        learning_rate: Shrinkage per round
+
+    Returns:
+        Model dict in the flat tree format
+    """
+    import numpy as np
+    import xgboost as xgb
+
+    rows = [row for row in data
+            if 'occured' in row and all(isinstance(row.get(f), (int, float)) for f in key_features)]
+    print(f"📋 Filtered to {len(rows)} complete records")
+
+    X = np.array([[row[f] for f in key_features] for row in rows], dtype=np.float32)
+    y = np.array([int(row['occured']) for row in rows])
+    split_idx = int(0.8 * len(X))
+
+    print(f"🧠 Training {n_trees} trees of depth {max_depth}...")
+    train = xgb.DMatrix(X[:split_idx], label=y[:split_idx], feature_names=list(key_features))
+    booster = xgb.train(
+        {'objective': 'binary:logistic', 'max_depth': max_depth, 'eta': learning_rate},
+        train, num_boost_round=n_trees
+    )
+
+    test = xgb.DMatrix(X[split_idx:], feature_names=list(key_features))
+    accuracy = float(((booster.predict(test) > 0.5) == y[split_idx:]).mean())
+    print(f"📈 Test Accuracy: {accuracy:.3f}")
+
+    model_data = export_xgboost(booster, key_features, accuracy)
+
+    # The exported engine must reproduce xgboost's own predictions
+    from tree_ensemble import TreeEnsemble
+    engine = TreeEnsemble.from_model_data(model_data)
+    max_diff = float(np.abs(engine.predict_proba(X[split_idx:]) - booster.predict(test)).max())
+    print(f"🔍 Max difference from xgboost: {max_diff:.2e}")
+    return model_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and export a gradient-boosted tree model")
+    parser.add_argument('--data', default="../data/raw/wildfire_dataset.csv")
+    parser.add_argument('--output', default="../boosted_wildfire_model.json")
+    parser.add_argument('--trees', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--learning-rate', type=float, default=0.1)
+    args = parser.parse_args()
+
+    print("🚀 Starting boosted tree model training...")
+    data_file = Path(args.data)
+    if not data_file.exists():
+        print(f"❌ Data file not found: {data_file}")
+        return
+    data = load_csv_data(data_file)
+    print(f"✅ Loaded {len(data)} records")
+
+    model_data = train_boosted_model(data, n_trees=args.trees, max_depth=args.depth,
+                                     learning_rate=args.learning_rate)
+    with open(args.output, 'w') as f:
+        json.dump(model_data, f)
+    print(f"💾 Model saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Bundled dashboard analytics
+
+The frontend charts used to issue one request per analytics endpoint. The
+dashboard builder computes any subset of those sections concurrently on a
+thread pool against the shared data service, and returns them as a single
+payload with per-section timings.
+
+Section names and filters come straight from request bodies and query
+strings; build() rejects malformed ones with ValueError (a 400 from the
+API) instead of letting them fail inside a section.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+# Section name -> (data service call, cacheable). Names match the standalone
+# /api/<name> endpoints.
+SECTIONS = {
+    'dataset-stats': (lambda ds, filters: ds.get_dataset_statistics(), True),
+    'correlations': (lambda ds, filters: ds.get_correlation_data(), True),
+    'feature-distributions': (lambda ds, filters: ds.get_feature_distributions(), True),
+    'outlier-analysis': (lambda ds, filters: ds.get_outlier_analysis(), True),
+    'risk-distribution': (lambda ds, filters: ds.get_risk_distribution(), True),
+    'historical-trends': (lambda ds, filters: ds.get_historical_trends(), True),
+    'geographical-data': (
+        lambda ds, filters: ds.get_geographical_data(
+            filters.get('sample_size', 300), risk_levels=filters.get('risk_level'), seed=filters.get('seed')
+        ),
+        # Cached by the data service per sample_size/risk_level/seed
+        False
+    ),
+}
+
+
+def parse_names(value, field):
+    """List of names from a list of strings or a comma separated string"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [name for name in value.split(',') if name]
+    if isinstance(value, list) and all(isinstance(name, str) for name in value):
+        return value
+    raise ValueError(f"'{field}' must be a list of names or a comma separated string")
+
+
+def parse_int(value, field, minimum):
+    """Integer from a JSON number or query string, at least minimum"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"'{field}' must be an integer")
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"'{field}' must be an integer") from None
+    if number < minimum:
+        raise ValueError(f"'{field}' must be at least {minimum}")
+    return number
+
+
+def parse_seed(value):
+    """Sample seed, None for the default order; numpy rejects negative seeds"""
+    return None if value is None else parse_int(value, 'seed', 0)
+
+
+def parse_filters(filters):
+    """Validated copy of the sample filters of a request"""
+    if filters is None:
+        return {}
+    if not isinstance(filters, dict):
+        raise ValueError("'filters' must be an object")
+    parsed = {}
+    if filters.get('sample_size') is not None:
+        parsed['sample_size'] = parse_int(filters['sample_size'], 'sample_size', 1)
+    if filters.get('risk_level'):
+        parsed['risk_level'] = parse_names(filters['risk_level'], 'risk_level')
+    if filters.get('seed') is not None:
+        parsed['seed'] = parse_seed(filters['seed'])
+    return parsed
+
+
+class DashboardBuilder:
+    """
+    Computes dashboard sections concurrently with a shared result cache
+
+    Cached results are keyed on the data version and the model version of the
+    attached risk scores, so a reload or rescore invalidates them.
+    """
+
+    def __init__(self, data_service, max_workers=4, before_build=None):
+        self.data_service = data_service
+        self.before_build = before_build
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dashboard")
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+    def _state_key(self):
+        return (self.data_service.data_version, self.data_service.risk_scores_model_version)
+
+    def _compute_section(self, name, filters):
+        compute, cacheable = SECTIONS[name]
+        start = time.perf_counter()
+        cache_key = (name, self._state_key())
+
+        if cacheable:
+            with self._cache_lock:
+                cached = self._cache.get(cache_key)
+            if cached is not None:
+                return {
+                    'success': True,
+                    'data': cached,
+                    'cached': True,
+                    'elapsed_ms': (time.perf_counter() - start) * 1000
+                }
+
+        try:
+            data = compute(self.data_service, filters)
+        except Exception as e:
+            logger.error(f"Dashboard section {name} failed: {str(e)}")
+            return {
+                'success': False,
+                'error': f"Failed to compute {name}",
+                'elapsed_ms': (time.perf_counter() - start) * 1000
+            }
+
+        if cacheable:
+            with self._cache_lock:
+                # Drop entries computed against an older data or model version
+                state = cache_key[1]
+                for key in [k for k in self._cache if k[1] != state]:
+                    del self._cache[key]
+                self._cache[cache_key] = data
+
+        return {
+            'success': True,
+            'data': data,
+            'cached': False,
+            'elapsed_ms': (time.perf_counter() - start) * 1000
+        }
+
+    def build(self, sections=None, filters=None):
+        """
+        Compute the requested sections
+
+        Args:
+            sections: List of section names from SECTIONS, or a comma
+                separated string; all sections when empty
+            filters: Optional dict with sample_size, risk_level and seed
+
+        Returns:
+            Dict with a result per section and the total elapsed time
+
+        Raises:
+            ValueError: For unknown sections or malformed filters
+        """
+        start = time.perf_counter()
+        sections = parse_names(sections, 'sections') or list(SECTIONS)
+        unknown = [name for name in sections if name not in SECTIONS]
+        if unknown:
+            raise ValueError(f"Unknown dashboard sections: {', '.join(unknown)}")
+
+        filters = parse_filters(filters)
+        if self.before_build is not None:
+            self.before_build()
+
+        futures = {
+            name: self._executor.submit(self._compute_section, name, filters)
+            for name in dict.fromkeys(sections)
+        }
+        results = {name: future.result() for name, future in futures.items()}
+
+        return {
+            'sections': results,
+            'elapsed_ms': (time.perf_counter() - start) * 1000
+        }
@@ -3,21 +3,132 @@
 Data service to extract and serve real data from notebooks for frontend
 """
 import json
+import time
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 from pathlib import Path
 
+from metrics import DATA_LOAD_DURATION
+
+# Columns written by the model scoring job (see risk_scoring.py); they are
+# derived from the features and are excluded from the dataset analytics
+MODEL_PROBABILITY_COLUMN = 'model_probability'
+MODEL_RISK_COLUMN = 'model_risk'
+DERIVED_COLUMNS = [MODEL_PROBABILITY_COLUMN, MODEL_RISK_COLUMN]
+
+RISK_COLORS = {
+    'Low': '#10b981',
+    'Medium': '#f59e0b',
+    'High': '#fb923c',
+    'Extreme': '#ef4444'
+}
+
+# Map samples are prefixes of a precomputed stratified order; strata are
+# fire/no-fire per lat/lon cell of this size
+SAMPLE_REGION_DEGREES = 30.0
+DEFAULT_SAMPLE_SEED = 0
+# Orders for explicit seeds, and map sample responses, kept per data version
+SAMPLE_SEEDS_KEPT = 8
+SAMPLE_CACHE_SIZE = 32
+
+def stratified_order(df, seed=DEFAULT_SAMPLE_SEED, region_degrees=SAMPLE_REGION_DEGREES):
+    """
+    Row positions of df in a random order interleaved across strata
+    
+    Strata are fire/no-fire by lat/lon cell. Rows are shuffled, then each
+    row is placed at its rank within its stratum divided by the stratum
+    size (plus jitter), so every prefix of the order holds each stratum in
+    about its share of the dataset.
+    
+    Args:
+        df: Dataset DataFrame
+        seed: Random seed; the same data and seed give the same order
+        region_degrees: Size of the lat/lon cells
+    """
+    n_rows = len(df)
+    rng = np.random.default_rng(seed)
+    key = np.zeros(n_rows, dtype=np.int64)
+    if 'lat' in df.columns and 'lon' in df.columns:
+        lat = df['lat'].to_numpy(dtype=np.float64, na_value=np.nan)
+        lon = df['lon'].to_numpy(dtype=np.float64, na_value=np.nan)
+        known = np.isfinite(lat) & np.isfinite(lon)
+        n_cols = int(np.ceil(360 / region_degrees)) + 1
+        cells = (np.floor((np.where(known, lat, 0) + 90) / region_degrees) * n_cols
+                 + np.floor((np.where(known, lon, 0) + 180) / region_degrees))
+        key = np.where(known, cells, -1).astype(np.int64) * 2
+    if 'occured' in df.columns:
+        key += (df['occured'].to_numpy() == 1)
+    _, strata = np.unique(key, return_inverse=True)
+    counts = np.bincount(strata)
+    
+    shuffled = rng.permutation(n_rows)
+    shuffled_strata = strata[shuffled]
+    # Rank of each shuffled row within its stratum
+    by_stratum = np.argsort(shuffled_strata, kind='stable')
+    rank = np.empty(n_rows, dtype=np.float64)
+    rank[by_stratum] = np.arange(n_rows) - np.repeat(np.cumsum(counts) - counts, counts)
+    position = (rank + rng.random(n_rows)) / counts[shuffled_strata]
+    return shuffled[np.argsort(position, kind='stable')]
+
+def _filtered_prefix(order, keep, n):
+    """First n entries of order passing keep(rows), scanning only as far as needed"""
+    picked = []
+    found = 0
+    start = 0
+    step = max(2 * n, 1024)
+    while found < n and start < len(order):
+        chunk = order[start:start + step]
+        chunk = chunk[keep(chunk)]
+        picked.append(chunk)
+        found += len(chunk)
+        start += step
+        step *= 2
+    return np.concatenate(picked)[:n] if picked else order[:0]
+
+def generate_mock_frame(n_samples, seed=42):
+    """
+    Synthetic dataset with the columns and rough distributions of the real one
+    
+    Args:
+        n_samples: Number of rows
+        seed: Random seed
+    """
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({
+        'daynight_N': rng.choice([0, 1], n_samples, p=[0.85, 0.15]),
+        'lat': rng.uniform(-60, 70, n_samples),
+        'lon': rng.uniform(-180, 180, n_samples),
+        'fire_weather_index': rng.normal(15, 10, n_samples),
+        'temp_mean': rng.normal(25, 8, n_samples),
+        'humidity_min': rng.uniform(10, 90, n_samples),
+        'wind_speed_max': rng.gamma(2, 8, n_samples),
+        'pressure_mean': rng.normal(1013, 30, n_samples),
+        'frp': rng.exponential(20, n_samples),
+        'occured': rng.choice([0, 1], n_samples, p=[0.5, 0.5])
+    })
+
 class WildfireDataService:
     def __init__(self):
         self.data_path = Path(__file__).parent.parent / "data" / "raw" / "wildfire_dataset.csv"
         self.df = None
+        self.data_version = 0
+        # Last data version that replaced rows rather than appending them
+        self.reload_version = 0
+        self.risk_scores_data_version = None
+        self.risk_scores_model_version = None
+        self._sample_orders = OrderedDict()
+        self._sample_cache = OrderedDict()
         self.load_data()
     
     def load_data(self):
         """Load the wildfire dataset"""
+        start = time.perf_counter()
+        source = 'mock'
         try:
             if self.data_path.exists():
                 self.df = pd.read_csv(self.data_path)
+                source = 'csv'
                 print(f"✅ Loaded {len(self.df)} wildfire records")
             else:
                 print("⚠️  Dataset not found, using mock data")
@@ -25,40 +136,93 @@ class WildfireDataService:
         except Exception as e:
             print(f"❌ Error loading data: {e}")
             self.create_mock_data()
+        DATA_LOAD_DURATION.observe(time.perf_counter() - start, source)
+        
+        # Any previously attached model scores belong to the old frame
+        self.data_version += 1
+        self.reload_version = self.data_version
+        # Map samples are slices of this order
+        self.sample_order()
     
-    def create_mock_data(self):
+    def create_mock_data(self, n_samples=1000):
         """Create mock data if real dataset not available"""
-        np.random.seed(42)
-        n_samples = 1000
-        
-        self.df = pd.DataFrame({
-            'daynight_N': np.random.choice([0, 1], n_samples, p=[0.85, 0.15]),
-            'lat': np.random.uniform(-60, 70, n_samples),
-            'lon': np.random.uniform(-180, 180, n_samples),
-            'fire_weather_index': np.random.normal(15, 10, n_samples),
-            'temp_mean': np.random.normal(25, 8, n_samples),
-            'humidity_min': np.random.uniform(10, 90, n_samples),
-            'wind_speed_max': np.random.gamma(2, 8, n_samples),
-            'pressure_mean': np.random.normal(1013, 30, n_samples),
-            'frp': np.random.exponential(20, n_samples),
-            'occured': np.random.choice([0, 1], n_samples, p=[0.5, 0.5])
-        })
+        self.df = generate_mock_frame(n_samples)
         print("📊 Created mock dataset for demonstration")
     
+    def use_dataframe(self, df):
+        """
+        Replace the loaded dataset, e.g. with synthetic data for benchmarks
+        
+        Bumps the data version so derived scores and caches are refreshed.
+        """
+        self.df = df
+        self.data_version += 1
+        self.reload_version = self.data_version
+    
+    def append_data(self, rows):
+        """
+        Append new rows to the dataset, keeping existing row ids
+        
+        Args:
+            rows: DataFrame with the dataset's feature columns
+        """
+        self.df = pd.concat([self.feature_df, rows], ignore_index=True)
+        self.data_version += 1
+    
+    def rows_unchanged_since(self, data_version):
+        """Whether rows present at data_version are still the same rows"""
+        return data_version is not None and self.reload_version <= data_version
+    
+    @property
+    def feature_df(self):
+        """Dataset without the model-derived columns"""
+        return self.df.drop(columns=[c for c in DERIVED_COLUMNS if c in self.df.columns])
+    
+    def attach_risk_scores(self, probabilities, risk_levels, model_version, data_version):
+        """
+        Store model probabilities and risk classes as dataset columns
+        
+        Args:
+            probabilities: Array of fire probabilities, one per row
+            risk_levels: Array of risk level labels, one per row
+            model_version: Version of the model that produced the scores
+            data_version: Data version the scores were computed against
+            
+        Returns:
+            True if attached, False if the data was reloaded meanwhile
+        """
+        if data_version != self.data_version or len(probabilities) != len(self.df):
+            return False
+        
+        self.df[MODEL_PROBABILITY_COLUMN] = probabilities
+        self.df[MODEL_RISK_COLUMN] = pd.Categorical(
+            risk_levels, categories=list(RISK_COLORS), ordered=True
+        )
+        self.risk_scores_data_version = data_version
+        self.risk_scores_model_version = model_version
+        return True
+    
+    def has_model_risk(self):
+        """Whether model risk columns are present for the current data"""
+        return (self.df is not None
+                and MODEL_RISK_COLUMN in self.df.columns
+                and self.risk_scores_data_version == self.data_version)
+    
     def get_dataset_statistics(self):
         """Get comprehensive dataset statistics"""
         if self.df is None:
             return {}
         
+        df = self.feature_df
         stats = {
-            'total_records': len(self.df),
-            'total_features': len(self.df.columns) - 1,  # Exclude target
-            'fire_incidents': int(self.df['occured'].sum()),
-            'no_fire_cases': int(len(self.df) - self.df['occured'].sum()),
-            'fire_percentage': float(self.df['occured'].mean() * 100),
-            'no_fire_percentage': float((1 - self.df['occured'].mean()) * 100),
-            'missing_values': int(self.df.isnull().sum().sum()),
-            'missing_percentage': float(self.df.isnull().sum().sum() / self.df.size * 100)
+            'total_records': len(df),
+            'total_features': len(df.columns) - 1,  # Exclude target
+            'fire_incidents': int(df['occured'].sum()),
+            'no_fire_cases': int(len(df) - df['occured'].sum()),
+            'fire_percentage': float(df['occured'].mean() * 100),
+            'no_fire_percentage': float((1 - df['occured'].mean()) * 100),
+            'missing_values': int(df.isnull().sum().sum()),
+            'missing_percentage': float(df.isnull().sum().sum() / df.size * 100)
         }
         return stats
     
@@ -68,7 +232,7 @@ class WildfireDataService:
             return {}
         
         # Calculate correlations with fire occurrence
-        correlations = self.df.corr()['occured'].drop('occured').sort_values(key=abs, ascending=False)
+        correlations = self.feature_df.corr(numeric_only=True)['occured'].drop('occured').sort_values(key=abs, ascending=False)
         
         return {
             'correlations': {
@@ -90,7 +254,7 @@ class WildfireDataService:
             return {}
         
         distributions = {}
-        numeric_cols = self.df.select_dtypes(include=[np.number]).columns.drop('occured')
+        numeric_cols = self.feature_df.select_dtypes(include=[np.number]).columns.drop('occured')
         
         for col in numeric_cols:
             distributions[col] = {
@@ -105,28 +269,114 @@ class WildfireDataService:
         
         return distributions
     
-    def get_geographical_data(self, sample_size=500):
-        """Get geographical fire occurrence data"""
+    def sample_order(self, seed=None):
+        """
+        Stratified random order of the current rows (see stratified_order),
+        computed once per data version and seed
+        
+        Args:
+            seed: Random seed; None for the default order
+        """
+        seed = DEFAULT_SAMPLE_SEED if seed is None else int(seed)
+        key = (self.data_version, seed)
+        order = self._sample_orders.get(key)
+        if order is None:
+            order = stratified_order(self.df, seed)
+            order.flags.writeable = False
+            for stale in [k for k in self._sample_orders if k[0] != self.data_version]:
+                self._sample_orders.pop(stale, None)
+            self._sample_orders[key] = order
+            while len(self._sample_orders) > SAMPLE_SEEDS_KEPT:
+                self._sample_orders.popitem(last=False)
+        return order
+    
+    def sample_version(self, sample_size, risk_levels=None, seed=None):
+        """
+        Identifies the points get_geographical_data() returns for these
+        arguments; changes when the data or the attached scores change
+        """
+        has_model_risk = self.has_model_risk()
+        levels = tuple(sorted(risk_levels)) if risk_levels and has_model_risk else ()
+        return (self.data_version, self.risk_scores_model_version if has_model_risk else None,
+                int(sample_size), levels, DEFAULT_SAMPLE_SEED if seed is None else int(seed))
+    
+    def get_geographical_data(self, sample_size=500, risk_levels=None, seed=None):
+        """
+        Get geographical fire occurrence data
+        
+        The points are a prefix of a stratified random order fixed per
+        data version, so the same arguments always return the same points
+        and a larger sample_size extends a smaller one. Responses are
+        cached per sample_version().
+        
+        Args:
+            sample_size: Maximum number of points to return
+            risk_levels: Optional list of model risk levels to keep; ignored
+                until the model scores have been attached
+            seed: Optional seed for a different (equally reproducible)
+                sample; None uses the default order
+        """
         if self.df is None or 'lat' not in self.df.columns or 'lon' not in self.df.columns:
             return []
         
-        # Sample data for performance
-        sample_df = self.df.sample(n=min(sample_size, len(self.df)))
+        key = self.sample_version(sample_size, risk_levels, seed)
+        points = self._sample_cache.get(key)
+        if points is not None:
+            return points
         
-        geo_data = []
-        for _, row in sample_df.iterrows():
-            geo_data.append({
-                'lat': float(row['lat']),
-                'lon': float(row['lon']),
-                'fire_occurred': bool(row['occured']),
-                'fire_weather_index': float(row.get('fire_weather_index', 0)),
-                'temperature': float(row.get('temp_mean', 20)),
-                'humidity': float(row.get('humidity_min', 50)),
-                'wind_speed': float(row.get('wind_speed_max', 10)),
-                'frp': float(row.get('frp', 0))
-            })
+        has_model_risk = self.has_model_risk()
+        order = self.sample_order(seed)
+        if key[3]:
+            risk = self.df[MODEL_RISK_COLUMN].cat
+            wanted = risk.categories.get_indexer(list(key[3]))
+            # Unknown levels would match the -1 code of missing values
+            wanted = wanted[wanted >= 0]
+            codes = risk.codes.to_numpy()
+            rows = _filtered_prefix(order, lambda chunk: np.isin(codes[chunk], wanted), key[2])
+        else:
+            rows = order[:max(key[2], 0)]
+        points = self._points(self.df.iloc[rows], has_model_risk)
         
-        return geo_data
+        self._sample_cache[key] = points
+        while len(self._sample_cache) > SAMPLE_CACHE_SIZE:
+            self._sample_cache.popitem(last=False)
+        return points
+    
+    def get_points(self, row_ids):
+        """
+        Map points for specific rows, shaped like get_geographical_data()
+        
+        Args:
+            row_ids: Row ids (positions) in the current dataset
+        """
+        if self.df is None or 'lat' not in self.df.columns or 'lon' not in self.df.columns:
+            return []
+        return self._points(self.df.iloc[row_ids], self.has_model_risk())
+    
+    def _points(self, frame, has_model_risk):
+        """Build point dicts column by column from a slice of the dataset"""
+        def column(name, default, cast=float):
+            if name in frame.columns:
+                return [cast(value) for value in frame[name].tolist()]
+            return [cast(default)] * len(frame)
+        
+        columns = {
+            'id': [int(index) for index in frame.index.tolist()],
+            'lat': column('lat', 0),
+            'lon': column('lon', 0),
+            'fire_occurred': column('occured', 0, bool),
+            'fire_weather_index': column('fire_weather_index', 0),
+            'temperature': column('temp_mean', 20),
+            'humidity': column('humidity_min', 50),
+            'wind_speed': column('wind_speed_max', 10),
+            'frp': column('frp', 0)
+        }
+        if has_model_risk:
+            columns['risk_level'] = column(MODEL_RISK_COLUMN, 'Unknown', str)
+            columns['fire_probability'] = column(MODEL_PROBABILITY_COLUMN, 0)
+        
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
     
     def get_outlier_analysis(self):
         """Get outlier detection results"""
@@ -162,6 +412,22 @@ class WildfireDataService:
         if self.df is None:
             return {}
         
+        if self.has_model_risk():
+            risk_counts = self.df[MODEL_RISK_COLUMN].value_counts(sort=False)
+            return {
+                'distribution': [
+                    {
+                        'name': risk_level,
+                        'value': int(count),
+                        'percentage': float(count / len(self.df) * 100),
+                        'color': RISK_COLORS[risk_level]
+                    }
+                    for risk_level, count in risk_counts.items()
+                ],
+                'method': 'model',
+                'model_version': self.risk_scores_model_version
+            }
+        
         # Create risk categories based on fire weather index and other factors
         conditions = [
             (self.df.get('fire_weather_index', 0) <= 5),
@@ -179,10 +445,12 @@ class WildfireDataService:
                 {
                     'name': risk_level,
                     'value': int(count),
-                    'percentage': float(count / len(self.df) * 100)
+                    'percentage': float(count / len(self.df) * 100),
+                    'color': RISK_COLORS[risk_level]
                 }
                 for risk_level, count in risk_counts.items()
-            ]
+            ],
+            'method': 'fire_weather_index'
         }
 
     def get_historical_trends(self):
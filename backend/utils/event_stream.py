@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Server-sent events channel for live dashboard updates
+
+Flask serves one request per thread, which does not scale to hundreds of
+long-lived subscriptions. Streams are therefore served by a small asyncio
+server on its own port, running in a daemon thread next to the WSGI app:
+
+    GET /stream[?topics=risk,dataset]       text/event-stream
+
+Producers in any thread call EventBroker.publish(); the event is encoded
+once, kept in a short history and handed to the event loop, which fans it
+out to per-client bounded queues. A client whose queue overflows is
+disconnected; browsers reconnect with Last-Event-ID and are replayed the
+events they missed, or sent a 'resync' event when those are no longer in
+the history.
+
+Event ids are "<epoch>-<sequence>", where the epoch is random per broker.
+Pre-forked workers share the stream port and each count their own
+sequence, so a client that reconnects to another worker (or after a
+restart) presents an epoch the broker does not know; it is sent 'resync'
+rather than replayed against an unrelated sequence. The resync carries the
+broker's current id, so later reconnects to the same worker replay.
+
+Configuration (environment):
+    PYROCAST_STREAM_PORT             port of the stream server (5001, 0 disables)
+    PYROCAST_STREAM_HOST             bind address (0.0.0.0)
+    PYROCAST_STREAM_HISTORY          events kept for replay (256)
+    PYROCAST_STREAM_CLIENT_QUEUE     events buffered per client (64)
+    PYROCAST_STREAM_HEARTBEAT        seconds between keep-alive comments (15)
+"""
+import asyncio
+import json
+import logging
+import os
+import secrets
+import socket
+import threading
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+from metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+STREAM_SUBSCRIBERS = gauge(
+    'pyrocast_stream_subscribers', 'Connected event stream clients')
+STREAM_EVENTS = counter(
+    'pyrocast_stream_events_total', 'Events published to the stream', ('type',))
+STREAM_DROPPED = counter(
+    'pyrocast_stream_dropped_clients_total', 'Clients disconnected for falling behind')
+
+MAX_REQUEST_HEAD = 8192
+
+
+def format_event(event_id, event_type, data):
+    """Encode one event in the text/event-stream wire format"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+class Subscriber:
+    """One connected client: its topic filter and pending events"""
+
+    def __init__(self, topics, queue_size):
+        self.topics = topics
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.last_id = 0
+
+    def wants(self, event_type):
+        return self.topics is None or event_type in self.topics
+
+
+class EventBroker:
+    """
+    Thread-safe publisher with replay history
+
+    Args:
+        history_size: Events kept for clients that reconnect
+        queue_size: Events buffered per client before it is dropped
+    """
+
+    def __init__(self, history_size=None, queue_size=None):
+        env = os.environ.get
+        self._history = deque(maxlen=history_size or int(env('PYROCAST_STREAM_HISTORY', 256)))
+        self.queue_size = queue_size or int(env('PYROCAST_STREAM_CLIENT_QUEUE', 64))
+        self._lock = threading.Lock()
+        self.epoch = secrets.token_hex(4)
+        self._next_id = 1
+        self._loop = None
+        # Only touched from the event loop thread
+        self._subscribers = set()
+
+    @property
+    def last_event_id(self):
+        return self.format_id(self._next_id - 1)
+
+    def format_id(self, sequence):
+        """Wire id of an event sequence number"""
+        return f"{self.epoch}-{sequence}"
+
+    def parse_id(self, event_id):
+        """Sequence number of a wire id from this broker, or None"""
+        epoch, _, sequence = (event_id or '').rpartition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def bind_loop(self, loop):
+        """Deliver events through this event loop"""
+        self._loop = loop
+
+    def publish(self, event_type, data):
+        """
+        Publish an event to every subscriber of its type
+
+        Safe to call from any thread.
+
+        Returns:
+            The event sequence number
+        """
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            item = (event_id, event_type, format_event(self.format_id(event_id), event_type, data))
+            self._history.append(item)
+            loop = self._loop
+        STREAM_EVENTS.inc(event_type)
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._fan_out, item)
+        return event_id
+
+    def subscribe(self, last_event_id=None, topics=None):
+        """
+        Register a client; must run on the event loop thread
+
+        Args:
+            last_event_id: Wire id of the last event the client saw, if any
+            topics: Set of event types to receive, None for all
+
+        Returns:
+            (subscriber, backlog) where backlog is the list of encoded
+            events to send first
+        """
+        subscriber = Subscriber(topics, self.queue_size)
+        with self._lock:
+            history = list(self._history)
+            subscriber.last_id = self._next_id - 1
+            self._subscribers.add(subscriber)
+        STREAM_SUBSCRIBERS.inc()
+
+        if last_event_id is None:
+            return subscriber, []
+        last_sequence = self.parse_id(last_event_id)
+        if last_sequence is None or last_sequence > subscriber.last_id:
+            return subscriber, [self._resync(subscriber, 'epoch_mismatch')]
+        # Events published before the subscription are only in the history
+        if history and history[0][0] > last_sequence + 1:
+            return subscriber, [self._resync(subscriber, 'history_expired')]
+        backlog = [payload for event_id, event_type, payload in history
+                   if event_id > last_sequence and subscriber.wants(event_type)]
+        return subscriber, backlog
+
+    def _resync(self, subscriber, reason):
+        return format_event(self.format_id(subscriber.last_id), 'resync', {'reason': reason})
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.discard(subscriber)
+            STREAM_SUBSCRIBERS.dec()
+
+    def _fan_out(self, item):
+        event_id, event_type, payload = item
+        for subscriber in list(self._subscribers):
+            if event_id <= subscriber.last_id or not subscriber.wants(event_type):
+                continue
+            subscriber.last_id = event_id
+            try:
+                subscriber.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # Make room for the sentinel that closes the connection; the
+                # client resumes from its Last-Event-ID
+                self.unsubscribe(subscriber)
+                subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(None)
+                STREAM_DROPPED.inc()
+
+
+class StreamServer:
+    """
+    asyncio HTTP server for event streams, run in a daemon thread
+
+    Args:
+        broker: EventBroker providing the events
+        host: Bind address
+        port: Bind port
+        heartbeat: Seconds between keep-alive comments on idle streams
+        path: URL path of the stream
+    """
+
+    def __init__(self, broker, host='0.0.0.0', port=5001, heartbeat=15.0, path='/stream'):
+        self.broker = broker
+        self.host = host
+        self.port = port
+        self.heartbeat = heartbeat
+        self.path = path
+        self._loop = None
+        self._thread = None
+        self._started = threading.Event()
+        self.error = None
+
+    @classmethod
+    def from_env(cls, broker):
+        env = os.environ.get
+        return cls(
+            broker,
+            host=env('PYROCAST_STREAM_HOST', '0.0.0.0'),
+            port=int(env('PYROCAST_STREAM_PORT', 5001)),
+            heartbeat=float(env('PYROCAST_STREAM_HEARTBEAT', 15))
+        )
+
+    @property
+    def enabled(self):
+        return self.port > 0
+
+    def start(self, timeout=5.0):
+        """
+        Start serving in a background thread
+
+        Returns:
+            True if the server is listening
+        """
+        if not self.enabled:
+            return False
+        if self._thread is not None and self._thread.is_alive():
+            return self.error is None
+        self._thread = threading.Thread(target=self._run, name="event-stream", daemon=True)
+        self._thread.start()
+        self._started.wait(timeout)
+        if self.error is not None:
+            logger.warning(f"⚠️  Event stream not available: {self.error}")
+            return False
+        logger.info(f"📡 Event stream at http://{self.host}:{self.port}{self.path}")
+        return True
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        try:
+            # Pre-forked workers each run a stream server on the same port
+            reuse_port = hasattr(socket, 'SO_REUSEPORT') or None
+            server = loop.run_until_complete(asyncio.start_server(
+                self._handle, self.host, self.port, reuse_port=reuse_port, limit=MAX_REQUEST_HEAD
+            ))
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            self._started.set()
+            loop.close()
+            return
+
+        self.broker.bind_loop(loop)
+        self._started.set()
+        try:
+            loop.run_forever()
+        finally:
+            self.broker.bind_loop(None)
+            server.close()
+            loop.close()
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        request_line, *header_lines = head.decode('latin-1').split('\r\n')
+        parts = request_line.split()
+        method, target = (parts[0], parts[1]) if len(parts) >= 2 else ('', '')
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            if name:
+                headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+
+        if method == 'OPTIONS':
+            await self._respond(writer, '204 No Content', b'')
+            return
+        if method != 'GET' or url.path != self.path:
+            await self._respond(writer, '404 Not Found', b'Not Found')
+            return
+
+        last_event_id = headers.get('last-event-id') or (query.get('lastEventId') or [None])[0]
+        topics = query.get('topics', [''])[0]
+        topics = set(topics.split(',')) if topics else None
+
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: text/event-stream\r\n'
+            b'Cache-Control: no-cache\r\n'
+            b'Connection: keep-alive\r\n'
+            b'Access-Control-Allow-Origin: *\r\n'
+            b'X-Accel-Buffering: no\r\n\r\n'
+            b'retry: 3000\n\n'
+        )
+        subscriber, backlog = self.broker.subscribe(last_event_id, topics)
+        try:
+            for payload in backlog:
+                writer.write(payload)
+            await writer.drain()
+            while True:
+                try:
+                    payload = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    payload = b': keep-alive\n\n'
+                if payload is None:
+                    break
+                writer.write(payload)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.broker.unsubscribe(subscriber)
+            writer.close()
+
+    async def _respond(self, writer, status, body):
+        writer.write(
+            f'HTTP/1.1 {status}\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Access-Control-Allow-Origin: *\r\n'
+            'Access-Control-Allow-Headers: Last-Event-ID, Cache-Control\r\n'
+            'Connection: close\r\n\r\n'.encode('latin-1') + body
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Derived features, defined once for training and serving
+
+Each derived feature declares its input columns and a vectorized function
+over their arrays. The definitions follow the feature engineering in
+notebooks/02_preprocessing.ipynb. FeaturePipeline resolves which features
+can be computed from the available columns (derived features may use
+earlier derived ones), and computes them over whole columns for training or
+over a batch at serve time.
+
+Training runs can cache results: each feature's output is stored under a
+fingerprint of its definition and of its input arrays, so rerunning on the
+same data loads the arrays instead of recomputing them.
+
+Configuration (environment):
+    PYROCAST_FEATURE_CACHE_DIR    directory for cached feature arrays
+                                  (backend/data/feature_cache)
+"""
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent / "data" / "feature_cache"
+STANDARD_PRESSURE = 1013.25  # hPa at sea level
+FWI_CATEGORY_EDGES = (5.0, 10.0, 20.0)
+
+
+class DerivedFeature:
+    """
+    One derived feature
+
+    Args:
+        name: Column name of the result
+        inputs: Names of the input columns, in the order passed to compute
+        compute: Function of the input arrays returning a float64 array
+        description: Short human-readable meaning
+        version: Bump when compute changes, to invalidate cached results
+    """
+
+    def __init__(self, name, inputs, compute, description='', version=1):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.compute = compute
+        self.description = description
+        self.version = version
+
+    def fingerprint(self):
+        return f"{self.name}:{','.join(self.inputs)}:v{self.version}"
+
+
+def _fwi_category(fwi):
+    # 1-4 for Low..Extreme over (-inf, 5], (5, 10], (10, 20], (20, inf)
+    category = np.searchsorted(FWI_CATEGORY_EDGES, fwi, side='left') + 1.0
+    return np.where(np.isnan(fwi), np.nan, category)
+
+
+DERIVED_FEATURES = [
+    DerivedFeature(
+        'heat_humidity_interaction', ('temp_mean', 'humidity_min'),
+        lambda temp, humidity: temp * (100 - humidity) / 100,
+        "Temperature weighted by dryness"),
+    DerivedFeature(
+        'dryness_wind_factor', ('wind_speed_max', 'humidity_min'),
+        lambda wind, humidity: (100 - humidity) * wind / 100,
+        "Fire spread potential from dry air and wind"),
+    DerivedFeature(
+        'temp_max_approx', ('temp_mean', 'temp_range'),
+        lambda temp, temp_range: temp + temp_range / 2,
+        "Approximate daily maximum temperature"),
+    DerivedFeature(
+        'temp_min_approx', ('temp_mean', 'temp_range'),
+        lambda temp, temp_range: temp - temp_range / 2,
+        "Approximate daily minimum temperature"),
+    DerivedFeature(
+        'fwi_category', ('fire_weather_index',), _fwi_category,
+        "Fire weather index band, 1 (low) to 4 (extreme)"),
+    DerivedFeature(
+        'pressure_deviation', ('pressure_mean',),
+        lambda pressure: np.abs(pressure - STANDARD_PRESSURE),
+        "Distance from standard sea-level pressure"),
+    DerivedFeature(
+        'wind_consistency', ('wind_direction_std',),
+        lambda direction_std: 1 / (direction_std + 1),
+        "Higher when the wind direction is steadier"),
+    DerivedFeature(
+        'evaporation_rate', ('evapotranspiration_total', 'humidity_min'),
+        lambda evapotranspiration, humidity: evapotranspiration / (humidity + 1),
+        "Evaporation proxy"),
+]
+
+
+def array_fingerprint(values):
+    """Content hash of an array (dtype, shape and bytes)"""
+    values = np.ascontiguousarray(values)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{values.dtype.str}{values.shape}".encode('utf-8'))
+    digest.update(values.data)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """
+    Feature arrays by fingerprint, in memory and optionally on disk
+
+    Args:
+        cache_dir: Directory for .npy files; None keeps results in memory only
+        max_entries: Arrays kept in memory
+    """
+
+    def __init__(self, cache_dir=None, max_entries=64):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ.get('PYROCAST_FEATURE_CACHE_DIR', DEFAULT_CACHE_DIR))
+
+    def get(self, key):
+        """Writable copy of a cached array, or None on a miss"""
+        values = self._entries.get(key)
+        if values is not None:
+            values = values.copy()
+        elif self.cache_dir is not None:
+            try:
+                values = np.load(self.cache_dir / f"{key}.npy", allow_pickle=False)
+                self._remember(key, values)
+            except (FileNotFoundError, ValueError, OSError):
+                values = None
+        if values is None:
+            self.misses += 1
+        else:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return values
+
+    def put(self, key, values):
+        self._remember(key, values)
+        if self.cache_dir is not None:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.cache_dir / f"{key}.tmp.npy"
+                np.save(tmp_path, values, allow_pickle=False)
+                os.replace(tmp_path, self.cache_dir / f"{key}.npy")
+            except OSError as e:
+                logger.warning(f"⚠️  Could not cache feature array: {e}")
+
+    def _remember(self, key, values):
+        # The cache keeps its own read-only copy; callers get writable
+        # arrays they may put in DataFrames and modify
+        values = values.copy()
+        values.flags.writeable = False
+        self._entries[key] = values
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class FeaturePipeline:
+    """
+    Computes derived features over column arrays
+
+    Args:
+        features: DerivedFeature definitions, in dependency order
+        cache: FeatureCache for results, or None to always compute
+    """
+
+    def __init__(self, features=None, cache=None):
+        self.features = list(DERIVED_FEATURES if features is None else features)
+        self.by_name = {feature.name: feature for feature in self.features}
+        self.cache = cache
+
+    @property
+    def names(self):
+        return [feature.name for feature in self.features]
+
+    def available(self, columns):
+        """Names of the derived features computable from these column names"""
+        known = set(columns)
+        names = []
+        for feature in self.features:
+            if all(name in known for name in feature.inputs):
+                known.add(feature.name)
+                names.append(feature.name)
+        return names
+
+    def _with_dependencies(self, names):
+        """The named derived features plus the derived features they use"""
+        wanted = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name in self.by_name and name not in wanted:
+                wanted.add(name)
+                pending.extend(self.by_name[name].inputs)
+        return wanted
+
+    def required_inputs(self, names):
+        """Raw (non-derived) columns needed to compute the named features"""
+        required = []
+        pending = list(names)
+        while pending:
+            feature = self.by_name.get(pending.pop(0))
+            if feature is None:
+                continue
+            for name in feature.inputs:
+                if name in self.by_name:
+                    pending.append(name)
+                elif name not in required:
+                    required.append(name)
+        return required
+
+    def compute(self, columns, names=None):
+        """
+        Compute derived features
+
+        Args:
+            columns: Mapping of column name to 1-D array
+            names: Derived features to compute; defaults to every feature
+                the columns allow
+
+        Returns:
+            Dict of derived feature name -> float64 array
+        """
+        names = self.available(columns) if names is None else list(names)
+        unknown = [name for name in names if name not in self.by_name]
+        if unknown:
+            raise ValueError(f"Unknown derived features: {', '.join(unknown)}")
+        wanted = self._with_dependencies(names)
+
+        values = {name: np.asarray(column, dtype=np.float64) for name, column in columns.items()}
+        fingerprints = {}
+        derived = {}
+        for feature in self.features:
+            if feature.name not in wanted:
+                continue
+            missing = [name for name in feature.inputs if name not in values]
+            if missing:
+                raise ValueError(f"{feature.name} needs columns: {', '.join(missing)}")
+            result = self._compute_one(feature, values, fingerprints)
+            values[feature.name] = result
+            derived[feature.name] = result
+        return {name: derived[name] for name in names}
+
+    def _compute_one(self, feature, values, fingerprints):
+        if self.cache is None:
+            return np.asarray(feature.compute(*(values[name] for name in feature.inputs)), dtype=np.float64)
+
+        for name in feature.inputs:
+            if name not in fingerprints:
+                fingerprints[name] = array_fingerprint(values[name])
+        key = hashlib.blake2b(
+            '|'.join([feature.fingerprint()] + [fingerprints[name] for name in feature.inputs]).encode('utf-8'),
+            digest_size=16
+        ).hexdigest()
+        result = self.cache.get(key)
+        if result is None:
+            result = np.asarray(feature.compute(*(values[name] for name in feature.inputs)), dtype=np.float64)
+            self.cache.put(key, result)
+        # Outputs of cached features are addressed by the same key
+        fingerprints[feature.name] = key
+        return result
+
+    def add_to_frame(self, df, names=None):
+        """
+        Add derived feature columns to a DataFrame in place
+
+        Returns:
+            Names of the columns added
+        """
+        names = self.available(df.columns) if names is None else list(names)
+        inputs = set(self.required_inputs(names))
+        columns = {name: df[name].to_numpy(dtype=np.float64, na_value=np.nan) for name in inputs}
+        for name, column in self.compute(columns, names).items():
+            df[name] = column
+        return names
+
+    def describe(self):
+        return [
+            {'name': feature.name, 'inputs': list(feature.inputs), 'description': feature.description}
+            for feature in self.features
+        ]
+
+
+# Shared pipeline for serving; training passes its own cache
+feature_pipeline = FeaturePipeline()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Asynchronous scoring jobs for requests too large for one HTTP call
+
+A job is a dataset submitted inline (JSON) or as an uploaded file (JSON
+lines, JSON array or CSV). Jobs are scored in chunks by a local worker pool
+through SimpleWildfirePredictionService.predict_batch, and results are
+appended to a JSON lines file as each chunk finishes.
+
+Every job lives in its own directory under the job root:
+
+    input.jsonl | input.json | input.csv    submitted records
+    results.jsonl                           one prediction per line
+    state.json                              status and progress
+
+State is written atomically after each chunk, so a restarted server keeps
+finished results and resumes unfinished jobs from their last chunk. A job is
+run under an exclusive file lock, so when several pre-forked workers recover
+the same directory, each job is resumed only once. Cancellation is a marker
+file that any worker can see.
+"""
+import csv
+import itertools
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_ROOT = Path(__file__).parent.parent / "data" / "jobs"
+INPUT_FORMATS = ('jsonl', 'json', 'csv')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobStore:
+    """On-disk job directories with atomically replaced state files"""
+
+    def __init__(self, root=None):
+        self.root = Path(root or os.environ.get('PYROCAST_JOB_DIR', DEFAULT_JOB_ROOT))
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def job_dir(self, job_id):
+        # Job ids are generated uuids; refuse anything that could escape root
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            raise KeyError(job_id)
+        return self.root / job_id
+
+    def input_path(self, job_id, input_format):
+        return self.job_dir(job_id) / f"input.{input_format}"
+
+    def results_path(self, job_id):
+        return self.job_dir(job_id) / "results.jsonl"
+
+    def create(self, input_format):
+        """Create an empty job directory and return its initial state"""
+        job_id = uuid.uuid4().hex
+        self.job_dir(job_id).mkdir(parents=True)
+        state = {
+            'id': job_id,
+            'status': QUEUED,
+            'input_format': input_format,
+            'total': None,
+            'processed': 0,
+            'errors': 0,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None
+        }
+        self.save(state)
+        return state
+
+    def save(self, state):
+        path = self.job_dir(state['id']) / "state.json"
+        tmp_path = path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def load(self, job_id):
+        try:
+            with open(self.job_dir(job_id) / "state.json") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(job_id)
+
+    def list(self):
+        states = []
+        for path in self.root.iterdir():
+            try:
+                states.append(self.load(path.name))
+            except (KeyError, ValueError):
+                continue
+        return sorted(states, key=lambda state: state['created_at'], reverse=True)
+
+    def delete(self, job_id):
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+
+def iter_records(path, input_format):
+    """Stream records from a job input file"""
+    if input_format == 'csv':
+        with open(path, newline='') as f:
+            # Empty cells count as omitted, as missing keys do in JSON input
+            for row in csv.DictReader(f):
+                yield {key: value for key, value in row.items() if value != ''}
+    elif input_format == 'jsonl':
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path) as f:
+            payload = json.load(f)
+        yield from payload['data'] if isinstance(payload, dict) else payload
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class JobManager:
+    """
+    Runs scoring jobs on a local thread pool
+
+    Args:
+        predictor: SimpleWildfirePredictionService used for scoring
+        store: JobStore holding the job directories
+        workers: Number of jobs scored concurrently
+        chunk_size: Records per vectorized predict_batch call
+        ttl_hours: Finished jobs older than this are removed on start-up
+    """
+
+    def __init__(self, predictor, store=None, workers=None, chunk_size=None, ttl_hours=None):
+        env = os.environ.get
+        self.predictor = predictor
+        self.store = store or JobStore()
+        self.chunk_size = chunk_size or int(env('PYROCAST_JOB_CHUNK_SIZE', 5000))
+        self.ttl_hours = ttl_hours if ttl_hours is not None else float(env('PYROCAST_JOB_TTL_HOURS', 24))
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or int(env('PYROCAST_JOB_WORKERS', 2)), thread_name_prefix="job")
+
+    def recover(self):
+        """Drop expired jobs and resume unfinished ones after a restart"""
+        cutoff = time.time() - self.ttl_hours * 3600
+        for state in self.store.list():
+            if state['status'] in FINISHED_STATES:
+                if (state['finished_at'] or 0) < cutoff:
+                    self.store.delete(state['id'])
+            else:
+                logger.info(f"Resuming job {state['id']} at record {state['processed']}")
+                self._executor.submit(self._run, state['id'])
+
+    def submit_records(self, records):
+        """Queue a job for a list of inline records"""
+        state = self.store.create('jsonl')
+        with open(self.store.input_path(state['id'], 'jsonl'), 'w') as f:
+            for record in records:
+                f.write(json.dumps(record))
+                f.write('\n')
+        return self._enqueue(state)
+
+    def submit_file(self, file_storage, input_format):
+        """Queue a job for an uploaded file, written straight to disk"""
+        if input_format not in INPUT_FORMATS:
+            raise ValueError(f"Unsupported input format '{input_format}', expected one of {INPUT_FORMATS}")
+        state = self.store.create(input_format)
+        file_storage.save(str(self.store.input_path(state['id'], input_format)))
+        return self._enqueue(state)
+
+    def _enqueue(self, state):
+        self._executor.submit(self._run, state['id'])
+        return state
+
+    def cancel(self, job_id):
+        state = self.store.load(job_id)
+        if state['status'] in FINISHED_STATES:
+            return state
+        (self.store.job_dir(job_id) / "cancel").touch()
+        if state['status'] == QUEUED:
+            state['status'] = CANCELLED
+            state['finished_at'] = time.time()
+            self.store.save(state)
+        return state
+
+    def _is_cancelled(self, job_id):
+        return (self.store.job_dir(job_id) / "cancel").exists()
+
+    def _run(self, job_id):
+        with open(self.store.job_dir(job_id) / "lock", 'w') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another worker process owns this job
+                    return
+            self._run_locked(job_id)
+
+    def _run_locked(self, job_id):
+        state = self.store.load(job_id)
+        if state['status'] in FINISHED_STATES or self._is_cancelled(job_id):
+            return
+
+        input_path = self.store.input_path(job_id, state['input_format'])
+        results_path = self.store.results_path(job_id)
+        try:
+            state['status'] = RUNNING
+            state['started_at'] = state['started_at'] or time.time()
+            if state['total'] is None:
+                state['total'] = sum(1 for _ in iter_records(input_path, state['input_format']))
+            self.store.save(state)
+
+            # Results beyond the last saved checkpoint belong to an
+            # interrupted chunk and are rewritten
+            self._truncate_results(results_path, state['processed'])
+
+            records = iter_records(input_path, state['input_format'])
+            records = itertools.islice(records, state['processed'], None)
+            with open(results_path, 'a') as results:
+                for chunk in chunked(records, self.chunk_size):
+                    if self._is_cancelled(job_id):
+                        state['status'] = CANCELLED
+                        break
+                    offset = state['processed']
+                    for result in self.predictor.predict_batch(chunk):
+                        result['index'] += offset
+                        state['errors'] += 'error' in result
+                        results.write(json.dumps(result))
+                        results.write('\n')
+                    results.flush()
+                    os.fsync(results.fileno())
+                    state['processed'] += len(chunk)
+                    self.store.save(state)
+                else:
+                    state['status'] = COMPLETED
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            state['status'] = FAILED
+            state['error'] = str(e)
+
+        state['finished_at'] = time.time()
+        self.store.save(state)
+
+    def _truncate_results(self, results_path, n_lines):
+        if not results_path.exists():
+            return
+        with open(results_path, 'rb+') as f:
+            for _ in range(n_lines):
+                if not f.readline():
+                    break
+            f.truncate()
+
+    def get_status(self, job_id):
+        """Job state with a progress fraction"""
+        state = self.store.load(job_id)
+        total = state['total']
+        state['progress'] = (state['processed'] / total) if total else (1.0 if state['status'] == COMPLETED else 0.0)
+        return state
+
+    def iter_results(self, job_id, chunk_bytes=1 << 16):
+        """Stream the raw results file of a job"""
+        with open(self.store.results_path(job_id), 'rb') as f:
+            while True:
+                block = f.read(chunk_bytes)
+                if not block:
+                    return
+                yield block
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Prometheus-style metrics for the API
+
+Dependency-free counters, gauges and histograms rendered in the Prometheus
+text exposition format. Updates are lock-free: every thread writes to its own
+shard, and shards are only summed when /metrics is scraped. Shards of
+threads that have exited are folded into a retired total whenever a new
+thread registers a shard and at scrape time, so thread-per-request servers
+do not leak memory even when nothing scrapes.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets in seconds
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Payload size buckets in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# Batch size buckets in rows
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+
+class _ShardedValues:
+    """
+    Per-thread dicts of label values -> accumulated value
+
+    Only the owning thread writes a shard; readers copy shards, which is
+    atomic under the GIL.
+    """
+
+    def __init__(self, merge):
+        self._merge = merge
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            self._local.shard = shard
+            with self._lock:
+                self._retire_dead()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _retire_dead(self):
+        """Fold the shards of exited threads into the retired total (lock held)"""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for key, value in shard.copy().items():
+                    self._retired[key] = self._merge(self._retired.get(key), value)
+        self._shards = live
+
+    def snapshot(self):
+        """Merged copy of all shards"""
+        with self._lock:
+            self._retire_dead()
+            merged = dict((key, self._merge(None, value)) for key, value in self._retired.items())
+            shards = [shard.copy() for _, shard in self._shards]
+
+        for shard in shards:
+            for key, value in shard.items():
+                merged[key] = self._merge(merged.get(key), value)
+        return merged
+
+
+def _merge_number(total, value):
+    return value if total is None else total + value
+
+
+class Metric:
+    """Base class holding name, help text and label names"""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(value) for value in labels)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (f'{name}="{_escape(value)}"' for name, value in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter(Metric):
+    """Monotonically increasing counter"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = _ShardedValues(_merge_number)
+
+    def inc(self, *labels, amount=1):
+        shard = self._values.shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.snapshot().get(self._key(labels), 0)
+
+    def _samples(self):
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}"
+                for key, value in sorted(self._values.snapshot().items())]
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down
+
+    inc()/dec() pairs are sharded like counters; set() stores an absolute
+    value, and set_function() computes the value at scrape time.
+    """
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._deltas = _ShardedValues(_merge_number)
+        self._absolute = {}
+        self._functions = {}
+
+    def inc(self, *labels, amount=1):
+        shard = self._deltas.shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        self._absolute[self._key(labels)] = value
+
+    def set_function(self, fn, *labels):
+        self._functions[self._key(labels)] = fn
+
+    def value(self, *labels):
+        key = self._key(labels)
+        if key in self._functions:
+            return self._functions[key]()
+        return self._absolute.get(key, 0) + self._deltas.snapshot().get(key, 0)
+
+    def _samples(self):
+        values = dict(self._absolute)
+        for key, delta in self._deltas.snapshot().items():
+            values[key] = values.get(key, 0) + delta
+        for key, fn in list(self._functions.items()):
+            values[key] = fn()
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+def _merge_histogram(total, value):
+    if total is None:
+        return [list(value[0]), value[1], value[2]]
+    counts = total[0]
+    for i, count in enumerate(value[0]):
+        counts[i] += count
+    total[1] += value[1]
+    total[2] += value[2]
+    return total
+
+
+class Histogram(Metric):
+    """Histogram with fixed upper bounds"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = _ShardedValues(_merge_histogram)
+
+    def observe(self, value, *labels):
+        shard = self._values.shard()
+        key = self._key(labels)
+        entry = shard.get(key)
+        if entry is None:
+            # [per-bucket counts (last one is +Inf), sum, count]
+            entry = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            shard[key] = entry
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def time(self, *labels):
+        """Context manager observing the elapsed seconds of its block"""
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        entry = self._values.snapshot().get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def _samples(self):
+        lines = []
+        for key, (counts, total, count) in sorted(self._values.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = self._format_labels(key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed, *self.labels)
+        return False
+
+
+class Registry:
+    """Ordered collection of metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self):
+        """Prometheus text exposition of every registered metric"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# HTTP metrics
+HTTP_REQUESTS = counter(
+    'pyrocast_http_requests_total', 'HTTP requests handled', ('method', 'route', 'status'))
+HTTP_LATENCY = histogram(
+    'pyrocast_http_request_duration_seconds', 'HTTP request latency', ('method', 'route'))
+HTTP_IN_FLIGHT = gauge(
+    'pyrocast_http_requests_in_flight', 'HTTP requests currently being handled', ('route',))
+HTTP_REQUEST_SIZE = histogram(
+    'pyrocast_http_request_size_bytes', 'HTTP request body size', ('route',), SIZE_BUCKETS)
+HTTP_RESPONSE_SIZE = histogram(
+    'pyrocast_http_response_size_bytes', 'HTTP response body size', ('route',), SIZE_BUCKETS)
+
+# Prediction metrics
+PREDICTIONS = counter(
+    'pyrocast_predictions_total', 'Predictions made', ('risk_level', 'model'))
+BATCH_SIZE = histogram(
+    'pyrocast_prediction_batch_size', 'Rows per batch prediction request', (), BATCH_SIZE_BUCKETS)
+DUMMY_MODEL_FALLBACKS = counter(
+    'pyrocast_dummy_model_fallbacks_total', 'Predictions answered by the dummy fallback model')
+MODEL_LOAD_DURATION = histogram(
+    'pyrocast_model_load_duration_seconds', 'Time to load the prediction model', ('result',))
+DATA_LOAD_DURATION = histogram(
+    'pyrocast_data_load_duration_seconds', 'Time to load the wildfire dataset', ('source',))
+
+
+def install_metrics(app, endpoint='/metrics'):
+    """
+    Instrument a Flask app and expose the registry
+
+    Args:
+        app: Flask application
+        endpoint: URL path serving the Prometheus text format
+    """
+    from flask import Response, g, request
+
+    def route_label():
+        return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_route = route_label()
+        HTTP_IN_FLIGHT.inc(g.metrics_route)
+
+    @app.after_request
+    def record_request_metrics(response):
+        route = g.get('metrics_route', route_label())
+        start = g.get('metrics_start')
+        if start is not None:
+            HTTP_LATENCY.observe(time.perf_counter() - start, request.method, route)
+        HTTP_REQUESTS.inc(request.method, route, response.status_code)
+        HTTP_REQUEST_SIZE.observe(request.content_length or 0, route)
+        if response.content_length is not None:
+            HTTP_RESPONSE_SIZE.observe(response.content_length, route)
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        route = g.pop('metrics_route', None)
+        if route is not None:
+            HTTP_IN_FLIGHT.dec(route)
+
+    @app.route(endpoint, methods=['GET'])
+    def metrics():
+        """Prometheus metrics"""
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+    return app
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Several versioned prediction models served side by side
+
+A registry directory holds model JSON files and a registry.json manifest
+naming them:
+
+    {
+        "default": "global",
+        "models": {
+            "global":        {"path": "global-v3.json", "version": "v3"},
+            "california":    {"path": "california-v2.json", "version": "v2",
+                              "bbox": [-124.5, 32.5, -114.1, 42.1]},
+            "california-v3": {"path": "california-v3.json", "version": "v3"}
+        },
+        "shadow": {
+            "california": {"candidate": "california-v3", "sample_rate": 0.1}
+        }
+    }
+
+Each request is routed to one model: an explicit "model_id" field wins,
+then the first model (in manifest order) whose bbox [min_lon, min_lat,
+max_lon, max_lat] holds the request's lat/lon, then the default. Batches
+are split by route and each part is scored with one vectorized call.
+
+A shadow candidate scores a sampled fraction of its primary model's
+traffic on a background thread, after the primary response has been
+computed; requests only pay for the sampling and a queue put, and shadow
+work is dropped rather than delayed when the queue is full. Rows where the
+two models give different risk levels, or probabilities further apart than
+the tolerance, are counted and logged as disagreements.
+
+Without a manifest the registry serves the default prediction service
+alone, as before. Only /predict and /predict/batch are routed; jobs, grids
+and dataset scoring use the default prediction service. NumPy is imported
+on first use, as in simple_predict.
+
+Configuration (environment):
+    PYROCAST_MODEL_DIR           registry directory (backend/models)
+    PYROCAST_SHADOW_QUEUE        shadow batches waiting to be scored (256)
+    PYROCAST_SHADOW_TOLERANCE    probability difference counted as a
+                                 disagreement (0.1)
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from pathlib import Path
+
+from metrics import counter, histogram
+from simple_predict import (FEATURE_ALIASES, FEATURE_DEFAULTS, FEATURE_RANGES, LOCATION_FEATURES,
+                            SimpleWildfirePredictionService)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_DIR = Path(__file__).parent.parent / "models"
+MANIFEST_NAME = "registry.json"
+DEFAULT_MODEL_ID = "default"
+
+MODEL_ROUTES = counter(
+    'pyrocast_model_routes_total', 'Rows routed to each registry model', ('model', 'reason'))
+SHADOW_PREDICTIONS = counter(
+    'pyrocast_shadow_predictions_total', 'Rows scored by shadow models', ('model', 'result'))
+SHADOW_DIFFERENCE = histogram(
+    'pyrocast_shadow_probability_difference', 'Absolute probability difference between shadow and primary',
+    ('model',), buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0))
+
+# Disagreeing rows quoted per log line
+LOGGED_EXAMPLES = 3
+
+
+class UnknownModel(KeyError):
+    """A request named a model id the registry does not have"""
+
+
+class RegisteredModel:
+    """
+    One model of the registry
+
+    Args:
+        model_id: Name used for explicit routing
+        service: SimpleWildfirePredictionService holding the model
+        version: Version label; defaults to the model content hash
+        bbox: [min_lon, min_lat, max_lon, max_lat] routed to this model
+    """
+
+    def __init__(self, model_id, service, version=None, bbox=None):
+        self.model_id = model_id
+        self.service = service
+        self.version = str(version) if version is not None else service.model_version
+        self.bbox = None
+        if bbox is not None:
+            if len(bbox) != 4:
+                raise ValueError(f"{model_id}: bbox must be [min_lon, min_lat, max_lon, max_lat]")
+            self.bbox = tuple(float(value) for value in bbox)
+            if self.bbox[0] > self.bbox[2] or self.bbox[1] > self.bbox[3]:
+                raise ValueError(f"{model_id}: bbox minimum exceeds maximum")
+
+    def contains(self, lat, lon):
+        """Boolean array: which locations fall in the bbox (NaN never does)"""
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        return (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+
+    def describe(self):
+        return {
+            "model_id": self.model_id,
+            "version": self.version,
+            "model_version": self.service.model_version,
+            "model_type": self.service.model_data.get('model_type'),
+            "bbox": list(self.bbox) if self.bbox else None
+        }
+
+
+class ShadowScorer:
+    """
+    Background scoring of sampled traffic by candidate models
+
+    Args:
+        queue_size: Batches waiting to be scored; more are dropped
+        tolerance: Probability difference counted as a disagreement
+    """
+
+    def __init__(self, queue_size=256, tolerance=0.1):
+        self.tolerance = tolerance
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, primary_id, candidate, records, probabilities):
+        """
+        Queue records already scored by the primary model; never blocks
+
+        Args:
+            primary_id: Id of the model that served the records
+            candidate: RegisteredModel to compare
+            records: Input records
+            probabilities: Primary probabilities, NaN for failed rows
+        """
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((primary_id, candidate, records, probabilities))
+        except queue.Full:
+            SHADOW_PREDICTIONS.inc(candidate.model_id, 'dropped', amount=len(records))
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="shadow-scoring", daemon=True)
+                    self._thread.start()
+
+    def _loop(self):
+        while True:
+            primary_id, candidate, records, probabilities = self._queue.get()
+            try:
+                self.compare(primary_id, candidate, records, probabilities)
+            except Exception as e:
+                SHADOW_PREDICTIONS.inc(candidate.model_id, 'error', amount=len(records))
+                logger.error(f"Shadow scoring with {candidate.model_id} failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Wait until every queued batch has been scored"""
+        self._queue.join()
+
+    def compare(self, primary_id, candidate, records, probabilities):
+        """
+        Score records with the candidate and record the disagreement
+
+        Returns:
+            Number of disagreeing rows
+        """
+        import numpy as np
+
+        service = candidate.service
+        validated = service.validate_batch(records)
+        shadow = service.predict_proba_columns(validated.columns)
+        primary = np.asarray(probabilities, dtype=np.float64)
+
+        scored = validated.valid & np.isfinite(primary)
+        difference = np.abs(shadow - primary)
+        levels_differ = service.get_risk_levels(shadow) != service.get_risk_levels(primary)
+        disagree = scored & (levels_differ | (difference > self.tolerance))
+
+        n_disagree = int(disagree.sum())
+        SHADOW_PREDICTIONS.inc(candidate.model_id, 'agree', amount=int(scored.sum()) - n_disagree)
+        SHADOW_PREDICTIONS.inc(candidate.model_id, 'disagree', amount=n_disagree)
+        SHADOW_PREDICTIONS.inc(candidate.model_id, 'invalid', amount=int((~scored).sum()))
+        for value in difference[scored].tolist():
+            SHADOW_DIFFERENCE.observe(value, candidate.model_id)
+
+        if n_disagree:
+            rows = np.flatnonzero(disagree)[:LOGGED_EXAMPLES].tolist()
+            examples = ", ".join(f"{primary[i]:.3f} vs {shadow[i]:.3f}" for i in rows)
+            logger.warning(
+                f"🔀 Shadow {candidate.model_id} ({candidate.version}) disagrees with {primary_id} "
+                f"on {n_disagree}/{int(scored.sum())} rows, max |Δp| {difference[disagree].max():.3f} "
+                f"(e.g. {examples})"
+            )
+        return n_disagree
+
+
+class ModelRegistry:
+    """
+    Routes predictions between the registry's models
+
+    Args:
+        default_service: Prediction service used when there is no manifest
+        directory: Registry directory holding registry.json
+        shadow: ShadowScorer for candidate models
+    """
+
+    def __init__(self, default_service, directory=None, shadow=None):
+        self.default_service = default_service
+        self.directory = Path(directory) if directory else DEFAULT_MODEL_DIR
+        self.shadow = shadow or ShadowScorer()
+        self._location_schema = None
+        self.load()
+
+    @classmethod
+    def from_env(cls, default_service):
+        shadow = ShadowScorer(
+            queue_size=int(os.environ.get('PYROCAST_SHADOW_QUEUE', 256)),
+            tolerance=float(os.environ.get('PYROCAST_SHADOW_TOLERANCE', 0.1))
+        )
+        return cls(default_service, os.environ.get('PYROCAST_MODEL_DIR', DEFAULT_MODEL_DIR), shadow)
+
+    def load(self):
+        """
+        (Re)load the manifest and its models
+
+        A missing manifest serves the default service alone; a broken one
+        is logged and leaves the current models in place.
+        """
+        manifest_path = self.directory / MANIFEST_NAME
+        if not manifest_path.exists():
+            self._install({DEFAULT_MODEL_ID: RegisteredModel(DEFAULT_MODEL_ID, self.default_service)},
+                          DEFAULT_MODEL_ID, {})
+            return
+
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if not isinstance(manifest, dict) or not isinstance(manifest.get('models'), dict) \
+                    or not manifest['models']:
+                raise ValueError("'models' must map at least one model id to its entry")
+            if not isinstance(manifest.get('shadow', {}), dict):
+                raise ValueError("'shadow' must map model ids to their candidates")
+            models = {}
+            for model_id, entry in manifest['models'].items():
+                model_path = self.directory / entry['path']
+                if not model_path.exists():
+                    raise ValueError(f"{model_id}: model file not found: {model_path}")
+                service = SimpleWildfirePredictionService(str(model_path))
+                if service.model_data.get('model_type') == 'DummyModel':
+                    raise ValueError(f"{model_id}: could not load {model_path}")
+                models[model_id] = RegisteredModel(model_id, service, entry.get('version'), entry.get('bbox'))
+
+            default_id = manifest.get('default') or next(iter(models))
+            shadows = {}
+            for primary_id, entry in manifest.get('shadow', {}).items():
+                rate = float(entry.get('sample_rate', 0.1))
+                if primary_id not in models or entry['candidate'] not in models:
+                    raise ValueError(f"Shadow pair {primary_id} -> {entry['candidate']} names an unknown model")
+                if not 0.0 <= rate <= 1.0:
+                    raise ValueError(f"{primary_id}: sample_rate must be between 0 and 1")
+                shadows[primary_id] = (models[entry['candidate']], rate)
+            if default_id not in models:
+                raise ValueError(f"Default model {default_id} is not in the registry")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"❌ Could not load model registry {manifest_path}: {e}")
+            if not hasattr(self, 'models'):
+                self._install({DEFAULT_MODEL_ID: RegisteredModel(DEFAULT_MODEL_ID, self.default_service)},
+                              DEFAULT_MODEL_ID, {})
+            return
+
+        self._install(models, default_id, shadows)
+        logger.info(f"✅ Model registry loaded: {', '.join(models)} (default {default_id}, "
+                    f"{len(shadows)} shadow pair(s))")
+
+    def _install(self, models, default_id, shadows):
+        self.models = models
+        self.default_id = default_id
+        self.shadows = shadows
+        self._regional = [model for model in models.values() if model.bbox is not None]
+
+    @property
+    def default(self):
+        return self.models[self.default_id]
+
+    def get(self, model_id):
+        """RegisteredModel by id; raises UnknownModel"""
+        try:
+            return self.models[model_id]
+        except (KeyError, TypeError):
+            # TypeError: an unhashable id from a JSON body (list, object)
+            raise UnknownModel(model_id) from None
+
+    @property
+    def location_schema(self):
+        """Validation schema reading just lat/lon, for region routing"""
+        if self._location_schema is None:
+            from validation import BatchSchema
+            self._location_schema = BatchSchema(LOCATION_FEATURES, FEATURE_ALIASES, FEATURE_DEFAULTS,
+                                                FEATURE_RANGES)
+        return self._location_schema
+
+    def _region_routes(self, records):
+        """Index into _regional per record, -1 where no region holds it"""
+        import numpy as np
+
+        routes = np.full(len(records), -1, dtype=np.int64)
+        if not self._regional or not records:
+            return routes
+        columns = self.location_schema.validate(records).columns
+        lat, lon = columns['lat'], columns['lon']
+        # First matching region wins, so assign in reverse manifest order
+        for k in range(len(self._regional) - 1, -1, -1):
+            routes[self._regional[k].contains(lat, lon)] = k
+        return routes
+
+    def route(self, record, model_id=None):
+        """
+        Model for a single record
+
+        Args:
+            record: Input record
+            model_id: Explicit model id; overrides the record's own
+                "model_id" field and its location
+        """
+        model_id = model_id or (record.get('model_id') if isinstance(record, dict) else None)
+        if model_id:
+            model = self.get(model_id)
+            MODEL_ROUTES.inc(model.model_id, 'explicit')
+            return model
+        k = int(self._region_routes([record])[0])
+        model = self._regional[k] if k >= 0 else self.default
+        MODEL_ROUTES.inc(model.model_id, 'region' if k >= 0 else 'default')
+        return model
+
+    def predict(self, record, model=None):
+        """
+        Predict one record
+
+        Args:
+            record: Input record
+            model: RegisteredModel from route(); routed here when not given
+
+        Returns:
+            The model's predict() result plus 'model_id' and 'model_version'
+        """
+        if model is None:
+            model = self.route(record)
+        result = dict(model.service.predict(record), model_id=model.model_id, model_version=model.version)
+        self._maybe_shadow(model, [record], [result])
+        return result
+
+    def predict_batch(self, records, model_id=None):
+        """
+        Predict a batch, each record with its routed model
+
+        Records naming an unknown model id get an error result with error
+        code 'unknown_model'.
+
+        Returns:
+            Results in record order, as SimpleWildfirePredictionService
+            .predict_batch plus 'model_id' and 'model_version'
+        """
+        groups, results = self.route_batch(records, model_id)
+        for target, rows in groups.items():
+            self.predict_group(target, records, rows, results)
+        return results
+
+    def route_batch(self, records, model_id=None):
+        """
+        Route every record of a batch to a model
+
+        Returns:
+            (groups, results): groups maps model id -> sorted row indices;
+            results has an error result for each record naming an unknown
+            model and None elsewhere, to be filled by predict_group()
+        """
+        results = [None] * len(records)
+        groups = {}
+        if model_id:
+            groups[self.get(model_id).model_id] = list(range(len(records)))
+            MODEL_ROUTES.inc(model_id, 'explicit', amount=len(records))
+        else:
+            routes = self._region_routes(records)
+            for i, record in enumerate(records):
+                explicit = record.get('model_id') if isinstance(record, dict) else None
+                if explicit:
+                    if not isinstance(explicit, str) or explicit not in self.models:
+                        results[i] = {"index": i, "error": f"Unknown model: {explicit}",
+                                      "error_code": "unknown_model", "fire_risk": "Unknown", "probability": None}
+                        continue
+                    target, reason = explicit, 'explicit'
+                elif routes[i] >= 0:
+                    target, reason = self._regional[routes[i]].model_id, 'region'
+                else:
+                    target, reason = self.default_id, 'default'
+                groups.setdefault((target, reason), []).append(i)
+            merged = {}
+            for (target, reason), rows in groups.items():
+                MODEL_ROUTES.inc(target, reason, amount=len(rows))
+                merged.setdefault(target, []).extend(rows)
+            groups = {target: sorted(rows) for target, rows in merged.items()}
+        return groups, results
+
+    @staticmethod
+    def group_records(records, rows):
+        """The records of one routed group, in row order"""
+        return records if len(rows) == len(records) else [records[i] for i in rows]
+
+    def predict_group(self, model_id, records, rows, results, validated=None):
+        """
+        Score one group from route_batch() and store its results
+
+        Args:
+            model_id: Model the group is routed to
+            records: The whole batch
+            rows: Row indices of the group
+            results: Result list from route_batch(), filled in place
+            validated: The model's validate_batch() of group_records(),
+                to skip validating again
+        """
+        model = self.models[model_id]
+        part = self.group_records(records, rows)
+        predictions = model.service.predict_batch(part, validated=validated)
+        for i, result in zip(rows, predictions):
+            result.update(index=i, model_id=model.model_id, model_version=model.version)
+            results[i] = result
+        self._maybe_shadow(model, part, predictions)
+
+    def _maybe_shadow(self, model, records, results):
+        """Hand a sample of the served rows to the model's shadow candidate"""
+        pair = self.shadows.get(model.model_id)
+        if pair is None:
+            return
+        candidate, rate = pair
+        sampled = [i for i in range(len(records)) if random.random() < rate]
+        if sampled:
+            probabilities = [results[i].get('probability') for i in sampled]
+            self.shadow.submit(
+                model.model_id, candidate, [records[i] for i in sampled],
+                [float('nan') if p is None else p for p in probabilities]
+            )
+
+    def describe(self):
+        """Registry contents for the models endpoint"""
+        return {
+            "default": self.default_id,
+            "models": [model.describe() for model in self.models.values()],
+            "shadow": [
+                {"primary": primary_id, "candidate": candidate.model_id, "sample_rate": rate}
+                for primary_id, (candidate, rate) in self.shadows.items()
+            ]
+        }
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Historical fire context around a location
+
+NeighborIndex holds the historical detections (coordinates, whether a fire
+occurred, FRP) in a uniform grid over 3-D unit vectors, with cells as wide
+as the search radius. A query only looks at the 27 cells around each point
+and measures exact great-circle distances to the detections in them, which
+keeps sparse batches to a few microseconds per row (cost grows with the
+detections inside the radius) and works the same at the
+poles and across the antimeridian.
+
+For each query location it reports:
+    nearby_fire_count    fires (occured = 1) within the radius
+    nearby_mean_frp      mean fire radiative power of those fires (0 if none)
+    nearby_fire_rate     share of the detections within the radius that
+                         were fires (0 if none)
+
+Models trained with these context features (simple_model.train_model with
+context_radius_km) get them computed from the request's lat/lon at serve
+time. The index is built from the training split only: training rows query
+it without counting themselves, held-out rows like predictions. It is saved
+next to the model JSON, which names it as 'context_index', so retraining
+never changes the history a served model sees. Models without their own
+index use PYROCAST_NEIGHBOR_INDEX.
+
+Loaded indexes are shared per file and radius. The file's mtime is checked
+at most every INDEX_CHECK_SECONDS, so a rewritten index is picked up without
+a stat() on every prediction.
+
+The index is saved as an .npz file of the detections and rebinned on load:
+    python utils/neighbors.py [--radius-km 25] [--output ../data/neighbor_index.npz]
+
+Configuration (environment):
+    PYROCAST_NEIGHBOR_INDEX    index file used at serve time
+                               (backend/data/neighbor_index.npz)
+"""
+import argparse
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = Path(__file__).parent.parent / "data" / "neighbor_index.npz"
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_RADIUS_KM = 25.0
+CONTEXT_FEATURES = ('nearby_fire_count', 'nearby_mean_frp', 'nearby_fire_rate')
+# Queries per vectorized pass, and candidate detections per distance test;
+# the latter bounds memory where detections are dense
+QUERY_CHUNK = 4096
+CANDIDATE_CHUNK = 1 << 21
+# Seconds between checks of a loaded index file for a newer version
+INDEX_CHECK_SECONDS = 5.0
+
+_OFFSETS = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)])
+
+
+def index_path():
+    return Path(os.environ.get('PYROCAST_NEIGHBOR_INDEX', DEFAULT_INDEX_PATH))
+
+
+def unit_vectors(lat, lon):
+    """(n, 3) unit vectors for latitudes and longitudes in degrees"""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+class NeighborIndex:
+    """
+    Radius queries over historical detections
+
+    Args:
+        lat, lon: Detection coordinates in degrees
+        occured: 1 where a fire occurred, else 0
+        frp: Fire radiative power per detection
+        radius_km: Search radius
+    """
+
+    def __init__(self, lat, lon, occured, frp, radius_km=DEFAULT_RADIUS_KM):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        keep = np.isfinite(lat) & np.isfinite(lon)
+        self.lat, self.lon = lat[keep], lon[keep]
+        self.is_fire = np.asarray(occured, dtype=np.float64)[keep] == 1
+        self.frp = np.nan_to_num(np.asarray(frp, dtype=np.float64)[keep])
+        self.radius_km = float(radius_km)
+        self._build()
+
+    def _build(self):
+        # Straight-line (chord) distance on the unit sphere equivalent to the radius
+        self.chord = 2 * math.sin(self.radius_km / (2 * EARTH_RADIUS_KM))
+        self._span = int(math.ceil(2 / self.chord)) + 3
+
+        points = unit_vectors(self.lat, self.lon)
+        keys = self._cell_keys(np.floor(points / self.chord).astype(np.int64))
+        self._order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self._order]
+        self.cell_keys, self.cell_starts = np.unique(sorted_keys, return_index=True)
+        self.cell_counts = np.diff(np.append(self.cell_starts, len(sorted_keys)))
+
+        # Detections in cell order for the distance test
+        self._points = points[self._order]
+        self._fire = self.is_fire[self._order].astype(np.float64)
+        self._fire_frp = np.where(self.is_fire, self.frp, 0.0)[self._order]
+
+    def _cell_keys(self, cells):
+        shifted = cells + self._span // 2
+        return (shifted[..., 0] * self._span + shifted[..., 1]) * self._span + shifted[..., 2]
+
+    @classmethod
+    def from_frame(cls, df, radius_km=DEFAULT_RADIUS_KM):
+        """Index the detections of a dataset DataFrame"""
+        frp = df['frp'] if 'frp' in df.columns else np.zeros(len(df))
+        return cls(df['lat'].to_numpy(), df['lon'].to_numpy(), df['occured'].to_numpy(),
+                   np.asarray(frp), radius_km)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def query(self, lat, lon):
+        """
+        Context features for many locations
+
+        Args:
+            lat, lon: Query coordinates in degrees; NaN means unknown and
+                gives zeros
+
+        Returns:
+            Dict of CONTEXT_FEATURES name -> float64 array
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        detections, fires, frp_sums = self._counts(lat, lon)
+        return self._features(detections, fires, frp_sums)
+
+    def query_self(self):
+        """
+        Context features for every indexed detection, leaving the detection
+        itself out (for training rows that are also in the index)
+
+        Returns:
+            Dict of feature arrays in the order the detections were given
+        """
+        detections, fires, frp_sums = self._counts(self.lat, self.lon)
+        detections -= 1
+        fires -= self.is_fire
+        frp_sums -= np.where(self.is_fire, self.frp, 0.0)
+        return self._features(detections, fires, frp_sums)
+
+    @staticmethod
+    def _features(detections, fires, frp_sums):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_frp = np.where(fires > 0, frp_sums / fires, 0.0)
+            fire_rate = np.where(detections > 0, fires / detections, 0.0)
+        return {
+            'nearby_fire_count': fires,
+            'nearby_mean_frp': mean_frp,
+            'nearby_fire_rate': fire_rate
+        }
+
+    def _counts(self, lat, lon):
+        """Detections, fires and summed fire FRP within the radius"""
+        n_queries = len(lat)
+        detections = np.zeros(n_queries)
+        fires = np.zeros(n_queries)
+        frp_sums = np.zeros(n_queries)
+        if not len(self.cell_keys):
+            return detections, fires, frp_sums
+
+        known = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        for begin in range(0, len(known), QUERY_CHUNK):
+            rows = known[begin:begin + QUERY_CHUNK]
+            points = unit_vectors(lat[rows], lon[rows])
+            cells = np.floor(points / self.chord).astype(np.int64)
+            keys = self._cell_keys(cells[:, None, :] + _OFFSETS[None, :, :])
+
+            # Occupied neighbor cells and the detection ranges they hold
+            slots = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+            counts = np.where(self.cell_keys[slots] == keys, self.cell_counts[slots], 0)
+            starts = self.cell_starts[slots]
+
+            # Split the queries so each distance test sees a bounded number
+            # of candidates
+            per_query = np.cumsum(counts.sum(axis=1))
+            bounds = np.searchsorted(per_query, np.arange(CANDIDATE_CHUNK, per_query[-1], CANDIDATE_CHUNK))
+            for part in np.split(np.arange(len(rows)), np.unique(bounds)):
+                if len(part):
+                    result = self._within(points[part], counts[part].ravel(), starts[part].ravel())
+                    detections[rows[part]], fires[rows[part]], frp_sums[rows[part]] = result
+        return detections, fires, frp_sums
+
+    def _within(self, points, counts, starts):
+        """Distance test for queries against their candidate cell ranges"""
+        n_queries = len(points)
+        total = int(counts.sum())
+        if not total:
+            return 0.0, 0.0, 0.0
+        owner = np.repeat(np.arange(len(counts)) // len(_OFFSETS), counts)
+        # Concatenated [start, start + count) ranges
+        ends = np.cumsum(counts)
+        candidates = np.arange(total) - np.repeat(ends - counts - starts, counts)
+
+        deltas = self._points[candidates] - points[owner]
+        within = np.einsum('ij,ij->i', deltas, deltas) <= self.chord ** 2
+        owner, candidates = owner[within], candidates[within]
+        return (
+            np.bincount(owner, minlength=n_queries),
+            np.bincount(owner, weights=self._fire[candidates], minlength=n_queries),
+            np.bincount(owner, weights=self._fire_frp[candidates], minlength=n_queries)
+        )
+
+    def save(self, path):
+        """Write the detections and radius as an .npz file"""
+        np.savez(path, lat=self.lat, lon=self.lon, occured=self.is_fire.astype(np.uint8),
+                 frp=self.frp, radius_km=np.float64(self.radius_km))
+
+    @classmethod
+    def load(cls, path, radius_km=None):
+        """
+        Load an index written by save()
+
+        Args:
+            path: .npz file
+            radius_km: Search radius; defaults to the saved one
+        """
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['lat'], data['lon'], data['occured'], data['frp'],
+                       radius_km if radius_km is not None else float(data['radius_km']))
+
+
+# (radius_km, path) -> (file mtime, NeighborIndex), and when that mtime was
+# last checked
+_indexes = {}
+_checked_at = {}
+_indexes_lock = threading.Lock()
+
+
+def _mtime(path):
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+def get_neighbor_index(radius_km=DEFAULT_RADIUS_KM, path=None):
+    """
+    Shared serve-time index for a file and radius
+
+    Args:
+        radius_km: Search radius
+        path: Index file; defaults to PYROCAST_NEIGHBOR_INDEX. When that
+            default file does not exist it is built from the data service
+            dataset and saved there.
+    """
+    radius_km = float(radius_km)
+    path = Path(path) if path is not None else index_path()
+    key = (radius_km, str(path))
+    entry = _indexes.get(key)
+    if entry is not None and time.monotonic() - _checked_at.get(key, 0.0) < INDEX_CHECK_SECONDS:
+        return entry[1]
+
+    with _indexes_lock:
+        # Another thread may have (re)loaded it while this one waited
+        entry = _indexes.get(key)
+        now = time.monotonic()
+        if entry is not None and now - _checked_at.get(key, 0.0) < INDEX_CHECK_SECONDS:
+            return entry[1]
+        mtime = _mtime(path)
+        _checked_at[key] = now
+        # A rewritten index file (e.g. after retraining) is picked up here
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        start = time.perf_counter()
+        if mtime is not None:
+            index = NeighborIndex.load(path, radius_km)
+        else:
+            logger.warning(f"⚠️  Neighbor index not found at {path}; building it from the dataset")
+            from data_service import data_service
+            index = NeighborIndex.from_frame(data_service.df, radius_km)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                index.save(path)
+                mtime = _mtime(path)
+            except OSError as e:
+                logger.warning(f"⚠️  Could not save neighbor index: {e}")
+        logger.info(f"📍 Neighbor index: {len(index)} detections, {radius_km:g} km radius, "
+                    f"{(time.perf_counter() - start) * 1000:.0f} ms")
+        _indexes[key] = (mtime, index)
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the historical fire neighbor index")
+    parser.add_argument('--radius-km', type=float, default=DEFAULT_RADIUS_KM)
+    parser.add_argument('--output', default=None, help="Index file (default PYROCAST_NEIGHBOR_INDEX)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from data_service import data_service
+
+    output = Path(args.output) if args.output else index_path()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    index = NeighborIndex.from_frame(data_service.df, args.radius_km)
+    index.save(output)
+    print(f"📍 Indexed {len(index)} detections ({int(index.is_fire.sum())} fires) into {output}")
+
+
+if __name__ == "__main__":
+    main()
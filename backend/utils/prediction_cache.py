@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Bounded LRU/TTL cache for single predictions
+
+Many /predict calls repeat near-identical conditions (form defaults, the
+same station polled every minute). Results are cached under the model
+version plus the resolved feature vector, with each feature rounded to a
+configurable step, so inputs that differ only below that precision share an
+entry. Entries expire after a TTL and the least recently used entry is
+evicted when the cache is full; a model reload clears the cache.
+
+On a miss the service scores the quantized vector itself, so the cached
+result does not depend on which input in a bucket arrived first. /predict
+therefore answers for the rounded inputs and reports them as
+'scored_inputs'; /predict/batch is not cached and scores exact values, so
+the two can differ slightly near a risk threshold. Set
+PYROCAST_PREDICTION_CACHE_SIZE=0 to score /predict inputs exactly.
+
+Configuration (environment):
+    PYROCAST_PREDICTION_CACHE_SIZE       maximum entries (4096, 0 disables)
+    PYROCAST_PREDICTION_CACHE_TTL        seconds an entry stays valid (300)
+    PYROCAST_PREDICTION_CACHE_PRECISION  per-feature rounding steps, e.g.
+                                         "temp_mean=0.5,humidity_min=1"
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import counter, gauge
+
+PREDICTION_CACHE_REQUESTS = counter(
+    'pyrocast_prediction_cache_requests_total', 'Prediction cache lookups', ('result',))
+PREDICTION_CACHE_EVICTIONS = counter(
+    'pyrocast_prediction_cache_evictions_total', 'Prediction cache entries removed', ('reason',))
+PREDICTION_CACHE_ENTRIES = gauge(
+    'pyrocast_prediction_cache_entries', 'Entries in the prediction cache', ('model',))
+
+# Rounding step per model feature; inputs closer than this share an entry
+DEFAULT_PRECISION = {
+    'temp_mean': 0.1,
+    'humidity_min': 0.5,
+    'wind_speed_max': 0.1,
+    'pressure_mean': 0.5,
+    'fire_weather_index': 0.1
+}
+DEFAULT_STEP = 0.01
+
+
+def parse_precision(value):
+    """Parse "feature=step,feature=step" into a dict"""
+    precision = {}
+    for item in value.split(','):
+        name, _, step = item.partition('=')
+        if name.strip() and step.strip():
+            precision[name.strip()] = float(step)
+    return precision
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with per-entry expiry
+
+    Args:
+        maxsize: Maximum number of entries; 0 disables caching
+        ttl: Seconds an entry stays valid
+        precision: Feature name -> rounding step for the cache key
+        name: Model label for the entries gauge; each loaded model has
+            its own cache
+    """
+
+    def __init__(self, maxsize=4096, ttl=300.0, precision=None, name=''):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.precision = dict(DEFAULT_PRECISION, **(precision or {}))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        PREDICTION_CACHE_ENTRIES.set_function(lambda: len(self._entries), name)
+
+    @classmethod
+    def from_env(cls, name=''):
+        env = os.environ.get
+        return cls(
+            maxsize=int(env('PYROCAST_PREDICTION_CACHE_SIZE', 4096)),
+            ttl=float(env('PYROCAST_PREDICTION_CACHE_TTL', 300)),
+            precision=parse_precision(env('PYROCAST_PREDICTION_CACHE_PRECISION', '')),
+            name=name
+        )
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def _steps(self, features, values):
+        return [
+            round(value / self.precision.get(feature, DEFAULT_STEP))
+            for feature, value in zip(features, values)
+        ]
+
+    def make_key(self, model_version, features, values):
+        """
+        Cache key for a resolved feature vector
+
+        Args:
+            model_version: Version of the model producing the result
+            features: Feature names, in model order
+            values: Resolved raw values, one per feature
+        """
+        return (model_version,) + tuple(self._steps(features, values))
+
+    def quantize(self, features, values):
+        """Values snapped to their rounding step, as scored on a miss"""
+        # Rounded again so e.g. 300 steps of 0.1 is 30.0, not 30.000000000000004
+        return [
+            round(steps * self.precision.get(feature, DEFAULT_STEP), 10)
+            for feature, steps in zip(features, self._steps(features, values))
+        ]
+
+    def get(self, key):
+        """Cached result for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    PREDICTION_CACHE_REQUESTS.inc('hit')
+                    return dict(result)
+                del self._entries[key]
+                self.expirations += 1
+                PREDICTION_CACHE_EVICTIONS.inc('expired')
+            self.misses += 1
+        PREDICTION_CACHE_REQUESTS.inc('miss')
+        return None
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+                PREDICTION_CACHE_EVICTIONS.inc('lru')
+
+    def clear(self):
+        """Drop every entry, e.g. after a model reload"""
+        with self._lock:
+            dropped = len(self._entries)
+            self._entries.clear()
+        if dropped:
+            PREDICTION_CACHE_EVICTIONS.inc('invalidated', amount=dropped)
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
@@ -1,89 +1,234 @@
 """
 Preprocessing utilities for Pyro Cast AI
+
+The fitted statistics are kept as contiguous float64 arrays in feature
+order, so arrays can be transformed without pandas: transform_array() and
+inverse_transform_array() take an optional out array, and
+transform_inplace() reuses the input buffer. pandas is only imported for
+the DataFrame paths.
+
+A fitted preprocessor is saved as an uncompressed .npz file holding the
+feature names and the statistic arrays, and loads without pickle.
 """
-import pandas as pd
 import numpy as np
-from typing import Dict, Any, Optional
+from typing import Any, Dict, Optional
+
+STATISTICS = ('means', 'stds', 'mins', 'maxs')
+
 
 class PyroCastAIPreprocessor:
     """
     Preprocessing class for Pyro Cast AI data
+
+    Args:
+        epsilon: Added to the standard deviations before dividing
     """
-    
-    def __init__(self):
+
+    def __init__(self, epsilon: float = 1e-8):
         """Initialize the preprocessor"""
-        self.feature_means = None
-        self.feature_stds = None
-        self.feature_mins = None
-        self.feature_maxs = None
-    
-    def fit(self, X: pd.DataFrame):
+        self.epsilon = epsilon
+        self.feature_names = None
+        self.means = None
+        self.stds = None
+        self.mins = None
+        self.maxs = None
+        self.scale = None
+
+    @classmethod
+    def from_statistics(cls, feature_names: list, means: Dict[str, float], stds: Dict[str, float],
+                        epsilon: float = 0.0):
+        """
+        Build a fitted preprocessor from per-feature statistics, e.g. the
+        means/stds stored with a trained model
+
+        Features without statistics pass through unchanged.
+        """
+        preprocessor = cls(epsilon=epsilon)
+        has_stats = [feature in means and feature in stds for feature in feature_names]
+        preprocessor._set_statistics(
+            feature_names,
+            means=[means[f] if ok else 0.0 for f, ok in zip(feature_names, has_stats)],
+            # Pass-through features get a scale of exactly 1
+            stds=[stds[f] if ok else 1.0 - epsilon for f, ok in zip(feature_names, has_stats)],
+            mins=np.full(len(feature_names), np.nan),
+            maxs=np.full(len(feature_names), np.nan)
+        )
+        return preprocessor
+
+    def _set_statistics(self, feature_names, means, stds, mins, maxs):
+        self.feature_names = list(feature_names)
+        self.means = np.ascontiguousarray(means, dtype=np.float64)
+        self.stds = np.ascontiguousarray(stds, dtype=np.float64)
+        self.mins = np.ascontiguousarray(mins, dtype=np.float64)
+        self.maxs = np.ascontiguousarray(maxs, dtype=np.float64)
+        self.scale = self.stds + self.epsilon
+
+    def _check_fitted(self):
+        if self.means is None:
+            raise ValueError("Preprocessor has not been fitted. Call fit() first.")
+
+    def _series(self, values):
+        """A statistic as a pandas Series indexed by feature name"""
+        if values is None:
+            return None
+        import pandas as pd
+        return pd.Series(values, index=self.feature_names)
+
+    # The statistics as pandas Series, as returned by earlier versions
+    feature_means = property(lambda self: self._series(self.means))
+    feature_stds = property(lambda self: self._series(self.stds))
+    feature_mins = property(lambda self: self._series(self.mins))
+    feature_maxs = property(lambda self: self._series(self.maxs))
+
+    def fit(self, X, feature_names: Optional[list] = None):
         """
         Fit the preprocessor on the training data
-        
+
         Args:
-            X: Input features as a pandas DataFrame
+            X: Input features as a pandas DataFrame or a 2-D array
+            feature_names: Column names when X is an array
         """
-        self.feature_means = X.mean()
-        self.feature_stds = X.std()
-        self.feature_mins = X.min()
-        self.feature_maxs = X.max()
-    
-    def transform(self, X: pd.DataFrame, fit: bool = False) -> np.ndarray:
+        if hasattr(X, 'columns'):
+            feature_names = list(X.columns)
+            X = X.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            X = np.asarray(X, dtype=np.float64)
+            if feature_names is None:
+                feature_names = [f"feature_{j}" for j in range(X.shape[1])]
+
+        # Missing values are skipped; the standard deviation is the sample
+        # one (ddof=1), as pandas computes it
+        self._set_statistics(
+            feature_names,
+            means=np.nanmean(X, axis=0),
+            stds=np.nanstd(X, axis=0, ddof=1),
+            mins=np.nanmin(X, axis=0),
+            maxs=np.nanmax(X, axis=0)
+        )
+
+    def transform_array(self, X: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Normalize a 2-D array whose columns are in feature_names order
+
+        Missing values are filled with the feature mean, i.e. become 0.
+
+        Args:
+            X: Input features, shape (rows, features)
+            out: Optional float64 array of the same shape for the result
+
+        Returns:
+            The normalized array (out, when given)
+        """
+        self._check_fitted()
+        out = np.subtract(X, self.means, out=out, dtype=np.float64)
+        out /= self.scale
+        np.copyto(out, 0.0, where=np.isnan(out))
+        return out
+
+    def transform_inplace(self, X: np.ndarray) -> np.ndarray:
+        """Normalize a float64 array in its own buffer"""
+        return self.transform_array(X, out=X)
+
+    def inverse_transform_array(self, X: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Map normalized values back to the original scale
+
+        Args:
+            X: Normalized features, shape (rows, features)
+            out: Optional float64 array of the same shape for the result
+        """
+        self._check_fitted()
+        out = np.multiply(X, self.scale, out=out, dtype=np.float64)
+        out += self.means
+        return out
+
+    def transform(self, X, fit: bool = False) -> np.ndarray:
         """
         Transform the input data
-        
+
         Args:
-            X: Input features as a pandas DataFrame
+            X: Input features as a pandas DataFrame (columns are selected
+                by name) or a 2-D array in feature_names order
             fit: Whether to fit the preprocessor on the input data
-            
+
         Returns:
             Transformed features as a numpy array
         """
         if fit:
             self.fit(X)
-            
-        if self.feature_means is None:
-            raise ValueError("Preprocessor has not been fitted. Call fit() first.")
-            
-        # Handle missing values
-        X = X.fillna(self.feature_means)
-        
-        # Normalize features
-        X_normalized = (X - self.feature_means) / (self.feature_stds + 1e-8)
-        
-        return X_normalized.values
-    
-    def fit_transform(self, X: pd.DataFrame) -> np.ndarray:
+        self._check_fitted()
+
+        if hasattr(X, 'columns'):
+            X = X[self.feature_names].to_numpy(dtype=np.float64, na_value=np.nan)
+        return self.transform_array(X)
+
+    def fit_transform(self, X) -> np.ndarray:
         """
         Fit the preprocessor and transform the data
-        
+
         Args:
-            X: Input features as a pandas DataFrame
-            
+            X: Input features as a pandas DataFrame or a 2-D array
+
         Returns:
             Transformed features as a numpy array
         """
         self.fit(X)
         return self.transform(X)
-    
-    def inverse_transform(self, X: np.ndarray, feature_names: list = None) -> pd.DataFrame:
+
+    def inverse_transform(self, X: np.ndarray, feature_names: list = None):
         """
         Transform the data back to the original space
-        
+
         Args:
             X: Transformed features as a numpy array
             feature_names: List of feature names
-            
+
         Returns:
-            DataFrame with features in the original space
+            DataFrame with features in the original space when
+            feature_names is given, otherwise a numpy array
         """
-        if self.feature_means is None:
-            raise ValueError("Preprocessor has not been fitted. Call fit() first.")
-            
-        # Convert back to original scale
-        X_original = X * (self.feature_stds + 1e-8) + self.feature_means
-        
+        X_original = self.inverse_transform_array(X)
+
         if feature_names is not None:
+            import pandas as pd
             return pd.DataFrame(X_original, columns=feature_names)
         return X_original
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Fitted state as plain lists (JSON friendly)"""
+        self._check_fitted()
+        state = {'feature_names': self.feature_names, 'epsilon': self.epsilon}
+        for name in STATISTICS:
+            state[name] = getattr(self, name).tolist()
+        return state
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]):
+        preprocessor = cls(epsilon=state['epsilon'])
+        preprocessor._set_statistics(state['feature_names'], *(state[name] for name in STATISTICS))
+        return preprocessor
+
+    def save(self, path) -> None:
+        """
+        Save the fitted state as an .npz file
+
+        Args:
+            path: Output path; numpy appends .npz if it is missing
+        """
+        self._check_fitted()
+        np.savez(
+            path,
+            feature_names=np.array(self.feature_names, dtype=np.str_),
+            epsilon=np.float64(self.epsilon),
+            **{name: getattr(self, name) for name in STATISTICS}
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load a preprocessor written by save()"""
+        with np.load(path, allow_pickle=False) as data:
+            preprocessor = cls(epsilon=float(data['epsilon']))
+            preprocessor._set_statistics(
+                data['feature_names'].tolist(), *(data[name] for name in STATISTICS)
+            )
+        return preprocessor
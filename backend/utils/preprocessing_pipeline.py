@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""
+Cached preprocessing pipeline (notebooks/02_preprocessing.ipynb as stages)
+
+    load      read the raw CSV
+    clean     median-impute numeric columns, drop duplicate rows and cap
+              outliers of the key features at outlier_sigma standard deviations
+    engineer  add the derived features (features.py) and select the model
+              feature columns
+    split     stratified train/test row split
+    scale     fit PyroCastAIPreprocessor (preprocessing.py) on the training
+              rows and scale every row
+    persist   write the processed CSVs, the scaler and the feature info
+
+Each stage's output is cached under a key made of the stage's own
+parameters and the keys of the stages it reads (for load, a hash of the CSV
+content). Changing one parameter therefore changes the key of that stage
+and of the stages downstream of it, and only those run again; everything
+else is served from the cache. Cached outputs are .npz files without
+pickle, and are only loaded when a stage that runs needs them.
+
+Stages run on a thread pool as soon as the stages they read are done: split
+only needs the cleaned labels, so it runs next to engineer.
+
+Outputs (in persist.output_dir, backend/data/processed):
+    wildfire_train.csv, wildfire_test.csv, wildfire_processed.csv
+    feature_scaler.npz    PyroCastAIPreprocessor.save() format
+    feature_info.json     feature columns, target, excluded and new features
+    feature_scaler.pkl, feature_info.pkl
+                          the notebook's joblib files (a fitted scikit-learn
+                          StandardScaler with the same statistics), written
+                          when joblib and scikit-learn are installed
+
+Usage:
+    python utils/preprocessing_pipeline.py [--data ../data/raw/wildfire_dataset.csv]
+        [--set split.test_size=0.25] [--force scale] [--workers 2]
+
+Configuration (environment):
+    PYROCAST_PIPELINE_CACHE_DIR    directory for cached stage outputs
+                                   (backend/data/pipeline_cache)
+"""
+import argparse
+import copy
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+
+from features import FeaturePipeline
+from preprocessing import PyroCastAIPreprocessor
+from simple_model import KEY_FEATURES
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+DEFAULT_CACHE_DIR = DATA_DIR / "pipeline_cache"
+TARGET = 'occured'
+
+DEFAULT_PARAMS = {
+    'load': {'path': str(DATA_DIR / "raw" / "wildfire_dataset.csv")},
+    'clean': {'drop_duplicates': True, 'outlier_sigma': 3.0, 'outlier_features': list(KEY_FEATURES)},
+    'engineer': {
+        # None adds every derived feature the columns allow
+        'derived_features': None,
+        # Target, fire radiative power (a result of the fire, not a
+        # predictor) and location (used separately for mapping)
+        'exclude': [TARGET, 'frp', 'lat', 'lon']
+    },
+    'split': {'test_size': 0.2, 'seed': 42, 'stratify': True},
+    'scale': {'epsilon': 1e-8},
+    'persist': {'output_dir': str(DATA_DIR / "processed")},
+}
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """Content hash of a file"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Stage functions take the outputs of the stages they read (by name) and
+# their parameters, and return a dict of DataFrames, arrays and JSON values
+
+def load_stage(inputs, params):
+    import pandas as pd
+    df = pd.read_csv(params['path'])
+    logger.info(f"📊 Loaded {df.shape[0]} rows x {df.shape[1]} columns from {params['path']}")
+    return {'frame': df}
+
+
+def clean_stage(inputs, params):
+    df = inputs['load']['frame'].copy()
+    numeric = df.select_dtypes(include=[np.number]).columns
+    missing = int(df[numeric].isna().sum().sum())
+    if missing:
+        df[numeric] = df[numeric].fillna(df[numeric].median())
+
+    duplicates = 0
+    if params['drop_duplicates']:
+        before = len(df)
+        df = df.drop_duplicates()
+        duplicates = before - len(df)
+    df = df.reset_index(drop=True)
+
+    # Cap at mean +/- outlier_sigma sample standard deviations
+    outliers = {}
+    for feature in params['outlier_features']:
+        if feature not in df.columns:
+            continue
+        mean, std = df[feature].mean(), df[feature].std()
+        lower, upper = mean - params['outlier_sigma'] * std, mean + params['outlier_sigma'] * std
+        outliers[feature] = int(((df[feature] < lower) | (df[feature] > upper)).sum())
+        df[feature] = df[feature].clip(lower, upper)
+
+    logger.info(f"🧹 Imputed {missing} missing values, dropped {duplicates} duplicates, "
+                f"capped {sum(outliers.values())} outliers")
+    return {'frame': df, 'imputed': missing, 'duplicates': duplicates, 'outliers': outliers}
+
+
+def engineer_stage(inputs, params):
+    df = inputs['clean']['frame'].copy()
+    pipeline = FeaturePipeline()
+    names = params['derived_features']
+    new_features = pipeline.add_to_frame(df, None if names is None else list(names))
+    feature_columns = [column for column in df.columns if column not in params['exclude']]
+    logger.info(f"🔬 Added {len(new_features)} derived features; {len(feature_columns)} model features")
+    return {
+        'features': df[feature_columns],
+        'feature_columns': feature_columns,
+        'excluded_columns': list(params['exclude']),
+        'new_features': new_features
+    }
+
+
+def split_stage(inputs, params):
+    """Row indices of a (stratified) random train/test split"""
+    y = inputs['clean']['frame'][TARGET].to_numpy()
+    rng = np.random.RandomState(params['seed'])
+    groups = [np.flatnonzero(y == label) for label in np.unique(y)] if params['stratify'] else [np.arange(len(y))]
+
+    test = []
+    for rows in groups:
+        rows = rng.permutation(rows)
+        test.append(rows[:int(round(len(rows) * params['test_size']))])
+    test_index = np.sort(np.concatenate(test)) if test else np.array([], dtype=np.int64)
+    train_index = np.setdiff1d(np.arange(len(y)), test_index)
+    logger.info(f"✂️  Split {len(train_index)} training / {len(test_index)} test rows")
+    return {'train_index': train_index, 'test_index': test_index, 'y': y}
+
+
+def scale_stage(inputs, params):
+    features = inputs['engineer']['features']
+    split = inputs['split']
+    X = features.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    preprocessor = PyroCastAIPreprocessor(epsilon=params['epsilon'])
+    preprocessor.fit(X[split['train_index']], feature_names=list(features.columns))
+    scaled = preprocessor.transform_inplace(X)
+    logger.info(f"⚖️  Scaled {X.shape[1]} features fitted on {len(split['train_index'])} rows")
+    return {'scaled': scaled, 'scaler': preprocessor.to_dict()}
+
+
+def persist_stage(inputs, params):
+    import pandas as pd
+
+    output_dir = Path(params['output_dir'])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    engineer, split, scale = inputs['engineer'], inputs['split'], inputs['scale']
+    columns = engineer['feature_columns']
+    scaled = pd.DataFrame(scale['scaled'], columns=columns)
+    scaled[TARGET] = split['y']
+
+    paths = {
+        'train': output_dir / 'wildfire_train.csv',
+        'test': output_dir / 'wildfire_test.csv',
+        'processed': output_dir / 'wildfire_processed.csv',
+        'scaler': output_dir / 'feature_scaler.npz',
+        'feature_info': output_dir / 'feature_info.json',
+    }
+    scaled.iloc[split['train_index']].to_csv(paths['train'], index=False)
+    scaled.iloc[split['test_index']].to_csv(paths['test'], index=False)
+    # The complete file is the training rows then the test rows: join the
+    # two files instead of formatting every value again
+    with open(paths['processed'], 'wb') as out:
+        with open(paths['train'], 'rb') as f:
+            shutil.copyfileobj(f, out)
+        with open(paths['test'], 'rb') as f:
+            f.readline()
+            shutil.copyfileobj(f, out)
+
+    preprocessor = PyroCastAIPreprocessor.from_dict(scale['scaler'])
+    preprocessor.save(paths['scaler'])
+    feature_info = {
+        'feature_columns': columns,
+        'target_column': TARGET,
+        'excluded_columns': engineer['excluded_columns'],
+        'new_features': engineer['new_features']
+    }
+    with open(paths['feature_info'], 'w') as f:
+        json.dump(feature_info, f, indent=2)
+
+    paths.update(write_joblib_files(output_dir, preprocessor, feature_info, len(split['train_index'])))
+    logger.info(f"💾 Processed data written to {output_dir}")
+    return {'files': {str(path): file_fingerprint(path) for path in paths.values()}}
+
+
+def persist_is_current(output):
+    """Whether the written files are still there, unchanged since the run"""
+    for path, fingerprint in output['files'].items():
+        try:
+            if file_fingerprint(path) != fingerprint:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def write_joblib_files(output_dir, preprocessor, feature_info, n_samples):
+    """
+    The notebook's feature_scaler.pkl and feature_info.pkl, when joblib and
+    scikit-learn are installed
+
+    Returns:
+        Dict of the written paths
+    """
+    try:
+        import joblib
+        from sklearn.preprocessing import StandardScaler
+    except ImportError:
+        logger.info("joblib/scikit-learn not installed; skipping the .pkl files")
+        return {}
+
+    scaler = StandardScaler()
+    scaler.mean_ = preprocessor.means.copy()
+    scaler.scale_ = preprocessor.scale.copy()
+    scaler.var_ = preprocessor.scale ** 2
+    scaler.n_features_in_ = len(preprocessor.feature_names)
+    scaler.feature_names_in_ = np.array(preprocessor.feature_names, dtype=object)
+    scaler.n_samples_seen_ = n_samples
+
+    paths = {'scaler_pkl': output_dir / 'feature_scaler.pkl', 'feature_info_pkl': output_dir / 'feature_info.pkl'}
+    joblib.dump(scaler, paths['scaler_pkl'])
+    joblib.dump(feature_info, paths['feature_info_pkl'])
+    return paths
+
+
+class Stage:
+    """
+    One pipeline stage
+
+    Args:
+        name: Stage name, also its parameter section
+        reads: Names of the stages whose outputs it takes
+        run: Function of (inputs, params) returning the output dict
+        is_current: Optional function of a cached output telling whether it
+            still holds, for stages with effects outside the cache
+        version: Bump when run changes, to invalidate cached outputs
+    """
+
+    def __init__(self, name, reads, run, is_current=None, version=1):
+        self.name = name
+        self.reads = tuple(reads)
+        self.run = run
+        self.is_current = is_current
+        self.version = version
+
+
+STAGES = [
+    Stage('load', (), load_stage),
+    Stage('clean', ('load',), clean_stage),
+    Stage('engineer', ('clean',), engineer_stage),
+    Stage('split', ('clean',), split_stage),
+    Stage('scale', ('engineer', 'split'), scale_stage),
+    Stage('persist', ('engineer', 'split', 'scale'), persist_stage, is_current=persist_is_current),
+]
+
+
+class StageCache:
+    """
+    Stage outputs by key as .npz files
+
+    DataFrames are stored column by column and other values that are not
+    arrays as JSON, so nothing needs pickle to load.
+
+    Args:
+        cache_dir: Directory for the cached outputs
+        keep: Outputs kept per stage; the least recently written go first
+    """
+
+    def __init__(self, cache_dir, keep=4):
+        self.cache_dir = Path(cache_dir)
+        self.keep = keep
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ.get('PYROCAST_PIPELINE_CACHE_DIR', DEFAULT_CACHE_DIR))
+
+    def path(self, stage, key):
+        return self.cache_dir / f"{stage}-{key}.npz"
+
+    def has(self, stage, key):
+        return self.path(stage, key).exists()
+
+    def get(self, stage, key):
+        """Cached output of a stage, or None"""
+        try:
+            with np.load(self.path(stage, key), allow_pickle=False) as data:
+                meta = json.loads(str(data['__meta__']))
+                output = dict(meta['values'])
+                for name in meta['arrays']:
+                    output[name] = data[name]
+                if meta['frames']:
+                    import pandas as pd
+                    for name, columns in meta['frames'].items():
+                        output[name] = pd.DataFrame(
+                            {column: data[f"{name}.{i}"] for i, column in enumerate(columns)},
+                            columns=columns
+                        )
+                return output
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+
+    def put(self, stage, key, output):
+        meta = {'frames': {}, 'arrays': [], 'values': {}}
+        arrays = {}
+        for name, value in output.items():
+            if hasattr(value, 'columns'):
+                columns = [str(column) for column in value.columns]
+                meta['frames'][name] = columns
+                for i, column in enumerate(value.columns):
+                    values = value[column].to_numpy()
+                    # Text columns as fixed-width strings, which load without pickle
+                    arrays[f"{name}.{i}"] = values.astype(np.str_) if values.dtype == object else values
+            elif isinstance(value, np.ndarray):
+                meta['arrays'].append(name)
+                arrays[name] = value
+            else:
+                meta['values'][name] = value
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_dir / f"{stage}-{key}.tmp.npz"
+            np.savez(tmp_path, __meta__=np.array(json.dumps(meta)), **arrays)
+            os.replace(tmp_path, self.path(stage, key))
+            self._prune(stage)
+        except OSError as e:
+            logger.warning(f"⚠️  Could not cache {stage} output: {e}")
+
+    def _prune(self, stage):
+        entries = sorted(self.cache_dir.glob(f"{stage}-*.npz"), key=lambda path: path.stat().st_mtime)
+        for path in entries[:-self.keep]:
+            path.unlink()
+
+
+class PreprocessingPipeline:
+    """
+    Runs the stages, reusing cached outputs whose key did not change
+
+    Args:
+        stages: Stage definitions; every stage is listed after the stages
+            it reads
+        cache: StageCache; defaults to PYROCAST_PIPELINE_CACHE_DIR
+        workers: Stages run at the same time
+    """
+
+    def __init__(self, stages=None, cache=None, workers=2):
+        self.stages = list(STAGES if stages is None else stages)
+        self.by_name = {stage.name: stage for stage in self.stages}
+        self.cache = cache or StageCache.from_env()
+        self.workers = workers
+
+    def resolve_params(self, overrides=None):
+        """Default parameters updated with {stage: {name: value}} overrides"""
+        params = copy.deepcopy(DEFAULT_PARAMS)
+        for stage, values in (overrides or {}).items():
+            if stage not in self.by_name:
+                raise ValueError(f"Unknown stage '{stage}'")
+            unknown = [name for name in values if name not in params.get(stage, {})]
+            if unknown:
+                raise ValueError(f"Unknown {stage} parameters: {', '.join(unknown)}")
+            params.setdefault(stage, {}).update(values)
+        return params
+
+    def stage_keys(self, params):
+        """
+        Cache key of every stage: its name, version and parameters plus the
+        keys of the stages it reads (for load, the CSV content hash)
+        """
+        keys = {}
+        for stage in self.stages:
+            parts = {
+                'stage': stage.name,
+                'version': stage.version,
+                'params': params.get(stage.name, {}),
+                'reads': [keys[name] for name in stage.reads]
+            }
+            if stage.name == 'load':
+                parts['input'] = file_fingerprint(params['load']['path'])
+            keys[stage.name] = hashlib.blake2b(
+                json.dumps(parts, sort_keys=True).encode('utf-8'), digest_size=16
+            ).hexdigest()
+        return keys
+
+    def _is_cached(self, stage, key, force):
+        if stage.name in force or not self.cache.has(stage.name, key):
+            return False
+        if stage.is_current is None:
+            return True
+        output = self.cache.get(stage.name, key)
+        return output is not None and stage.is_current(output)
+
+    def run(self, overrides=None, force=()):
+        """
+        Run the pipeline
+
+        Args:
+            overrides: {stage: {param: value}} changes to DEFAULT_PARAMS
+            force: Stage names to run even if cached; their downstream
+                stages run as well
+
+        Returns:
+            (outputs of the stages that ran or were loaded, report) where
+            report lists {'stage', 'key', 'status', 'seconds'} per stage
+        """
+        params = self.resolve_params(overrides)
+        keys = self.stage_keys(params)
+        force = set(force)
+
+        # A stage runs when it is not cached or any stage it reads runs
+        to_run = set()
+        for stage in self.stages:
+            if not self._is_cached(stage, keys[stage.name], force) \
+                    or any(name in to_run for name in stage.reads):
+                to_run.add(stage.name)
+
+        # Cached outputs are loaded only when a running stage reads them;
+        # one that cannot be loaded is run again (walking upstream)
+        outputs = {}
+        for stage in reversed(self.stages):
+            if stage.name in to_run:
+                for name in stage.reads:
+                    if name not in to_run and name not in outputs:
+                        output = self.cache.get(name, keys[name])
+                        if output is None:
+                            to_run.add(name)
+                        else:
+                            outputs[name] = output
+
+        report = {stage.name: {'stage': stage.name, 'key': keys[stage.name], 'status': 'cached',
+                               'seconds': 0.0} for stage in self.stages}
+        done = {stage.name for stage in self.stages if stage.name not in to_run}
+        pending = [stage for stage in self.stages if stage.name in to_run]
+        running = {}
+
+        def execute(stage):
+            start = time.perf_counter()
+            inputs = {name: outputs[name] for name in stage.reads}
+            output = stage.run(inputs, params.get(stage.name, {}))
+            self.cache.put(stage.name, keys[stage.name], output)
+            return output, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while pending or running:
+                for stage in [s for s in pending if all(name in done for name in s.reads)]:
+                    pending.remove(stage)
+                    running[executor.submit(execute, stage)] = stage
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    outputs[stage.name], seconds = future.result()
+                    report[stage.name].update(status='ran', seconds=seconds)
+                    done.add(stage.name)
+
+        return outputs, [report[stage.name] for stage in self.stages]
+
+
+def parse_override(value):
+    """'stage.param=value' with a JSON value (plain strings allowed)"""
+    name, _, raw = value.partition('=')
+    stage, _, param = name.partition('.')
+    if not stage or not param or not raw:
+        raise argparse.ArgumentTypeError(f"Expected stage.param=value, got '{value}'")
+    try:
+        parsed = json.loads(raw)
+    except ValueError:
+        parsed = raw
+    return stage, param, parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the cached preprocessing pipeline")
+    parser.add_argument('--data', default=None, help="Raw CSV (default ../data/raw/wildfire_dataset.csv)")
+    parser.add_argument('--output', default=None, help="Directory for the processed files")
+    parser.add_argument('--set', dest='overrides', action='append', type=parse_override, default=[],
+                        metavar='STAGE.PARAM=VALUE', help="Override a stage parameter (JSON value)")
+    parser.add_argument('--force', action='append', default=[], help="Rerun a stage and its downstream stages")
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    overrides = {}
+    for stage, param, value in args.overrides:
+        overrides.setdefault(stage, {})[param] = value
+    if args.data:
+        overrides.setdefault('load', {})['path'] = args.data
+    if args.output:
+        overrides.setdefault('persist', {})['output_dir'] = args.output
+
+    pipeline = PreprocessingPipeline(workers=args.workers)
+    try:
+        data_path = Path(pipeline.resolve_params(overrides)['load']['path'])
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    if not data_path.exists():
+        print(f"❌ Data file not found: {data_path}")
+        return
+
+    print("🚀 Running preprocessing pipeline...")
+    start = time.perf_counter()
+    outputs, report = pipeline.run(overrides, force=args.force)
+    for entry in report:
+        status = f"ran in {entry['seconds']:.2f}s" if entry['status'] == 'ran' else 'cached'
+        print(f"  {entry['stage']:<10}{entry['key'][:12]}  {status}")
+    print(f"🎉 Pipeline completed in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Opt-in request profiling and slow-request capture
+
+A request to a profiled path (/api/*, /predict/batch by default) is run
+under cProfile when it carries an `X-Profile: 1` header or is picked by the
+sampling rate. The top-N functions by cumulative time are kept in memory.
+Independently, every request slower than the threshold is logged with its
+per-phase timings (parse, validate, score, serialize), which handlers report
+through the phase() context manager.
+
+Configuration (environment):
+    PYROCAST_PROFILE_SAMPLE_RATE   fraction of requests to profile (default 0)
+    PYROCAST_SLOW_REQUEST_MS       slow request threshold (default 500)
+    PYROCAST_ADMIN_TOKEN           required as X-Admin-Token for the admin
+                                   endpoints and header-triggered profiles;
+                                   unset, they are only open to direct
+                                   loopback clients (not proxied requests)
+"""
+import cProfile
+import io
+import itertools
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROFILED_PREFIXES = ('/api/', '/predict/batch')
+DEFAULT_TOP_N = 25
+MAX_CAPTURES = 100
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+
+@contextmanager
+def phase(name):
+    """
+    Time a phase of the current request
+
+    Repeated phases with the same name accumulate. Outside of a request
+    context the block simply runs untimed.
+    """
+    from flask import g, has_request_context
+
+    if not has_request_context():
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases = g.setdefault('request_phases', {})
+        phases[name] = phases.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def summarize_profile(profiler, top_n=DEFAULT_TOP_N):
+    """
+    Top-N functions of a finished profile, by cumulative time
+
+    Returns:
+        List of dicts with function, file, line, calls and times in ms
+    """
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, function), (cc, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': function,
+            'file': filename,
+            'line': line,
+            'calls': ncalls,
+            'primitive_calls': cc,
+            'self_ms': tottime * 1000,
+            'cumulative_ms': cumtime * 1000
+        })
+    rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    return rows[:top_n]
+
+
+class CaptureStore:
+    """Bounded in-memory store of profiles and slow-request records"""
+
+    def __init__(self, max_captures=MAX_CAPTURES):
+        self.profiles = deque(maxlen=max_captures)
+        self.slow_requests = deque(maxlen=max_captures)
+        self._ids = itertools.count(1)
+
+    def next_id(self):
+        return next(self._ids)
+
+    def get_profile(self, capture_id):
+        for capture in list(self.profiles):
+            if capture['id'] == capture_id:
+                return capture
+        return None
+
+
+def install_profiling(app, sample_rate=None, slow_threshold_ms=None,
+                      top_n=DEFAULT_TOP_N, prefixes=PROFILED_PREFIXES, store=None):
+    """
+    Register the profiling hooks and admin endpoints on a Flask app
+
+    Args:
+        app: Flask application
+        sample_rate: Fraction of eligible requests to profile
+        slow_threshold_ms: Requests at least this slow are logged
+        top_n: Number of functions kept per profile
+        prefixes: URL path prefixes eligible for profiling
+        store: CaptureStore to use, a new one by default
+
+    Returns:
+        The CaptureStore
+    """
+    from flask import abort, g, request
+
+    from response_encoding import api_response
+
+    if sample_rate is None:
+        sample_rate = float(os.environ.get('PYROCAST_PROFILE_SAMPLE_RATE', 0))
+    if slow_threshold_ms is None:
+        slow_threshold_ms = float(os.environ.get('PYROCAST_SLOW_REQUEST_MS', 500))
+    admin_token = os.environ.get('PYROCAST_ADMIN_TOKEN')
+    store = store or CaptureStore()
+
+    # cProfile can only have one active profiler per process on newer
+    # Pythons, so concurrent requests are not profiled together
+    profiler_lock = threading.Lock()
+
+    def is_admin():
+        if admin_token is not None:
+            return request.headers.get('X-Admin-Token') == admin_token
+        # A reverse proxy on the same host would make every client loopback
+        return request.remote_addr in LOOPBACK_ADDRESSES and 'X-Forwarded-For' not in request.headers
+
+    def wants_profile():
+        if not request.path.startswith(prefixes):
+            return False
+        if request.headers.get('X-Profile') == '1' and is_admin():
+            return True
+        return sample_rate > 0 and random.random() < sample_rate
+
+    @app.before_request
+    def start_request_profile():
+        g.request_start = time.perf_counter()
+        if wants_profile() and profiler_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                profiler_lock.release()
+                return
+            g.request_profiler = profiler
+
+    @app.after_request
+    def finish_request_profile(response):
+        profiler = g.pop('request_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            profiler_lock.release()
+
+        start = g.get('request_start')
+        if start is None:
+            return response
+        duration_ms = (time.perf_counter() - start) * 1000
+        phases = g.get('request_phases', {})
+
+        if profiler is not None:
+            capture_id = store.next_id()
+            store.profiles.append({
+                'id': capture_id,
+                'timestamp': time.time(),
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+                'phases_ms': dict(phases),
+                'top_functions': summarize_profile(profiler, top_n)
+            })
+            response.headers['X-Profile-Id'] = str(capture_id)
+
+        if duration_ms >= slow_threshold_ms:
+            record = {
+                'timestamp': time.time(),
+                'method': request.method,
+                'path': request.path,
+                'query': request.query_string.decode('utf-8', 'replace'),
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+                'phases_ms': dict(phases),
+                'profile_id': response.headers.get('X-Profile-Id')
+            }
+            store.slow_requests.append(record)
+            logger.warning(f"Slow request {request.method} {request.path}: {duration_ms:.1f}ms {record['phases_ms']}")
+
+        return response
+
+    @app.teardown_request
+    def release_request_profile(exc):
+        # The after_request hook is skipped when a handler raises
+        profiler = g.pop('request_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            profiler_lock.release()
+
+    @app.route('/admin/profiles', methods=['GET'])
+    def list_profiles():
+        """List recent profile captures without their function tables"""
+        if not is_admin():
+            abort(403)
+        captures = [
+            {k: v for k, v in capture.items() if k != 'top_functions'}
+            for capture in reversed(store.profiles)
+        ]
+        return api_response({"success": True, "data": captures})
+
+    @app.route('/admin/profiles/<int:capture_id>', methods=['GET'])
+    def get_profile(capture_id):
+        """Get one profile capture with its top functions"""
+        if not is_admin():
+            abort(403)
+        capture = store.get_profile(capture_id)
+        if capture is None:
+            return api_response({"success": False, "error": "Profile not found"}, 404)
+        return api_response({"success": True, "data": capture})
+
+    @app.route('/admin/slow-requests', methods=['GET'])
+    def list_slow_requests():
+        """List recent requests over the slow threshold"""
+        if not is_admin():
+            abort(403)
+        return api_response({
+            "success": True,
+            "data": list(reversed(store.slow_requests)),
+            "threshold_ms": slow_threshold_ms
+        })
+
+    return store
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Region-wide risk rasters: score every cell of a lat/lon grid
+
+A grid is a bounding box split into width x height cells, stored row-major
+with row 0 at the northern edge. Each model input is either a uniform value
+for the whole grid or one value per cell, sent as a JSON array or as
+base64-encoded little-endian float32. Cells are scored in fixed-size chunks
+through the vectorized model path, so memory stays bounded by the chunk
+size plus the inputs and output.
+
+The result is a compact binary raster: a 48-byte header followed by one
+value per cell.
+
+    offset  size  field
+    0       4     magic b'PYRR'
+    4       1     format version (1)
+    5       1     data type: 1 = uint8, 2 = float16
+    6       2     reserved (0)
+    8       4     width  (uint32)
+    12      4     height (uint32)
+    16      32    min_lon, min_lat, max_lon, max_lat (float64)
+
+uint8 cells hold round(probability * 254), with 255 marking cells whose
+inputs were missing, non-finite or out of range; float16 cells hold the
+probability, with NaN for those cells. All fields are little-endian.
+
+Configuration (environment):
+    PYROCAST_MAX_RASTER_CELLS      largest grid one request may score (16777216)
+    PYROCAST_RASTER_CHUNK_CELLS    cells scored per vectorized pass (1048576)
+"""
+import base64
+import binascii
+import math
+import os
+import struct
+
+import numpy as np
+
+from simple_predict import FEATURE_RANGES
+
+RASTER_MIMETYPE = 'application/vnd.pyrocast.raster'
+RASTER_MAGIC = b'PYRR'
+RASTER_VERSION = 1
+HEADER = struct.Struct('<4sBBHII4d')
+
+UINT8 = 1
+FLOAT16 = 2
+DTYPE_CODES = {'uint8': UINT8, 'float16': FLOAT16}
+UINT8_SCALE = 254
+UINT8_NODATA = 255
+
+
+def max_raster_cells():
+    return int(os.environ.get('PYROCAST_MAX_RASTER_CELLS', 1 << 24))
+
+
+def raster_chunk_cells():
+    return int(os.environ.get('PYROCAST_RASTER_CHUNK_CELLS', 1 << 20))
+
+
+class RasterGrid:
+    """
+    Geometry of a raster: bounding box and cell counts
+
+    Args:
+        bbox: (min_lon, min_lat, max_lon, max_lat) in degrees
+        width: Cells along longitude
+        height: Cells along latitude
+    """
+
+    def __init__(self, bbox, width, height):
+        self.bbox = tuple(float(v) for v in bbox)
+        self.width = int(width)
+        self.height = int(height)
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        Build a grid from a request: bbox plus either resolution (degrees
+        per cell) or width and height
+        """
+        if not isinstance(spec, dict):
+            raise ValueError("The grid specification must be a JSON object")
+        bbox = spec.get('bbox')
+        if not isinstance(bbox, list) or len(bbox) != 4:
+            raise ValueError("'bbox' must be [min_lon, min_lat, max_lon, max_lat]")
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox)
+        except (TypeError, ValueError):
+            raise ValueError("'bbox' values must be numbers")
+        if not (-180 <= min_lon < max_lon <= 180 and -90 <= min_lat < max_lat <= 90):
+            raise ValueError("'bbox' must be a non-empty box within lon [-180, 180], lat [-90, 90]")
+
+        if 'resolution' in spec:
+            resolution = _finite_number(spec['resolution'], 'resolution')
+            if not resolution > 0:
+                raise ValueError("'resolution' must be positive")
+            cells_x = (max_lon - min_lon) / resolution
+            cells_y = (max_lat - min_lat) / resolution
+            if not (math.isfinite(cells_x) and math.isfinite(cells_y)):
+                raise ValueError("'resolution' is too small")
+            width = math.ceil(cells_x - 1e-9)
+            height = math.ceil(cells_y - 1e-9)
+        elif 'width' in spec and 'height' in spec:
+            width, height = (_finite_number(spec[name], name) for name in ('width', 'height'))
+            if width != int(width) or height != int(height):
+                raise ValueError("'width' and 'height' must be whole numbers")
+            width, height = int(width), int(height)
+        else:
+            raise ValueError("Give either 'resolution' or 'width' and 'height'")
+        if width < 1 or height < 1:
+            raise ValueError("The grid must have at least one cell")
+        return cls((min_lon, min_lat, max_lon, max_lat), width, height)
+
+    @property
+    def n_cells(self):
+        return self.width * self.height
+
+    def to_dict(self):
+        return {'bbox': list(self.bbox), 'width': self.width, 'height': self.height}
+
+    def cell_centers(self, begin, end):
+        """(lat, lon) arrays of the centers of cells begin..end-1"""
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        row, col = np.divmod(np.arange(begin, end), self.width)
+        lon = min_lon + (col + 0.5) * ((max_lon - min_lon) / self.width)
+        lat = max_lat - (row + 0.5) * ((max_lat - min_lat) / self.height)
+        return lat, lon
+
+
+def _finite_number(value, name):
+    """A request number as float; raises ValueError for anything else"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"'{name}' must be a finite number")
+    return float(value)
+
+
+def decode_input(value, n_cells, feature):
+    """
+    One model input as a float scalar (uniform fill) or per-cell array
+
+    Args:
+        value: Number, (nested) list, or {"dtype": "float32", "data": base64}
+        n_cells: Cells in the grid
+        feature: Feature name, for error messages
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, dict):
+        if value.get('dtype', 'float32') != 'float32':
+            raise ValueError(f"{feature}: only float32 binary input is supported")
+        try:
+            array = np.frombuffer(base64.b64decode(value.get('data', ''), validate=True), dtype='<f4')
+        except (binascii.Error, ValueError):
+            raise ValueError(f"{feature}: 'data' must be base64 of little-endian float32 values")
+    elif isinstance(value, list):
+        try:
+            array = np.asarray(value, dtype=np.float32).ravel()
+        except (TypeError, ValueError):
+            raise ValueError(f"{feature}: per-cell values must be numbers")
+    else:
+        raise ValueError(f"{feature}: expected a number, a list or a base64 float32 block")
+    if len(array) != n_cells:
+        raise ValueError(f"{feature}: expected {n_cells} values, got {len(array)}")
+    return array
+
+
+def resolve_inputs(predictor, inputs, n_cells):
+    """Map request input names to model features and decode them"""
+    if not isinstance(inputs, dict):
+        raise ValueError("'inputs' must map feature names to values")
+    resolved = {}
+    for name, value in inputs.items():
+        feature = predictor.resolve_feature(name)
+        if feature is None:
+            raise ValueError(f"Unknown feature '{name}'")
+        resolved[feature] = decode_input(value, n_cells, feature)
+    return resolved
+
+
+def _invalid_cells(values, feature):
+    """Mask of cells whose value is non-finite or outside the feature range"""
+    invalid = ~np.isfinite(values)
+    low, high = FEATURE_RANGES.get(feature, (None, None))
+    if low is not None:
+        invalid |= values < low
+    if high is not None:
+        invalid |= values > high
+    return invalid
+
+
+def score_grid(predictor, grid, inputs, dtype='uint8', chunk_cells=None):
+    """
+    Score every cell of a grid in chunked vectorized passes
+
+    Args:
+        predictor: SimpleWildfirePredictionService
+        grid: RasterGrid
+        inputs: Feature name -> float (uniform) or float32 array of n_cells;
+            features not given take their defaults
+        dtype: 'uint8' or 'float16'
+        chunk_cells: Cells per pass; defaults to PYROCAST_RASTER_CHUNK_CELLS
+
+    Models with context features are located at each cell center unless
+    lat/lon are given as inputs.
+
+    Returns:
+        numpy array of n_cells values in the requested encoding
+    """
+    if not isinstance(dtype, str) or dtype not in DTYPE_CODES:
+        raise ValueError(f"'dtype' must be one of {sorted(DTYPE_CODES)}")
+    chunk_cells = chunk_cells or raster_chunk_cells()
+    n_cells = grid.n_cells
+    locate = bool(predictor.model_data.get('context_features'))
+
+    # Uniform inputs are checked once, per-cell ones chunk by chunk
+    uniform_invalid = any(
+        _invalid_cells(np.array([value]), feature)[0]
+        for feature, value in inputs.items() if isinstance(value, float)
+    )
+
+    out = np.empty(n_cells, dtype=np.uint8 if dtype == 'uint8' else np.float16)
+    for begin in range(0, n_cells, chunk_cells):
+        end = min(begin + chunk_cells, n_cells)
+        columns = {}
+        invalid = np.full(end - begin, uniform_invalid)
+        for feature, value in inputs.items():
+            if isinstance(value, float):
+                columns[feature] = np.full(end - begin, value)
+            else:
+                columns[feature] = value[begin:end].astype(np.float64)
+                invalid |= _invalid_cells(columns[feature], feature)
+        if locate:
+            lat, lon = grid.cell_centers(begin, end)
+            columns.setdefault('lat', lat)
+            columns.setdefault('lon', lon)
+        if not columns:
+            # No inputs at all: every feature takes its default (NaN does)
+            columns[predictor.input_features[0]] = np.full(end - begin, np.nan)
+
+        probabilities = predictor.predict_proba_columns(columns)
+        if dtype == 'uint8':
+            chunk = np.rint(probabilities * UINT8_SCALE).astype(np.uint8)
+            chunk[invalid] = UINT8_NODATA
+        else:
+            chunk = probabilities.astype(np.float16)
+            chunk[invalid] = np.nan
+        out[begin:end] = chunk
+    return out
+
+
+def encode_raster(grid, data):
+    """Header plus cell values as bytes"""
+    dtype_code = UINT8 if data.dtype == np.uint8 else FLOAT16
+    header = HEADER.pack(RASTER_MAGIC, RASTER_VERSION, dtype_code, 0, grid.width, grid.height, *grid.bbox)
+    return header + data.astype(data.dtype.newbyteorder('<'), copy=False).tobytes()
+
+
+def decode_raster(body):
+    """
+    Parse a binary raster
+
+    Returns:
+        (RasterGrid, numpy array of shape (height, width))
+    """
+    magic, version, dtype_code, _, width, height, *bbox = HEADER.unpack_from(body)
+    if magic != RASTER_MAGIC or version != RASTER_VERSION:
+        raise ValueError("Not a PyroCast raster")
+    dtype = np.dtype('u1') if dtype_code == UINT8 else np.dtype('<f2')
+    data = np.frombuffer(body, dtype=dtype, offset=HEADER.size, count=width * height)
+    return RasterGrid(bbox, width, height), data.reshape(height, width)
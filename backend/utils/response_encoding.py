@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Negotiated response encoding for the API
+
+Responses are serialized with the fastest available JSON encoder (orjson when
+installed), or in a binary format when the client asks for one through the
+Accept header:
+
+  application/msgpack                    any payload (needs msgpack)
+  application/vnd.apache.arrow.stream    tabular payloads (needs pyarrow)
+
+Bodies above a size threshold are then compressed with brotli or gzip
+according to Accept-Encoding. All encoders are optional dependencies; a
+client that asks for an unavailable format gets JSON. Apart from orjson they
+are imported on first use, so they do not add to start-up time.
+"""
+import functools
+import gzip
+import importlib
+import importlib.util
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from flask import Response, request
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# Keys whose value is a list of flat records and can be sent as an Arrow table
+TABULAR_KEYS = ('data', 'predictions')
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+@functools.lru_cache(maxsize=None)
+def is_installed(name):
+    """Whether an optional dependency can be imported, without importing it"""
+    return importlib.util.find_spec(name) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def optional_module(name):
+    """Import an optional dependency on first use; None if not installed"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def _json_default(value):
+    """Serialize numpy scalars/arrays that the stdlib encoder rejects"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(payload):
+    """Encode a payload as compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_json_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_json_default, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_msgpack(payload):
+    """Encode a payload as MessagePack bytes"""
+    return optional_module('msgpack').packb(payload, default=_json_default, use_bin_type=True)
+
+
+def tabular_key(payload):
+    """Key of the record list in a payload, or None if it is not tabular"""
+    if not isinstance(payload, dict):
+        return None
+    for key in TABULAR_KEYS:
+        rows = payload.get(key)
+        if isinstance(rows, list) and rows and all(isinstance(row, dict) for row in rows):
+            return key
+    return None
+
+
+def dumps_arrow(payload):
+    """
+    Encode the record list of a tabular payload as an Arrow IPC stream
+
+    The columns are every key of every record, in first-seen order, so
+    rows with different fields (e.g. batch errors next to predictions)
+    keep all of them; missing values are null. The remaining top-level
+    keys travel as JSON in the schema metadata under b'payload', with
+    b'table_key' naming the key the table replaces.
+    """
+    pa = optional_module('pyarrow')
+    ipc = importlib.import_module('pyarrow.ipc')
+
+    key = tabular_key(payload)
+    rows = payload[key]
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    schema = pa.schema([(name, pa.infer_type([row.get(name) for row in rows])) for name in names])
+    table = pa.Table.from_pylist(rows, schema=schema)
+    metadata = {k: v for k, v in payload.items() if k != key}
+    table = table.replace_schema_metadata({
+        b'table_key': key.encode('utf-8'),
+        b'payload': dumps_json(metadata)
+    })
+
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def choose_format(accept_mimetypes, payload):
+    """
+    Pick the response mimetype from the client's Accept header
+
+    Args:
+        accept_mimetypes: werkzeug MIMEAccept of the request
+        payload: The payload to send, used to check Arrow eligibility
+    """
+    offered = [JSON_MIMETYPE]
+    if is_installed('msgpack'):
+        offered.append(MSGPACK_MIMETYPE)
+    if is_installed('pyarrow') and tabular_key(payload) is not None:
+        offered.append(ARROW_MIMETYPE)
+
+    # JSON wins ties, including */* and a missing Accept header
+    best = accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+    if best != JSON_MIMETYPE and accept_mimetypes[best] <= accept_mimetypes[JSON_MIMETYPE]:
+        return JSON_MIMETYPE
+    return best
+
+
+ENCODERS = {
+    JSON_MIMETYPE: dumps_json,
+    MSGPACK_MIMETYPE: dumps_msgpack,
+    ARROW_MIMETYPE: dumps_arrow,
+}
+
+
+def api_response(payload, status=200):
+    """
+    Build a response for the current request in the negotiated format
+
+    Drop-in replacement for jsonify() in the API routes.
+    """
+    mimetype = choose_format(request.accept_mimetypes, payload)
+    response = Response(ENCODERS[mimetype](payload), status=status, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+
+def compress(body, accept_encodings):
+    """
+    Compress a body with the best encoding the client accepts
+
+    Returns:
+        (content_encoding, compressed_body), or (None, body) if no
+        supported encoding is acceptable
+    """
+    if accept_encodings['br'] and is_installed('brotli'):
+        return 'br', optional_module('brotli').compress(body, quality=BROTLI_QUALITY)
+    if accept_encodings['gzip']:
+        return 'gzip', gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return None, body
+
+
+def install_response_encoding(app, min_size=MIN_COMPRESS_SIZE):
+    """
+    Register response compression on a Flask app
+
+    Args:
+        app: Flask application
+        min_size: Smallest body size in bytes that gets compressed
+    """
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.status_code < 200
+                or response.status_code in (204, 304)):
+            return response
+
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+
+        encoding, compressed = compress(body, request.accept_encodings)
+        response.vary.add('Accept-Encoding')
+        if encoding is None or len(compressed) >= len(body):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return app
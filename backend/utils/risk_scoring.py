@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Background job that scores the whole dataset with the prediction model
+
+The analytics endpoints used to bucket rows by raw fire_weather_index
+thresholds, which does not match what the model predicts. This job runs the
+current model over every loaded row in vectorized chunks and attaches the
+probability and risk class as dataset columns, so the distribution, map and
+filtered endpoints can use model risk without scoring per request.
+
+Listeners are told about every completed run, with the previous risk classes,
+so live views can be sent what changed rather than the whole dataset.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+
+from simple_predict import RISK_LEVELS
+
+logger = logging.getLogger(__name__)
+
+# Most points sent in one risk delta; clients refetch when it is truncated
+MAX_DELTA_POINTS = 500
+
+
+class RiskScoringJob:
+    """
+    Keeps model risk columns on the data service in sync with the model
+
+    The job remembers the (model_version, data_version) pair it last scored
+    and re-runs in a daemon thread whenever either side changes.
+    """
+
+    def __init__(self, data_service, predictor, chunk_size=50000, poll_interval=30.0):
+        self.data_service = data_service
+        self.predictor = predictor
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+
+        self.scored_versions = None
+        self.last_duration = None
+        self.last_error = None
+        self.runs = 0
+        self.listeners = []
+        self._last_scored = None
+
+        self._run_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_listener(self, listener):
+        """
+        Call listener(update) after each run that attached new scores
+
+        The update dict holds 'previous' and 'current' scoring states, each
+        with model_version, data_version and a uint8 level_index array
+        (previous is None after the first run).
+        """
+        self.listeners.append(listener)
+
+    def current_versions(self):
+        """(model_version, data_version) the dataset should be scored with"""
+        return self.predictor.model_version, self.data_service.data_version
+
+    def is_current(self):
+        """Whether the attached scores match the current model and data"""
+        return (self.scored_versions == self.current_versions()
+                and self.data_service.has_model_risk())
+
+    def run(self, force=False):
+        """
+        Score the whole dataset once, in chunks
+
+        Args:
+            force: Rescore even if the attached scores are current
+
+        Returns:
+            True if the attached scores are current afterwards
+        """
+        with self._run_lock:
+            # Another caller may have finished a run while we waited
+            if not force and self.is_current():
+                return True
+
+            model_version, data_version = self.current_versions()
+            df = self.data_service.df
+            if df is None:
+                return False
+
+            start = time.perf_counter()
+            features = self.predictor.model_data['features']
+            available = [f for f in features if f in df.columns]
+            n_rows = len(df)
+
+            probabilities = np.empty(n_rows, dtype=np.float64)
+            for begin in range(0, n_rows, self.chunk_size):
+                end = min(begin + self.chunk_size, n_rows)
+                chunk = df.iloc[begin:end]
+                columns = {f: chunk[f].to_numpy(dtype=np.float64, na_value=np.nan) for f in available}
+                probabilities[begin:end] = self.predictor.predict_proba_columns(columns)
+
+            level_index = self.predictor.get_risk_levels(probabilities)
+            risk_levels = np.asarray(RISK_LEVELS, dtype=object)[level_index]
+
+            attached = self.data_service.attach_risk_scores(
+                probabilities, risk_levels, model_version, data_version
+            )
+            self.last_duration = time.perf_counter() - start
+            if not attached:
+                logger.info("Dataset changed while scoring, will rescore")
+                return False
+
+            self.scored_versions = (model_version, data_version)
+            self.runs += 1
+            logger.info(
+                f"✅ Scored {n_rows} rows with model {model_version} "
+                f"in {self.last_duration:.2f}s"
+            )
+
+            previous = self._last_scored
+            self._last_scored = {
+                'model_version': model_version,
+                'data_version': data_version,
+                'level_index': level_index.astype(np.uint8)
+            }
+            self._notify({'previous': previous, 'current': self._last_scored})
+            return True
+
+    def _notify(self, update):
+        for listener in self.listeners:
+            try:
+                listener(update)
+            except Exception as e:
+                logger.error(f"Risk scoring listener failed: {str(e)}")
+
+    def refresh_if_stale(self):
+        """Wake the background thread if the scores are out of date"""
+        if not self.is_current():
+            self._wake.set()
+
+    def start(self):
+        """Start the background thread that keeps the scores current"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="risk-scoring", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if not self.is_current():
+                try:
+                    self.run()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.error(f"Risk scoring job failed: {str(e)}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def get_status(self):
+        """Summary of the job state for status endpoints"""
+        model_version, data_version = self.current_versions()
+        return {
+            'current': self.is_current(),
+            'model_version': model_version,
+            'data_version': data_version,
+            'scored_versions': list(self.scored_versions) if self.scored_versions else None,
+            'last_duration_seconds': self.last_duration,
+            'runs': self.runs,
+            'last_error': self.last_error
+        }
+
+
+def build_risk_delta(data_service, update, max_points=MAX_DELTA_POINTS):
+    """
+    Describe what a scoring run changed, for pushing to live views
+
+    When the rows scored last time are still in place, the delta lists the
+    points whose risk class changed and the newly appended points, up to
+    max_points in total. Otherwise it sets 'reload' and clients refetch.
+
+    Args:
+        data_service: WildfireDataService the scores are attached to
+        update: Update dict passed to RiskScoringJob listeners
+        max_points: Cap on changed plus new points
+    """
+    previous, current = update['previous'], update['current']
+    n_rows = len(current['level_index'])
+    delta = {
+        'model_version': current['model_version'],
+        'data_version': current['data_version'],
+        'rows': n_rows,
+        'risk_distribution': data_service.get_risk_distribution()
+    }
+
+    if (previous is None
+            or data_service.data_version != current['data_version']
+            or len(previous['level_index']) > n_rows
+            or not data_service.rows_unchanged_since(previous['data_version'])):
+        delta.update(reason='initial' if previous is None else 'reload', reload=True)
+        return delta
+
+    old_rows = len(previous['level_index'])
+    changed = np.flatnonzero(previous['level_index'] != current['level_index'][:old_rows])
+    new = np.arange(old_rows, n_rows)
+    changed_ids = changed[:max_points]
+    new_ids = new[:max_points - len(changed_ids)]
+    delta.update(
+        reason='append' if len(new) else 'model',
+        reload=False,
+        changed_count=int(len(changed)),
+        new_count=int(len(new)),
+        truncated=bool(len(changed) + len(new) > max_points),
+        changed_points=[
+            {'id': point['id'], 'risk_level': point.get('risk_level'),
+             'fire_probability': point.get('fire_probability')}
+            for point in data_service.get_points(changed_ids)
+        ],
+        new_points=data_service.get_points(new_ids)
+    )
+    return delta
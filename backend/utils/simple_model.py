@@ -2,11 +2,19 @@
 """
 Simple wildfire model training script
 This version uses minimal dependencies to avoid import issues
+
+Configuration (environment):
+    PYROCAST_DERIVED_FEATURES    comma-separated derived features (see
+                                 features.py) to train on as well
+    PYROCAST_CONTEXT_RADIUS_KM   radius of the historical fire context
+                                 features (see neighbors.py); unset trains
+                                 without them
 """
 
 import os
 import sys
 import csv
+import math
 import json
 from pathlib import Path
 
@@ -94,38 +102,127 @@ def normalize_features(data, feature_names):
     
     return normalized_data, means, stds
 
-def main():
-    print("🚀 Starting simple wildfire model training...")
+KEY_FEATURES = [
+    'temp_mean', 'humidity_min', 'wind_speed_max', 
+    'pressure_mean', 'fire_weather_index'
+]
+
+def add_derived_features(records, derived_features, cache_dir=None):
+    """
+    Compute derived features (see features.py) and add them to each record
     
-    # Define paths
-    data_dir = Path("../data/raw")
-    model_dir = Path("..")
+    Args:
+        records: List of dicts holding the inputs of the derived features
+        derived_features: Names of the derived features
+        cache_dir: Directory caching the computed arrays between runs;
+            defaults to PYROCAST_FEATURE_CACHE_DIR
+    """
+    import numpy as np
+    from features import FeatureCache, FeaturePipeline
     
-    # Load data
-    data_file = data_dir / "wildfire_dataset.csv"
-    if not data_file.exists():
-        print(f"❌ Data file not found: {data_file}")
-        return
+    cache = FeatureCache(cache_dir) if cache_dir else FeatureCache.from_env()
+    pipeline = FeaturePipeline(cache=cache)
+    inputs = pipeline.required_inputs(derived_features)
+    columns = {name: np.array([row[name] for row in records], dtype=np.float64) for name in inputs}
+    computed = pipeline.compute(columns, derived_features)
+    for name in derived_features:
+        for row, value in zip(records, computed[name].tolist()):
+            row[name] = value
+    print(f"🔬 Derived features: {', '.join(derived_features)} "
+          f"({cache.hits} cached, {cache.misses} computed)")
+
+def add_context_features(records, radius_km, index_path, n_train=None):
+    """
+    Add historical fire context features (see neighbors.py) to each record
     
-    print(f"📊 Loading data from {data_file}...")
-    data = load_csv_data(data_file)
-    print(f"✅ Loaded {len(data)} records")
+    Only the first n_train records (the training split) are indexed, so
+    held-out labels never leak into the features. Training records are
+    queried without counting themselves; the rest are queried like
+    predictions. The index is saved to index_path for the trained model,
+    so its predictions see the same history.
     
-    # Select key features for simple model
-    key_features = [
-        'temp_mean', 'humidity_min', 'wind_speed_max', 
-        'pressure_mean', 'fire_weather_index'
-    ]
+    Args:
+        records: List of dicts with lat, lon, occured and optionally frp
+        radius_km: Search radius
+        index_path: File to save the index to
+        n_train: Number of leading training records; defaults to all
+    
+    Returns:
+        Names of the context features added
+    """
+    import numpy as np
+    from neighbors import CONTEXT_FEATURES, NeighborIndex
+    
+    n_train = len(records) if n_train is None else n_train
+    train, held_out = records[:n_train], records[n_train:]
+    frp = [row['frp'] if isinstance(row.get('frp'), (int, float)) else 0.0 for row in train]
+    index = NeighborIndex([row['lat'] for row in train], [row['lon'] for row in train],
+                          [row['occured'] for row in train], frp, radius_km)
+    nearby = index.query_self()
+    if held_out:
+        queried = index.query([row['lat'] for row in held_out], [row['lon'] for row in held_out])
+        nearby = {name: np.concatenate([nearby[name], queried[name]]) for name in CONTEXT_FEATURES}
+    for name in CONTEXT_FEATURES:
+        for row, value in zip(records, nearby[name].tolist()):
+            row[name] = value
+    
+    path = Path(index_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    index.save(path)
+    print(f"📍 Context features within {radius_km:g} km; neighbor index saved to {path}")
+    return list(CONTEXT_FEATURES)
+
+def train_model(data, key_features=KEY_FEATURES, learning_rate=0.1, epochs=200, derived_features=(),
+                context_radius_km=None, context_index_path=None):
+    """
+    Filter, normalize, split and train on a list of records
+    
+    Args:
+        data: List of dicts with the key features and an 'occured' label
+        key_features: Feature names used by the model
+        learning_rate: Gradient step size
+        epochs: Passes over the training set
+        derived_features: Derived features (see features.py) to train on as
+            well; their inputs are added to the key features
+        context_radius_km: When set, also train on historical fire context
+            within this radius of each record (needs lat/lon)
+        context_index_path: Where to save the model's neighbor index, in
+            the directory the model JSON will be saved to; required with
+            context_radius_km
+        
+    Returns:
+        Model dict in the simple_wildfire_model.json format
+    """
+    if context_radius_km and context_index_path is None:
+        raise ValueError("Training with context features needs a context_index_path")
+    derived_features = list(derived_features)
+    if derived_features:
+        from features import feature_pipeline
+        key_features = list(key_features) + [
+            name for name in feature_pipeline.required_inputs(derived_features) if name not in key_features
+        ]
+    input_features = list(key_features)
+    location = ['lat', 'lon'] if context_radius_km else []
     
     # Filter data to only include records with all required features
     filtered_data = []
     for row in data:
-        if all(feature in row and isinstance(row[feature], (int, float)) for feature in key_features):
-            if 'occured' in row:
-                filtered_data.append(row)
+        if all(feature in row and isinstance(row[feature], (int, float)) for feature in input_features + location):
+            if 'occured' in row and all(math.isfinite(row[feature]) for feature in location):
+                filtered_data.append(dict(row) if derived_features or location else row)
     
     print(f"📋 Filtered to {len(filtered_data)} complete records")
     
+    if derived_features:
+        add_derived_features(filtered_data, derived_features)
+        key_features = input_features + derived_features
+    context_features = []
+    if context_radius_km:
+        # The train/test split below takes the first 80% of rows
+        context_features = add_context_features(filtered_data, context_radius_km, context_index_path,
+                                                n_train=int(0.8 * len(filtered_data)))
+        key_features = key_features + context_features
+    
     # Normalize features
     print("🔧 Normalizing features...")
     normalized_data, means, stds = normalize_features(filtered_data, key_features)
@@ -148,7 +245,7 @@ def main():
     
     # Train model
     print("🧠 Training logistic regression model...")
-    weights = simple_logistic_regression(X_train, y_train, learning_rate=0.1, epochs=200)
+    weights = simple_logistic_regression(X_train, y_train, learning_rate=learning_rate, epochs=epochs)
     
     # Evaluate model
     print("📊 Evaluating model...")
@@ -168,18 +265,51 @@ def main():
     print(f"📈 Test Accuracy: {accuracy:.3f}")
     print(f"📈 Average Probability: {avg_prob:.3f}")
     
-    # Save model
     model_data = {
         'weights': weights,
-        'features': key_features,
+        'features': input_features,
         'means': means,
         'stds': stds,
         'accuracy': accuracy,
         'model_type': 'SimpleLogisticRegression'
     }
+    if derived_features:
+        model_data['derived_features'] = derived_features
+    if context_features:
+        model_data['context_features'] = context_features
+        model_data['context_radius_km'] = float(context_radius_km)
+        # Resolved against the model file's directory when serving
+        model_data['context_index'] = Path(context_index_path).name
+    return model_data
+
+def main():
+    print("🚀 Starting simple wildfire model training...")
     
-    # Save as JSON (more reliable than pickle)
+    # Define paths
+    data_dir = Path("../data/raw")
+    model_dir = Path("..")
+    
+    # Load data
+    data_file = data_dir / "wildfire_dataset.csv"
+    if not data_file.exists():
+        print(f"❌ Data file not found: {data_file}")
+        return
+    
+    print(f"📊 Loading data from {data_file}...")
+    data = load_csv_data(data_file)
+    print(f"✅ Loaded {len(data)} records")
+    
+    derived_features = [name for name in os.environ.get('PYROCAST_DERIVED_FEATURES', '').split(',') if name]
+    context_radius_km = float(os.environ.get('PYROCAST_CONTEXT_RADIUS_KM') or 0) or None
     model_file = model_dir / "simple_wildfire_model.json"
+    model_data = train_model(data, derived_features=derived_features, context_radius_km=context_radius_km,
+                             context_index_path=model_file.with_suffix('.neighbors.npz'))
+    weights = model_data['weights']
+    key_features = (model_data['features'] + model_data.get('derived_features', [])
+                    + model_data.get('context_features', []))
+    means, stds = model_data['means'], model_data['stds']
+    
+    # Save as JSON (more reliable than pickle)
     with open(model_file, 'w') as f:
         json.dump(model_data, f, indent=2)
     
@@ -192,6 +322,18 @@ def main():
         {"temp_mean": 15, "humidity_min": 70, "wind_speed_max": 5, "pressure_mean": 1015, "fire_weather_index": 5},
         {"temp_mean": 28, "humidity_min": 40, "wind_speed_max": 15, "pressure_mean": 1008, "fire_weather_index": 15}
     ]
+    for test_case in test_cases:
+        # Inputs the cases do not set (e.g. temp_range for temp_max_approx)
+        # take their training mean
+        test_case.update({name: means[name] for name in model_data['features'] if name not in test_case})
+    if derived_features:
+        from features import feature_pipeline
+        for test_case in test_cases:
+            computed = feature_pipeline.compute({name: [value] for name, value in test_case.items()}, derived_features)
+            test_case.update({name: values[0] for name, values in computed.items()})
+    for test_case in test_cases:
+        # No location given: no historical context
+        test_case.update({name: 0.0 for name in model_data.get('context_features', [])})
     
     for i, test_case in enumerate(test_cases, 1):
         # Normalize test features
@@ -1,8 +1,57 @@
 import json
+import hashlib
 import logging
+import time
+from bisect import bisect_right
 from typing import Dict, Any, Optional
 from pathlib import Path
 
+from metrics import DUMMY_MODEL_FALLBACKS, MODEL_LOAD_DURATION, PREDICTIONS
+from prediction_cache import PredictionCache
+
+# Probability cut points between consecutive risk levels
+RISK_THRESHOLDS = (0.25, 0.5, 0.75)
+RISK_LEVELS = ('Low', 'Medium', 'High', 'Extreme')
+
+# Alternative request field names accepted for each model feature
+FEATURE_ALIASES = {
+    'temp_mean': ['temperature', 'temp'],
+    'humidity_min': ['humidity'],
+    'wind_speed_max': ['wind_speed', 'wind'],
+    'pressure_mean': ['pressure'],
+    'fire_weather_index': ['fwi', 'fire_weather_index'],
+    'lat': ['latitude'],
+    'lon': ['longitude', 'lng']
+}
+
+# Values used when a feature is missing from the input
+FEATURE_DEFAULTS = {
+    'temp_mean': 20.0,
+    'humidity_min': 50.0,
+    'wind_speed_max': 10.0,
+    'pressure_mean': 1013.25,
+    'fire_weather_index': 10.0,
+    # Unknown location: no historical fire context
+    'lat': float('nan'),
+    'lon': float('nan')
+}
+
+# Physically plausible input ranges; values outside are rejected in batches
+FEATURE_RANGES = {
+    'temp_mean': (-90.0, 70.0),
+    'humidity_min': (0.0, 100.0),
+    'wind_speed_max': (0.0, None),
+    'pressure_mean': (800.0, 1100.0),
+    'lat': (-90.0, 90.0),
+    'lon': (-180.0, 180.0)
+}
+
+# Request fields locating a prediction, used by models with context features
+LOCATION_FEATURES = ('lat', 'lon')
+
+# Model types evaluated by the flat-array tree engine (tree_ensemble.py)
+TREE_MODEL_TYPES = ('GradientBoostedTrees',)
+
 class SimpleWildfirePredictionService:
     """
     Pyro Cast AI prediction service using the trained logistic regression model
@@ -11,6 +60,11 @@ class SimpleWildfirePredictionService:
     def __init__(self, model_path="../pyro_cast_ai_model.json"):
         self.model_data = None
         self.model_path = model_path
+        self.model_version = None
+        self._batch_schema = None
+        self._tree_engine = None
+        self._preprocessor = None
+        self.cache = PredictionCache.from_env(name=str(model_path))
         
         # Load model on initialization
         self.load_model()
@@ -19,11 +73,13 @@ class SimpleWildfirePredictionService:
         """
         Load trained model from JSON file
         """
+        start = time.perf_counter()
         try:
             model_file = Path(self.model_path)
             if model_file.exists():
                 with open(model_file, 'r') as f:
                     self.model_data = json.load(f)
+                self._tree_engine = self._load_engine(self.model_data)
                 logging.info(f"✅ Model loaded successfully: {self.model_data['model_type']}")
                 logging.info(f"Model accuracy: {self.model_data['accuracy']:.3f}")
             else:
@@ -32,7 +88,37 @@ class SimpleWildfirePredictionService:
                 
         except Exception as e:
             logging.error(f"Error loading model: {str(e)}")
+            self._tree_engine = None
             self._create_dummy_model()
+        
+        self.model_version = self._compute_model_version()
+        self._batch_schema = None
+        self._preprocessor = None
+        self.cache.clear()
+        result = 'dummy' if self.model_data.get('model_type') == 'DummyModel' else 'loaded'
+        MODEL_LOAD_DURATION.observe(time.perf_counter() - start, result)
+    
+    def _load_engine(self, model_data: Dict[str, Any]):
+        """
+        Inference engine selected by the model's model_type
+        
+        Returns:
+            TreeEnsemble for tree models, None for logistic regression
+        """
+        if model_data.get('model_type') not in TREE_MODEL_TYPES:
+            return None
+        from tree_ensemble import TreeEnsemble
+        
+        engine = TreeEnsemble.from_model_data(model_data)
+        logging.info(f"🌲 Tree engine ready: {engine.n_trees} trees, depth {engine.max_depth}")
+        return engine
+    
+    def _compute_model_version(self) -> str:
+        """
+        Short content hash of the loaded model, used to detect model changes
+        """
+        payload = json.dumps(self.model_data, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
     
     def _create_dummy_model(self):
         """
@@ -54,21 +140,88 @@ class SimpleWildfirePredictionService:
             features = self.model_data['features']
             return [float(input_data.get(feature, 0)) for feature in features]
         
-        means = self.model_data['means']
-        stds = self.model_data['stds']
-        features = self.model_data['features']
+        import numpy as np
         
-        normalized_features = []
-        for feature in features:
-            # Handle different input field names
-            value = self._get_feature_value(input_data, feature)
-            if feature in means and feature in stds:
-                normalized_val = (value - means[feature]) / stds[feature]
-            else:
-                normalized_val = value
-            normalized_features.append(normalized_val)
+        # Handle different input field names
+        values = np.array(
+            [[self._get_feature_value(input_data, feature) for feature in self.model_data['features']]]
+        )
+        location = [[self._get_feature_value(input_data, feature)] for feature in LOCATION_FEATURES]
+        return self.preprocessor.transform_inplace(self._with_derived(values, location))[0].tolist()
+    
+    @property
+    def model_inputs(self) -> list:
+        """
+        Columns the model weights or trees refer to: the input features
+        followed by any derived features (see features.py) and location
+        context features (see neighbors.py)
+        """
+        return (self.model_data['features'] + self.model_data.get('derived_features', [])
+                + self.model_data.get('context_features', []))
+    
+    @property
+    def input_features(self) -> list:
+        """
+        Request fields the model reads: its features, plus lat/lon for
+        models with context features
+        """
+        if self.model_data.get('context_features'):
+            return self.model_data['features'] + list(LOCATION_FEATURES)
+        return self.model_data['features']
+    
+    def _with_derived(self, matrix, location=None):
+        """
+        Append the model's derived and location context feature columns to
+        a raw input matrix
+        
+        Args:
+            matrix: Raw values of the model features, one row per input
+            location: (lat, lon) sequences for models with context
+                features; missing or NaN means no historical context
+        """
+        derived = self.model_data.get('derived_features')
+        context = self.model_data.get('context_features')
+        if not derived and not context:
+            return matrix
+        import numpy as np
         
-        return normalized_features
+        extra = []
+        if derived:
+            from features import feature_pipeline
+            columns = {feature: matrix[:, j] for j, feature in enumerate(self.model_data['features'])}
+            computed = feature_pipeline.compute(columns, derived)
+            extra.extend(computed[name] for name in derived)
+        if context:
+            lat, lon = location if location is not None else (np.full(len(matrix), np.nan),) * 2
+            nearby = self.neighbor_index().query(lat, lon)
+            extra.extend(nearby[name] for name in context)
+        return np.column_stack([matrix] + extra)
+    
+    def neighbor_index(self):
+        """
+        Historical fire index of a model with context features: the one
+        saved with the model ('context_index', next to the model file), or
+        the shared PYROCAST_NEIGHBOR_INDEX for models without one
+        """
+        from neighbors import get_neighbor_index
+        
+        path = self.model_data.get('context_index')
+        if path is not None:
+            path = Path(self.model_path).parent / path
+        return get_neighbor_index(self.model_data['context_radius_km'], path)
+    
+    @property
+    def preprocessor(self):
+        """
+        Array-only normalizer built from the model's means/stds on first
+        use; None for models without them
+        """
+        if self._preprocessor is None and 'means' in self.model_data:
+            from preprocessing import PyroCastAIPreprocessor
+            self._preprocessor = PyroCastAIPreprocessor.from_statistics(
+                self.model_inputs, self.model_data['means'], self.model_data['stds']
+            )
+        return self._preprocessor
     
     def _get_feature_value(self, input_data: Dict[str, Any], feature: str) -> float:
         """
@@ -79,29 +232,12 @@ class SimpleWildfirePredictionService:
             return float(input_data[feature])
         
         # Handle common field name variations
-        field_mappings = {
-            'temp_mean': ['temperature', 'temp'],
-            'humidity_min': ['humidity'],
-            'wind_speed_max': ['wind_speed', 'wind'],
-            'pressure_mean': ['pressure'],
-            'fire_weather_index': ['fwi', 'fire_weather_index']
-        }
-        
-        if feature in field_mappings:
-            for alt_name in field_mappings[feature]:
-                if alt_name in input_data:
-                    return float(input_data[alt_name])
+        for alt_name in FEATURE_ALIASES.get(feature, []):
+            if alt_name in input_data:
+                return float(input_data[alt_name])
         
         # Default values if not found
-        defaults = {
-            'temp_mean': 20.0,
-            'humidity_min': 50.0,
-            'wind_speed_max': 10.0,
-            'pressure_mean': 1013.25,
-            'fire_weather_index': 10.0
-        }
-        
-        return defaults.get(feature, 0.0)
+        return FEATURE_DEFAULTS.get(feature, 0.0)
     
     def _predict_with_weights(self, features: list, weights: list) -> tuple:
         """
@@ -127,18 +263,72 @@ class SimpleWildfirePredictionService:
     def predict(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Make fire risk prediction with Pyro Cast AI
+        
+        Results are served from the prediction cache when the same model
+        has already scored an input with the same quantized features. With
+        the cache enabled the quantized features are what gets scored, so
+        every input in a bucket gets the same answer whichever came first;
+        the result lists them as 'scored_inputs'.
+        """
+        entry = self._cache_entry(input_data)
+        if entry is None:
+            return self._predict_uncached(input_data)
+        
+        key, quantized_input = entry
+        cached = self.cache.get(key)
+        if cached is not None:
+            if cached["model_used"] == "DummyModel":
+                DUMMY_MODEL_FALLBACKS.inc()
+            PREDICTIONS.inc(cached["fire_risk"], cached["model_used"])
+            return cached
+        
+        result = self._predict_uncached(quantized_input)
+        if result.get("input_processed"):
+            result["scored_inputs"] = {feature: quantized_input[feature] for feature in self.input_features}
+            self.cache.put(key, result)
+        return result
+    
+    def _cache_entry(self, input_data: Dict[str, Any]) -> Optional[tuple]:
+        """
+        (cache key, quantized input) for an input, or None if it cannot be
+        cached
+        """
+        if not self.cache.enabled or not isinstance(input_data, dict):
+            return None
+        features = self.input_features
+        try:
+            values = [self._get_feature_value(input_data, feature) for feature in features]
+            key = self.cache.make_key(self.model_version, features, values)
+        except (TypeError, ValueError, OverflowError):
+            # Unreadable or non-finite values; predict() reports the error
+            return None
+        # Canonical names take precedence over aliases when resolving
+        quantized = dict(zip(features, self.cache.quantize(features, values)))
+        return key, {**input_data, **quantized}
+    
+    def _predict_uncached(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Make fire risk prediction without consulting the cache
         """
         try:
             # Handle dummy model
             if not self.model_data or self.model_data.get('model_type') == 'DummyModel':
                 return self._dummy_predict(input_data)
             
-            # Normalize input features
-            normalized_features = self._normalize_features(input_data)
-            
-            # Make prediction using trained weights
-            weights = self.model_data['weights']
-            prediction, probability = self._predict_with_weights(normalized_features, weights)
+            if self._tree_engine is not None:
+                # Trees split on raw values
+                probability = float(self.predict_proba_columns({
+                    feature: [self._get_feature_value(input_data, feature)]
+                    for feature in self.input_features
+                })[0])
+                prediction = 1 if probability > 0.5 else 0
+            else:
+                # Normalize input features
+                normalized_features = self._normalize_features(input_data)
+                
+                # Make prediction using trained weights
+                weights = self.model_data['weights']
+                prediction, probability = self._predict_with_weights(normalized_features, weights)
             
             # Determine risk level
             risk_level = self._get_risk_level(probability)
@@ -152,6 +342,7 @@ class SimpleWildfirePredictionService:
                 "input_processed": True
             }
             
+            PREDICTIONS.inc(risk_level, result["model_used"])
             return result
             
         except Exception as e:
@@ -166,15 +357,92 @@ class SimpleWildfirePredictionService:
                 "input_processed": False
             }
     
+    @property
+    def batch_schema(self):
+        """
+        Input validation schema for the loaded model, compiled on first use
+        """
+        if self._batch_schema is None:
+            from validation import BatchSchema
+            self._batch_schema = BatchSchema(
+                self.input_features, FEATURE_ALIASES, FEATURE_DEFAULTS, FEATURE_RANGES
+            )
+        return self._batch_schema
+    
+    def validate_batch(self, records: list):
+        """
+        Validate a batch of input records columnwise
+        
+        Returns:
+            validation.ValidationResult with converted columns and per-row
+            error codes
+        """
+        return self.batch_schema.validate(records)
+    
+    def predict_batch(self, records: list, validated=None) -> list:
+        """
+        Predict many records with one vectorized model evaluation
+        
+        Returns one result per record, shaped like predict() plus an
+        'index'. Records that fail validation get an error result with an
+        'error_code'. Pass the result of validate_batch() as validated to
+        skip validating again.
+        """
+        if validated is None:
+            validated = self.validate_batch(records)
+        probabilities = self.predict_proba_columns(validated.columns)
+        return self._format_batch(probabilities, validated.errors())
+    
+    def _format_batch(self, probabilities, errors: Dict[int, Dict[str, str]]) -> list:
+        """
+        Build predict()-shaped result dicts for a vector of probabilities
+        """
+        import numpy as np
+        
+        model_used = self.model_data.get('model_type', 'SimpleLogisticRegression')
+        level_index = self.get_risk_levels(probabilities)
+        
+        results = []
+        for i, (probability, level) in enumerate(zip(probabilities.tolist(), level_index.tolist())):
+            if i in errors:
+                results.append({
+                    'index': i,
+                    **errors[i],
+                    'fire_risk': 'Unknown',
+                    'probability': None
+                })
+                continue
+            results.append({
+                "fire_risk": RISK_LEVELS[level],
+                "probability": probability,
+                "prediction": 1 if probability > 0.5 else 0,
+                "confidence": abs(probability - 0.5) + 0.5,
+                "model_used": model_used,
+                "input_processed": True,
+                "index": i
+            })
+        
+        valid = np.ones(len(level_index), dtype=bool)
+        valid[list(errors)] = False
+        counts = np.bincount(level_index[valid], minlength=len(RISK_LEVELS))
+        for level, count in zip(RISK_LEVELS, counts.tolist()):
+            if count:
+                PREDICTIONS.inc(level, model_used, amount=count)
+        if model_used == 'DummyModel' and valid.any():
+            DUMMY_MODEL_FALLBACKS.inc(amount=int(valid.sum()))
+        
+        return results
+    
     def _dummy_predict(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Dummy prediction for testing
         """
-        # Simple rule-based prediction
-        temp = input_data.get('temperature', input_data.get('temp_mean', 20))
-        humidity = input_data.get('humidity', input_data.get('humidity_min', 50))
-        wind = input_data.get('wind_speed', input_data.get('wind_speed_max', 10))
-        fwi = input_data.get('fire_weather_index', 10)
+        # Simple rule-based prediction, on the same resolved values as the
+        # vectorized path so cached results do not depend on field names
+        temp = self._get_feature_value(input_data, 'temp_mean')
+        humidity = self._get_feature_value(input_data, 'humidity_min')
+        wind = self._get_feature_value(input_data, 'wind_speed_max')
+        fwi = self._get_feature_value(input_data, 'fire_weather_index')
         
         # Simple risk calculation
         risk_score = 0.0
@@ -203,6 +471,9 @@ class SimpleWildfirePredictionService:
         prediction = 1 if probability > 0.5 else 0
         risk_level = self._get_risk_level(probability)
         
+        DUMMY_MODEL_FALLBACKS.inc()
+        PREDICTIONS.inc(risk_level, "DummyModel")
+        
         return {
             "fire_risk": risk_level,
             "probability": probability,
@@ -216,14 +487,142 @@ class SimpleWildfirePredictionService:
         """
         Convert probability to risk level
         """
-        if probability < 0.25:
-            return "Low"
-        elif probability < 0.5:
-            return "Medium"
-        elif probability < 0.75:
-            return "High"
-        else:
-            return "Extreme"
+        return RISK_LEVELS[bisect_right(RISK_THRESHOLDS, probability)]
+    
+    def predict_proba_columns(self, columns: Dict[str, Any]):
+        """
+        Vectorized fire probability for many rows at once
+        
+        Args:
+            columns: Mapping of model feature name to a 1-D array of raw
+                (un-normalized) values. Missing features and NaN entries
+                fall back to FEATURE_DEFAULTS, as in the single-row path.
+                Models with context features also read 'lat' and 'lon'.
+        
+        Returns:
+            numpy float64 array of probabilities
+        """
+        import numpy as np
+        
+        features = self.model_data['features']
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        matrix = np.empty((n_rows, len(features)), dtype=np.float64)
+        for j, feature in enumerate(features):
+            default = FEATURE_DEFAULTS.get(feature, 0.0)
+            if feature in columns:
+                values = np.asarray(columns[feature], dtype=np.float64)
+                matrix[:, j] = np.where(np.isnan(values), default, values)
+            else:
+                matrix[:, j] = default
+        
+        if self.model_data.get('model_type') == 'DummyModel':
+            return self._dummy_predict_matrix(matrix, features)
+        location = None
+        if self.model_data.get('context_features'):
+            location = [columns.get(feature, np.full(n_rows, np.nan)) for feature in LOCATION_FEATURES]
+        matrix = self._with_derived(matrix, location)
+        if self._tree_engine is not None:
+            return self._tree_engine.predict_proba(matrix)
+        
+        if self.preprocessor is not None:
+            self.preprocessor.transform_inplace(matrix)
+        
+        weights = np.asarray(self.model_data['weights'], dtype=np.float64)
+        z = matrix @ weights[1:] + weights[0]
+        np.clip(z, -250, 250, out=z)
+        return 1.0 / (1.0 + np.exp(-z))
+    
+    def _dummy_predict_matrix(self, matrix, features: list):
+        """
+        Vectorized equivalent of _dummy_predict over a raw feature matrix
+        """
+        import numpy as np
+        
+        def column(feature):
+            return matrix[:, features.index(feature)] if feature in features \
+                else np.full(len(matrix), FEATURE_DEFAULTS[feature])
+        
+        temp = column('temp_mean')
+        humidity = column('humidity_min')
+        wind = column('wind_speed_max')
+        fwi = column('fire_weather_index')
+        
+        risk_score = np.select([temp > 30, temp > 25], [0.3, 0.2], 0.0)
+        risk_score += np.select([humidity < 30, humidity < 50], [0.3, 0.2], 0.0)
+        risk_score += np.select([wind > 20, wind > 15], [0.2, 0.1], 0.0)
+        risk_score += np.select([fwi > 15, fwi > 10], [0.3, 0.2], 0.0)
+        
+        return np.minimum(risk_score, 0.95)
+    
+    def resolve_feature(self, name: str) -> Optional[str]:
+        """
+        Model feature name for a request field name or alias, or None
+        """
+        for feature in self.input_features:
+            if name == feature or name in FEATURE_ALIASES.get(feature, []):
+                return feature
+        return None
+    
+    def feature_contributions(self, columns: Dict[str, Any]):
+        """
+        Per-feature terms of the logistic model, weight times normalized value
+        
+        Args:
+            columns: Mapping of model feature name to raw values
+        
+        Returns:
+            Dict of feature -> numpy array of contributions, plus
+            'intercept'; None for models without weights
+        """
+        import numpy as np
+        
+        if 'weights' not in self.model_data:
+            return None
+        weights = self.model_data['weights']
+        preprocessor = self.preprocessor
+        
+        raw = {
+            feature: np.asarray(columns.get(feature, FEATURE_DEFAULTS.get(feature, 0.0)), dtype=np.float64)
+            for feature in self.model_data['features']
+        }
+        derived = self.model_data.get('derived_features', [])
+        if derived:
+            from features import feature_pipeline
+            try:
+                raw.update(feature_pipeline.compute(raw, derived))
+            except ValueError:
+                # Inputs of different lengths (e.g. separate sweep axes)
+                # have no joint derived values; report the input terms only
+                pass
+        context = self.model_data.get('context_features', [])
+        if context and all(feature in columns for feature in LOCATION_FEATURES):
+            try:
+                nearby = self.neighbor_index().query(
+                    columns['lat'], columns['lon'])
+                raw.update((name, nearby[name]) for name in context)
+            except ValueError:
+                pass
+        
+        contributions = {'intercept': float(weights[0])}
+        for j, feature in enumerate(self.model_inputs):
+            if feature not in raw:
+                continue
+            values = raw[feature]
+            if preprocessor is not None:
+                values = (values - preprocessor.means[j]) / preprocessor.scale[j]
+            contributions[feature] = weights[j + 1] * values
+        return contributions
+    
+    def get_risk_levels(self, probabilities):
+        """
+        Vectorized equivalent of _get_risk_level
+        
+        Returns:
+            numpy array of indices into RISK_LEVELS
+        """
+        import numpy as np
+        
+        return np.searchsorted(RISK_THRESHOLDS, probabilities, side='right')
     
     def get_model_info(self) -> Dict[str, Any]:
         """
@@ -232,13 +631,24 @@ class SimpleWildfirePredictionService:
         if not self.model_data:
             return {"error": "No model loaded"}
         
-        return {
+        info = {
             "model_name": self.model_data.get('model_type', 'Unknown'),
             "features": self.model_data.get('features', []),
+            "derived_features": self.model_data.get('derived_features', []),
+            "context_features": self.model_data.get('context_features', []),
             "feature_count": len(self.model_data.get('features', [])),
             "accuracy": self.model_data.get('accuracy', 'Unknown'),
+            "model_version": self.model_version,
+            "cache": self.cache.get_stats(),
             "model_loaded": True
         }
+        if self._tree_engine is not None:
+            info["trees"] = {
+                "count": self._tree_engine.n_trees,
+                "nodes": self._tree_engine.n_nodes,
+                "max_depth": self._tree_engine.max_depth
+            }
+        return info
 
 # For backward compatibility, create an alias
 WildfirePredictionService = SimpleWildfirePredictionService
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Continuous risk rescoring for a fixed set of weather stations
+
+Observation records arrive from a source: a JSON-lines file being appended
+to (FileTailSource) or a simulated random-walk feed for testing
+(SimulatedSource). Each record names its station and carries any of the
+model's input fields (aliases accepted), plus optionally 'observed_at' in
+epoch seconds:
+
+    {"station_id": "KSAC", "observed_at": 1718000000.5, "temperature": 31.2,
+     "humidity": 18, "wind_speed": 22, "lat": 38.5, "lon": -121.5}
+
+StationMonitor runs on an asyncio loop. The consumer merges every record
+into its station's latest state and marks the station dirty, so a station
+that reports ten times between passes is scored once. A scoring pass takes
+all dirty stations, validates and scores them with one vectorized call in
+a worker thread (ingestion keeps running meanwhile), and compares each
+risk level with the station's previous one. Crossing a RISK_THRESHOLDS
+boundary emits an alert:
+
+    {"station_id": "KSAC", "previous_level": "Medium", "risk_level": "High",
+     "direction": "up", "probability": 0.61, "lag_seconds": 0.27, ...}
+
+Lag is measured from the oldest observation coalesced into the pass to
+the moment the alert is emitted, i.e. the worst case for that station.
+Alerts go to the logger, an optional callback and, when given, an
+EventBroker as 'alert' events.
+
+The app runs a monitor in the background when PYROCAST_STATION_FEED is
+set. Under serve.py every worker process runs its own monitor on the same
+feed, because each worker's stream clients subscribe to that worker's
+EventBroker. Alert logs, callbacks and alert counters are therefore
+repeated once per worker; for a single alert log run one worker, or run
+this module with --tail as a separate process. From the command line:
+    python utils/station_monitor.py --simulate [--stations 500] [--rate 2000] [--duration 30]
+    python utils/station_monitor.py --tail observations.jsonl
+
+Configuration (environment):
+    PYROCAST_STATION_FEED        JSON-lines file tailed by the app's monitor
+    PYROCAST_STATION_INTERVAL    seconds between scoring passes (0.25)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from metrics import counter, histogram
+from simple_predict import FEATURE_ALIASES, RISK_LEVELS
+
+logger = logging.getLogger(__name__)
+
+STATION_OBSERVATIONS = counter(
+    'pyrocast_station_observations_total', 'Station observations consumed', ('result',))
+STATION_ALERTS = counter(
+    'pyrocast_station_alerts_total', 'Risk level boundary crossings', ('direction',))
+STATION_ALERT_LAG = histogram(
+    'pyrocast_station_alert_lag_seconds', 'Time from observation to alert')
+STATION_PASS_DURATION = histogram(
+    'pyrocast_station_pass_duration_seconds', 'Duration of a station rescoring pass')
+
+# Request field alias -> model feature, so merged station states hold one
+# key per feature whichever name each observation used
+_CANONICAL = {alias: feature for feature, aliases in FEATURE_ALIASES.items() for alias in aliases}
+
+# Lags kept for the status percentiles
+LAG_HISTORY = 1000
+# Bytes read from a tailed file per step
+READ_SIZE = 1 << 16
+
+
+class FileTailSource:
+    """
+    Observations appended to a JSON-lines file
+
+    Starts at the end of the file (or its start with from_start) and
+    follows it across truncation and replacement. Malformed lines are
+    skipped.
+
+    Args:
+        path: File to follow
+        poll_interval: Seconds between checks when there is nothing new
+        from_start: Read the existing lines first
+    """
+
+    def __init__(self, path, poll_interval=0.2, from_start=False):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.from_start = from_start
+
+    async def __aiter__(self):
+        handle, inode, buffer = None, None, b''
+        from_start = self.from_start
+        while True:
+            if handle is None:
+                try:
+                    handle = open(self.path, 'rb')
+                except FileNotFoundError:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                inode = os.fstat(handle.fileno()).st_ino
+                if not from_start:
+                    handle.seek(0, os.SEEK_END)
+                buffer = b''
+
+            chunk = handle.read(READ_SIZE)
+            if chunk:
+                # A trailing partial line waits in the buffer for the rest
+                *lines, buffer = (buffer + chunk).split(b'\n')
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        STATION_OBSERVATIONS.inc('malformed')
+                # Let the scoring passes run between chunks of a long backlog
+                await asyncio.sleep(0)
+                continue
+
+            await asyncio.sleep(self.poll_interval)
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                continue
+            if stat.st_ino != inode or stat.st_size < handle.tell():
+                # Rotated or truncated: follow the new file from its start
+                handle.close()
+                handle, from_start = None, True
+
+
+class SimulatedSource:
+    """
+    Random-walk weather for a set of stations, for testing
+
+    Args:
+        n_stations: Number of stations
+        rate: Observations per second across all stations
+        limit: Stop after this many observations (None runs forever)
+        seed: Random seed
+    """
+
+    def __init__(self, n_stations=100, rate=500.0, limit=None, seed=42):
+        self.rate = rate
+        self.limit = limit
+        self._random = random.Random(seed)
+        self.stations = [
+            {
+                'station_id': f"ST{i:05d}",
+                'lat': self._random.uniform(32.5, 42.0),
+                'lon': self._random.uniform(-124.4, -114.1),
+                'temp_mean': self._random.gauss(25, 6),
+                'humidity_min': self._random.uniform(15, 80),
+                'wind_speed_max': self._random.uniform(2, 30),
+                'pressure_mean': self._random.gauss(1013, 5),
+                'fire_weather_index': self._random.uniform(2, 30)
+            }
+            for i in range(n_stations)
+        ]
+
+    def _step(self, state):
+        rand = self._random
+        state['temp_mean'] = min(max(state['temp_mean'] + rand.gauss(0, 0.5), -20.0), 50.0)
+        state['humidity_min'] = min(max(state['humidity_min'] + rand.gauss(0, 2.0), 1.0), 100.0)
+        state['wind_speed_max'] = max(state['wind_speed_max'] + rand.gauss(0, 1.5), 0.0)
+        state['pressure_mean'] = min(max(state['pressure_mean'] + rand.gauss(0, 0.3), 950.0), 1060.0)
+        state['fire_weather_index'] = max(state['fire_weather_index'] + rand.gauss(0, 1.0), 0.0)
+
+    async def __aiter__(self):
+        # Emitted in small bursts so high rates do not sleep per record
+        burst = max(1, int(self.rate / 100))
+        emitted = 0
+        start = time.monotonic()
+        while self.limit is None or emitted < self.limit:
+            for _ in range(burst):
+                state = self._random.choice(self.stations)
+                self._step(state)
+                yield dict(state, observed_at=time.time())
+                emitted += 1
+                if self.limit is not None and emitted >= self.limit:
+                    return
+            delay = start + emitted / self.rate - time.monotonic()
+            await asyncio.sleep(max(delay, 0.0))
+
+
+class StationMonitor:
+    """
+    Coalesces station observations and rescores changed stations
+
+    Args:
+        predictor: SimpleWildfirePredictionService
+        source: Async iterable of observation records
+        interval: Seconds between scoring passes
+        on_alert: Optional callable receiving each alert dict
+        broker: Optional EventBroker receiving 'alert' events
+    """
+
+    def __init__(self, predictor, source, interval=0.25, on_alert=None, broker=None):
+        self.predictor = predictor
+        self.source = source
+        self.interval = interval
+        self.on_alert = on_alert
+        self.broker = broker
+
+        # station_id -> merged latest record
+        self.stations = {}
+        # station_id -> oldest observed_at not yet scored
+        self._dirty = {}
+        # station_id -> (risk level index, probability) of the last pass
+        self.levels = {}
+        self.lags = deque(maxlen=LAG_HISTORY)
+        self.observations = 0
+        self.passes = 0
+        self.rescored = 0
+        self.alerts = 0
+        self.source_done = False
+        self._loop = None
+        self._thread = None
+
+    def observe(self, record):
+        """Merge one observation into its station's state"""
+        station_id = record.get('station_id') if isinstance(record, dict) else None
+        # Ids key the station state; anything but a string or integer (a
+        # list from a malformed record) is rejected rather than raised
+        if not isinstance(station_id, (str, int)) or isinstance(station_id, bool):
+            STATION_OBSERVATIONS.inc('invalid')
+            return
+        observed_at = record.get('observed_at')
+        if not isinstance(observed_at, (int, float)) or not math.isfinite(observed_at):
+            observed_at = time.time()
+        self.stations.setdefault(station_id, {}).update(
+            (_CANONICAL.get(key, key), value) for key, value in record.items()
+        )
+        # Keep the oldest unscored observation for the lag
+        self._dirty.setdefault(station_id, observed_at)
+        self.observations += 1
+        STATION_OBSERVATIONS.inc('accepted')
+
+    async def _consume(self):
+        try:
+            async for record in self.source:
+                self.observe(record)
+        finally:
+            self.source_done = True
+
+    async def run(self):
+        """Consume the source and rescore until the source ends"""
+        loop = asyncio.get_running_loop()
+        consumer = loop.create_task(self._consume())
+        try:
+            while not (self.source_done and not self._dirty):
+                await asyncio.sleep(self.interval)
+                if self._dirty:
+                    await self.rescore(loop)
+            await consumer
+        finally:
+            consumer.cancel()
+
+    async def rescore(self, loop=None):
+        """
+        Score every station changed since the last pass
+
+        Returns:
+            List of alerts emitted
+        """
+        loop = loop or asyncio.get_running_loop()
+        dirty, self._dirty = self._dirty, {}
+        station_ids = list(dirty)
+        # Snapshots, as the consumer keeps updating the live states
+        records = [dict(self.stations[station_id]) for station_id in station_ids]
+        start = time.perf_counter()
+        probabilities, valid = await loop.run_in_executor(None, self._score, records)
+        STATION_PASS_DURATION.observe(time.perf_counter() - start)
+        self.passes += 1
+        self.rescored += len(records)
+
+        levels = self.predictor.get_risk_levels(probabilities).tolist()
+        alerts = []
+        for i, station_id in enumerate(station_ids):
+            if not valid[i]:
+                STATION_OBSERVATIONS.inc('invalid')
+                continue
+            level, probability = levels[i], float(probabilities[i])
+            previous = self.levels.get(station_id)
+            self.levels[station_id] = (level, probability)
+            # A station's first score sets its baseline
+            if previous is not None and previous[0] != level:
+                alerts.append(self._alert(station_id, previous, level, probability, dirty[station_id]))
+        return alerts
+
+    def _score(self, records):
+        validated = self.predictor.validate_batch(records)
+        return self.predictor.predict_proba_columns(validated.columns), validated.valid.tolist()
+
+    def _alert(self, station_id, previous, level, probability, observed_at):
+        now = time.time()
+        lag = max(now - observed_at, 0.0)
+        direction = 'up' if level > previous[0] else 'down'
+        alert = {
+            "station_id": station_id,
+            "previous_level": RISK_LEVELS[previous[0]],
+            "risk_level": RISK_LEVELS[level],
+            "direction": direction,
+            "previous_probability": previous[1],
+            "probability": probability,
+            "observed_at": observed_at,
+            "alerted_at": now,
+            "lag_seconds": lag
+        }
+        self.alerts += 1
+        self.lags.append(lag)
+        STATION_ALERTS.inc(direction)
+        STATION_ALERT_LAG.observe(lag)
+        logger.info(f"🚨 {station_id}: {alert['previous_level']} -> {alert['risk_level']} "
+                    f"(p={probability:.3f}, lag {lag * 1000:.0f} ms)")
+        if self.broker is not None:
+            self.broker.publish('alert', alert)
+        if self.on_alert is not None:
+            try:
+                self.on_alert(alert)
+            except Exception as e:
+                logger.error(f"Alert callback failed: {str(e)}")
+        return alert
+
+    def lag_percentiles(self):
+        """p50/p95/max observation-to-alert lag in seconds, None without alerts"""
+        if not self.lags:
+            return None
+        lags = sorted(self.lags)
+        pick = lambda q: lags[min(int(q * len(lags)), len(lags) - 1)]
+        return {"p50": pick(0.5), "p95": pick(0.95), "max": lags[-1]}
+
+    def get_status(self):
+        """Counters for status endpoints"""
+        return {
+            "stations": len(self.stations),
+            "observations": self.observations,
+            "pending": len(self._dirty),
+            "passes": self.passes,
+            "rescored": self.rescored,
+            "alerts": self.alerts,
+            "alert_lag_seconds": self.lag_percentiles(),
+            "running": self._thread is not None and self._thread.is_alive()
+        }
+
+    def start(self):
+        """Run the monitor on its own event loop in a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run_thread, name="station-monitor", daemon=True)
+        self._thread.start()
+
+    def _run_thread(self):
+        try:
+            asyncio.run(self.run())
+        except Exception as e:
+            logger.error(f"Station monitor stopped: {str(e)}")
+
+
+def monitor_from_env(predictor, broker=None):
+    """Monitor tailing PYROCAST_STATION_FEED, or None when it is not set"""
+    path = os.environ.get('PYROCAST_STATION_FEED')
+    if not path:
+        return None
+    interval = float(os.environ.get('PYROCAST_STATION_INTERVAL', 0.25))
+    return StationMonitor(predictor, FileTailSource(path), interval=interval, broker=broker)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rescore stations continuously from an observation feed")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--simulate', action='store_true', help="Use a simulated feed")
+    source.add_argument('--tail', help="JSON-lines file to follow")
+    parser.add_argument('--stations', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=2000.0, help="Simulated observations per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds of simulated feed")
+    parser.add_argument('--interval', type=float, default=0.25, help="Seconds between scoring passes")
+    parser.add_argument('--model', default="../pyro_cast_ai_model.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from simple_predict import SimpleWildfirePredictionService
+    predictor = SimpleWildfirePredictionService(args.model)
+
+    if args.simulate:
+        feed = SimulatedSource(args.stations, args.rate, limit=int(args.rate * args.duration))
+    else:
+        feed = FileTailSource(args.tail)
+    monitor = StationMonitor(predictor, feed, interval=args.interval)
+
+    start = time.perf_counter()
+    try:
+        asyncio.run(monitor.run())
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.perf_counter() - start
+
+    status = monitor.get_status()
+    print(f"📡 {status['observations']} observations from {status['stations']} stations in {elapsed:.1f}s")
+    print(f"🔁 {status['passes']} passes rescored {status['rescored']} stations "
+          f"({status['observations'] / max(status['rescored'], 1):.1f} observations coalesced per score)")
+    lags = status['alert_lag_seconds']
+    if lags:
+        print(f"🚨 {status['alerts']} alerts, lag p50 {lags['p50'] * 1000:.0f} ms, "
+              f"p95 {lags['p95'] * 1000:.0f} ms, max {lags['max'] * 1000:.0f} ms")
+    else:
+        print("🚨 No alerts")
+
+
+if __name__ == "__main__":
+    main()
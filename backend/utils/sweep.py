@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+What-if sensitivity sweeps over one or two input features
+
+A sweep fixes a base condition and varies one or two features over a range,
+e.g. "humidity from 10 to 60 in steps of 5, at each temperature from 20 to
+40". The whole 1D or 2D grid is scored in one vectorized model evaluation.
+For models with weights, the response also carries each feature's marginal
+contribution (weight times normalized value) along the swept axes and at the
+base, so a UI can draw sensitivity curves from a single request.
+
+Configuration (environment):
+    PYROCAST_MAX_SWEEP_CELLS    largest grid one sweep may request (40000)
+"""
+import math
+import os
+
+import numpy as np
+
+from simple_predict import RISK_LEVELS
+
+MAX_SWEEP_AXES = 2
+
+
+def max_sweep_cells():
+    return int(os.environ.get('PYROCAST_MAX_SWEEP_CELLS', 40000))
+
+
+def parse_axis(predictor, spec, max_cells):
+    """
+    Resolve one axis specification to a model feature and its values
+
+    Args:
+        predictor: SimpleWildfirePredictionService
+        spec: {"feature": name, "start": x, "stop": y, "step": z} or
+            {"feature": name, "values": [...]}; the stop is inclusive
+        max_cells: Upper bound on the number of values
+
+    Returns:
+        (feature, numpy array of values)
+    """
+    if not isinstance(spec, dict) or 'feature' not in spec:
+        raise ValueError("Each sweep axis needs a 'feature'")
+    feature = predictor.resolve_feature(spec['feature'])
+    if feature is None:
+        raise ValueError(f"Unknown feature '{spec['feature']}'")
+
+    if 'values' in spec:
+        values = spec['values']
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"{feature}: 'values' must be a non-empty list")
+    else:
+        try:
+            start, stop, step = float(spec['start']), float(spec['stop']), float(spec['step'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{feature}: give numeric 'start', 'stop' and 'step', or 'values'")
+        if not step > 0 or not stop >= start:
+            raise ValueError(f"{feature}: 'step' must be positive and 'stop' at least 'start'")
+        count = math.floor((stop - start) / step + 1e-9) + 1
+        if count > max_cells:
+            raise ValueError(f"{feature}: {count} values exceed the limit of {max_cells}")
+        values = (start + step * np.arange(count)).tolist()
+
+    if len(values) > max_cells:
+        raise ValueError(f"{feature}: {len(values)} values exceed the limit of {max_cells}")
+    schema = predictor.batch_schema
+    values, codes = schema.validate_column(feature, values)
+    bad = np.flatnonzero(codes)
+    if len(bad):
+        raise ValueError(schema.describe(int(codes[bad[0]]), schema.features.index(feature)))
+    return feature, values
+
+
+def run_sweep(predictor, base, axis_specs, max_cells=None):
+    """
+    Score a 1D or 2D grid of conditions around a base condition
+
+    Args:
+        predictor: SimpleWildfirePredictionService
+        base: Base condition, a record as accepted by /predict
+        axis_specs: One or two axis specifications (see parse_axis)
+        max_cells: Largest allowed grid; defaults to PYROCAST_MAX_SWEEP_CELLS
+
+    Returns:
+        JSON-ready dict with the axes, the probability and risk level grids
+        (indexed [first axis][second axis]) and the contributions
+    """
+    max_cells = max_cells or max_sweep_cells()
+    if not isinstance(axis_specs, list) or not 1 <= len(axis_specs) <= MAX_SWEEP_AXES:
+        raise ValueError(f"'sweep' must list 1 to {MAX_SWEEP_AXES} axes")
+
+    axes = [parse_axis(predictor, spec, max_cells) for spec in axis_specs]
+    swept = [feature for feature, _ in axes]
+    if len(set(swept)) != len(swept):
+        raise ValueError("Each feature can be swept only once")
+    shape = tuple(len(values) for _, values in axes)
+    n_cells = int(np.prod(shape))
+    if n_cells > max_cells:
+        raise ValueError(f"Sweep grid of {n_cells} cells exceeds the limit of {max_cells}")
+
+    validated = predictor.validate_batch([base or {}])
+    if not validated.valid[0]:
+        raise ValueError(validated.errors()[0]['error'])
+    base_values = {feature: float(column[0]) for feature, column in validated.columns.items()}
+
+    # One row per grid cell: base values everywhere, swept features varying
+    grids = np.meshgrid(*[values for _, values in axes], indexing='ij')
+    columns = {feature: np.full(n_cells, value) for feature, value in base_values.items()}
+    for (feature, _), grid in zip(axes, grids):
+        columns[feature] = grid.ravel()
+
+    probabilities = predictor.predict_proba_columns(columns)
+    risk_levels = np.asarray(RISK_LEVELS, dtype=object)[predictor.get_risk_levels(probabilities)]
+    base_probability = float(predictor.predict_proba_columns(
+        {feature: [value] for feature, value in base_values.items()}
+    )[0])
+
+    contributions = None
+    base_terms = predictor.feature_contributions({feature: [value] for feature, value in base_values.items()})
+    if base_terms is not None:
+        axis_terms = predictor.feature_contributions({feature: values for feature, values in axes})
+        contributions = {
+            'intercept': base_terms['intercept'],
+            'base': {feature: float(term[0]) for feature, term in base_terms.items() if feature != 'intercept'},
+            # Location axes have no term of their own; their effect is in
+            # the context features
+            'axes': {feature: axis_terms[feature].tolist() for feature in swept if feature in axis_terms}
+        }
+
+    return {
+        'features': swept,
+        'axes': {feature: values.tolist() for feature, values in axes},
+        'shape': list(shape),
+        'probabilities': probabilities.reshape(shape).tolist(),
+        'risk_levels': risk_levels.reshape(shape).tolist(),
+        'base': base_values,
+        'base_probability': base_probability,
+        'contributions': contributions,
+        'model_used': predictor.model_data.get('model_type', 'SimpleLogisticRegression'),
+        'model_version': predictor.model_version
+    }
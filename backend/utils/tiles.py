@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Offline z/x/y risk tile pyramid for the map
+
+The build scores the dataset with the current model, then for each zoom
+level bins every point into Web Mercator tiles of 256x256 pixels. Each bin
+is bin_px pixels square and keeps the highest fire probability in it. Tiles
+are rendered as RGBA PNGs colored by risk level (transparent where there are
+no points), on a process pool.
+
+Builds are incremental. The manifest records a hash of every tile's binned
+content, and a rebuild only renders tiles whose hash changed. A change in
+data or model therefore only touches the tiles it affects.
+
+Tile files are content addressed (<z>/<x>/<y>.<hash>.png) and never
+rewritten: a build writes new files next to the old ones, then swaps the
+manifest. Files the previous build replaced or dropped are kept for one
+more build, so requests still resolving the old manifest find them, and
+deleted by the build after.
+
+Tiles are served by the API under a versioned URL,
+/tiles/<version>/<z>/<x>/<y>.png. The version changes whenever any tile
+does, so responses can be cached as immutable.
+
+Usage:
+    python utils/tiles.py [--min-zoom 0] [--max-zoom 6] [--workers 4] [--force]
+
+Configuration (environment):
+    PYROCAST_TILE_DIR    output directory (backend/data/tiles)
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TILE_ROOT = Path(__file__).parent.parent / "data" / "tiles"
+TILE_SIZE = 256
+MAX_LATITUDE = 85.0511287798
+# Bumped when the rendering changes, so every tile is rebuilt
+RENDER_VERSION = 1
+TILE_ALPHA = 200
+
+
+def tile_root():
+    return Path(os.environ.get('PYROCAST_TILE_DIR', DEFAULT_TILE_ROOT))
+
+
+def mercator_pixels(lat, lon, zoom):
+    """Global pixel coordinates of points at a zoom level"""
+    world = TILE_SIZE * (1 << zoom)
+    lat = np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lon) + 180.0) / 360.0 * world
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * world
+    return np.clip(x, 0, world - 1e-6), np.clip(y, 0, world - 1e-6)
+
+
+def bin_points(lat, lon, levels, zoom, bin_px):
+    """
+    Highest quantized probability per occupied bin at one zoom level
+
+    Args:
+        lat, lon: Point coordinates in degrees
+        levels: uint8 probability * 254 per point
+        zoom: Zoom level
+        bin_px: Bin size in pixels; must divide TILE_SIZE
+
+    Returns:
+        Dict of (x, y) tile -> (local bin indices, uint8 values), both
+        sorted by bin index
+    """
+    bins_per_tile = TILE_SIZE // bin_px
+    px, py = mercator_pixels(lat, lon, zoom)
+    gx = (px // bin_px).astype(np.int64)
+    gy = (py // bin_px).astype(np.int64)
+
+    # Order bins tile by tile, then by local index within the tile
+    tile_id = (gy // bins_per_tile) * (1 << zoom) + gx // bins_per_tile
+    local = (gy % bins_per_tile) * bins_per_tile + gx % bins_per_tile
+    key = tile_id * (bins_per_tile * bins_per_tile) + local
+    order = np.argsort(key, kind='stable')
+    key, values = key[order], levels[order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    bin_keys = key[starts]
+    bin_values = np.maximum.reduceat(values, starts) if len(starts) else values
+
+    tiles = {}
+    bin_tiles = bin_keys // (bins_per_tile * bins_per_tile)
+    tile_starts = np.flatnonzero(np.r_[True, bin_tiles[1:] != bin_tiles[:-1]]) if len(bin_tiles) else []
+    bounds = list(tile_starts) + [len(bin_tiles)]
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        tile = int(bin_tiles[begin])
+        y, x = divmod(tile, 1 << zoom)
+        tiles[(x, y)] = (
+            (bin_keys[begin:end] % (bins_per_tile * bins_per_tile)).astype(np.uint16),
+            bin_values[begin:end].astype(np.uint8)
+        )
+    return tiles
+
+
+def tile_hash(local, values, bin_px):
+    digest = hashlib.sha1(struct.pack('<BH', RENDER_VERSION, bin_px))
+    digest.update(local.tobytes())
+    digest.update(values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def encode_png(rgba):
+    """Minimal RGBA PNG encoder (no Pillow needed)"""
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)) + chunk(b'IEND', b''))
+
+
+def render_tile(local, values, bin_px, palette, thresholds):
+    """
+    RGBA pixels of one tile
+
+    Args:
+        local: Local bin indices within the tile
+        values: uint8 probability * 254 per bin
+        bin_px: Bin size in pixels
+        palette: uint8 array (levels, 3) of RGB colors per risk level
+        thresholds: Probability cut points between risk levels
+    """
+    bins_per_tile = TILE_SIZE // bin_px
+    grid = np.zeros((bins_per_tile * bins_per_tile, 4), dtype=np.uint8)
+    level = np.searchsorted(thresholds, values / 254.0, side='right')
+    grid[local, :3] = palette[level]
+    grid[local, 3] = TILE_ALPHA
+    grid = grid.reshape(bins_per_tile, bins_per_tile, 4)
+    return np.repeat(np.repeat(grid, bin_px, axis=0), bin_px, axis=1)
+
+
+def _render_job(job):
+    """Process pool task: render one tile and write it atomically"""
+    path, local, values, bin_px, palette, thresholds = job
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.png.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_png(render_tile(local, values, bin_px, palette, thresholds)))
+    os.replace(tmp_path, path)
+    return str(path)
+
+
+def tile_file(root, name, digest):
+    """Content-addressed path of a tile, e.g. root/3/4/2.<digest>.png"""
+    return Path(root) / f"{name}.{digest}.png"
+
+
+def load_manifest(root):
+    try:
+        with open(root / "manifest.json") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _hex_to_rgb(color):
+    return [int(color[i:i + 2], 16) for i in (1, 3, 5)]
+
+
+def build_tiles(data_service, predictor, root=None, min_zoom=0, max_zoom=6, bin_px=4,
+                workers=None, force=False):
+    """
+    Build or update the tile pyramid
+
+    Args:
+        data_service: WildfireDataService with the dataset
+        predictor: SimpleWildfirePredictionService used for scoring
+        root: Output directory; defaults to PYROCAST_TILE_DIR
+        min_zoom, max_zoom: Zoom levels to build, inclusive
+        bin_px: Aggregation bin size in pixels
+        workers: Render processes; defaults to the CPU count
+        force: Render every tile even if unchanged
+
+    Returns:
+        The new manifest
+    """
+    from data_service import MODEL_PROBABILITY_COLUMN, RISK_COLORS
+    from risk_scoring import RiskScoringJob
+    from simple_predict import RISK_LEVELS, RISK_THRESHOLDS
+
+    if TILE_SIZE % bin_px:
+        raise ValueError(f"bin_px must divide {TILE_SIZE}")
+    root = Path(root or tile_root())
+    root.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+
+    RiskScoringJob(data_service, predictor).run()
+    df = data_service.df
+    lat = df['lat'].to_numpy(dtype=np.float64)
+    lon = df['lon'].to_numpy(dtype=np.float64)
+    probabilities = df[MODEL_PROBABILITY_COLUMN].to_numpy(dtype=np.float64)
+    valid = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(probabilities)
+    lat, lon = lat[valid], lon[valid]
+    levels = np.rint(probabilities[valid] * 254).astype(np.uint8)
+
+    previous = load_manifest(root) or {}
+    old_tiles = previous.get('tiles', {})
+    palette = np.array([_hex_to_rgb(RISK_COLORS[level]) for level in RISK_LEVELS], dtype=np.uint8)
+    thresholds = np.asarray(RISK_THRESHOLDS)
+
+    tiles = {}
+    jobs = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        for (x, y), (local, values) in bin_points(lat, lon, levels, zoom, bin_px).items():
+            name = f"{zoom}/{x}/{y}"
+            tiles[name] = tile_hash(local, values, bin_px)
+            path = tile_file(root, name, tiles[name])
+            if force or not path.exists():
+                jobs.append((str(path), local, values, bin_px, palette, thresholds))
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            for _ in executor.map(_render_job, jobs, chunksize=16):
+                pass
+
+    # Tiles of the previous version that this one no longer serves
+    retired = {name: digest for name, digest in old_tiles.items() if tiles.get(name) != digest}
+    removed = sum(1 for name in old_tiles if name not in tiles)
+
+    version_hash = hashlib.sha1(json.dumps(tiles, sort_keys=True).encode('utf-8'))
+    manifest = {
+        'version': version_hash.hexdigest()[:12],
+        'model_version': predictor.model_version,
+        'rows': int(valid.sum()),
+        'min_zoom': min_zoom,
+        'max_zoom': max_zoom,
+        'tile_size': TILE_SIZE,
+        'bin_px': bin_px,
+        'built_at': time.time(),
+        'tiles': tiles,
+        'retired': retired
+    }
+    tmp_path = root / "manifest.json.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, root / "manifest.json")
+
+    # Files retired by the previous build are no longer in any manifest
+    for name, digest in previous.get('retired', {}).items():
+        if tiles.get(name) != digest:
+            tile_file(root, name, digest).unlink(missing_ok=True)
+
+    logger.info(
+        f"✅ Tiles {manifest['version']}: {len(jobs)} rendered, "
+        f"{len(tiles) - len(jobs)} unchanged, {removed} removed "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return manifest
+
+
+class TileStore:
+    """Read side of the tile pyramid for the API"""
+
+    # An empty transparent tile, served where the pyramid has no tile
+    EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+    def __init__(self, root=None):
+        self.root = Path(root or tile_root())
+        self._manifest = None
+        self._manifest_mtime = None
+
+    def manifest(self):
+        """Current manifest, reloaded when the build replaces it"""
+        try:
+            mtime = (self.root / "manifest.json").stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._manifest_mtime:
+            self._manifest = load_manifest(self.root)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def tile_path(self, z, x, y, manifest=None):
+        """Path of a built tile, or None if the pyramid has none there"""
+        manifest = manifest or self.manifest()
+        name = f"{z}/{x}/{y}"
+        if manifest is None or name not in manifest['tiles']:
+            return None
+        return tile_file(self.root, name, manifest['tiles'][name])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the z/x/y risk tile pyramid")
+    parser.add_argument('--min-zoom', type=int, default=0)
+    parser.add_argument('--max-zoom', type=int, default=6)
+    parser.add_argument('--bin-px', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None, help="Tile directory (default PYROCAST_TILE_DIR)")
+    parser.add_argument('--force', action='store_true', help="Re-render unchanged tiles")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from data_service import data_service
+    from simple_predict import SimpleWildfirePredictionService
+
+    manifest = build_tiles(
+        data_service, SimpleWildfirePredictionService(), root=args.output,
+        min_zoom=args.min_zoom, max_zoom=args.max_zoom, bin_px=args.bin_px,
+        workers=args.workers, force=args.force
+    )
+    print(f"🗺️  Tile pyramid {manifest['version']} with {len(manifest['tiles'])} tiles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Gradient-boosted tree inference without the training library
+
+Trees are trained offline (see boosted_model.py) and exported to a flat,
+array-based format stored in the model JSON:
+
+    "trees": {
+        "roots":        [node index of each tree's root],
+        "feature":      [feature index per node, -1 for leaves],
+        "threshold":    [split value per node],
+        "left":         [child taken when value < threshold],
+        "right":        [child taken otherwise],
+        "default_left": [1 if missing values go left, else 0],
+        "value":        [leaf value per node, 0 for splits]
+    },
+    "base_score": margin added to the sum of leaf values,
+    "max_depth":  depth of the deepest tree
+
+Nodes of all trees share one set of arrays. Evaluation walks every tree for
+a whole batch at once, one level per step: each (row, tree) pair holds its
+current node, and a step gathers the split feature value, compares it with
+the threshold and moves to a child. On load the nodes are renumbered so the
+two children of a split are adjacent, which makes a step
+"node = first_child + (value >= threshold)". Leaves point to themselves
+with a NaN threshold, so after max_depth steps every pair sits on its leaf.
+Rows are processed in chunks that keep the (rows x trees) working arrays in
+cache.
+"""
+import numpy as np
+
+# Rows x trees evaluated per pass
+CHUNK_CELLS = 1 << 17
+
+TREE_ARRAYS = ('feature', 'threshold', 'left', 'right', 'default_left', 'value')
+
+
+class TreeEnsemble:
+    """
+    Flat-array tree ensemble with vectorized batch evaluation
+
+    Args:
+        roots: Root node index of each tree
+        feature: Split feature index per node, -1 for leaves
+        threshold: Split threshold per node
+        left, right: Child node indices
+        default_left: Whether missing values go to the left child
+        value: Leaf value per node
+        base_score: Margin added to the summed leaf values
+        max_depth: Depth of the deepest tree; computed when not given
+    """
+
+    def __init__(self, roots, feature, threshold, left, right, default_left, value,
+                 base_score=0.0, max_depth=None):
+        feature = np.asarray(feature, dtype=np.int32)
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        is_leaf = feature < 0
+
+        # Renumber nodes tree by tree so each split's children sit side by side
+        order = []
+        first_child = {}
+        new_roots = []
+        for root in np.asarray(roots, dtype=np.int64).tolist():
+            new_roots.append(len(order))
+            order.append(root)
+            queue = [root]
+            while queue:
+                node = queue.pop()
+                if is_leaf[node]:
+                    continue
+                first_child[node] = len(order)
+                order.extend((int(left[node]), int(right[node])))
+                queue.extend((int(left[node]), int(right[node])))
+                if len(order) > len(feature):
+                    raise ValueError("Tree model nodes are shared or cyclic")
+        order = np.asarray(order, dtype=np.int64)
+        new_ids = np.arange(len(order), dtype=np.int32)
+
+        self.roots = np.asarray(new_roots, dtype=np.int32)
+        self.is_leaf = is_leaf[order]
+        # Leaves keep a valid column index and loop back to themselves
+        self.feature = np.where(self.is_leaf, 0, feature[order]).astype(np.intp)
+        self.first_child = np.array([first_child.get(old, new) for old, new in zip(order.tolist(), new_ids.tolist())],
+                                    dtype=np.int32)
+        # Split values are compared in float32, as the trainer does; NaN
+        # makes every comparison at a leaf false
+        self.threshold = np.where(self.is_leaf, np.nan, np.asarray(threshold, dtype=np.float32)[order]).astype(np.float32)
+        self.default_right = ~np.asarray(default_left, dtype=bool)[order] & ~self.is_leaf
+        self.value = np.where(self.is_leaf, np.asarray(value, dtype=np.float64)[order], 0.0)
+        self.base_score = float(base_score)
+        self.max_depth = int(max_depth) if max_depth is not None else self._depth()
+
+    @classmethod
+    def from_model_data(cls, model_data):
+        """Build the engine from a loaded model JSON dict"""
+        trees = model_data['trees']
+        missing = [name for name in ('roots',) + TREE_ARRAYS if name not in trees]
+        if missing:
+            raise ValueError(f"Tree model is missing arrays: {', '.join(missing)}")
+        lengths = {len(trees[name]) for name in TREE_ARRAYS}
+        if len(lengths) != 1:
+            raise ValueError("Tree model arrays differ in length")
+        return cls(
+            trees['roots'], *(trees[name] for name in TREE_ARRAYS),
+            base_score=model_data.get('base_score', 0.0),
+            max_depth=model_data.get('max_depth')
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def _depth(self):
+        """Depth of the deepest tree, by walking all roots level by level"""
+        depth = 0
+        frontier = self.roots[~self.is_leaf[self.roots]]
+        while len(frontier):
+            depth += 1
+            frontier = np.concatenate([self.first_child[frontier], self.first_child[frontier] + 1])
+            frontier = frontier[~self.is_leaf[frontier]]
+        return depth
+
+    def predict_margin(self, matrix):
+        """
+        Raw ensemble output (base score plus leaf values) per row
+
+        Args:
+            matrix: 2-D array of shape (rows, features), in model feature
+                order; NaN values follow each split's default direction
+
+        Returns:
+            numpy float64 array of margins
+        """
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        n_rows, n_features = matrix.shape
+        margins = np.empty(n_rows, dtype=np.float64)
+        has_missing = bool(np.isnan(matrix).any())
+        chunk_rows = max(1, CHUNK_CELLS // max(self.n_trees, 1))
+
+        for begin in range(0, n_rows, chunk_rows):
+            end = min(begin + chunk_rows, n_rows)
+            flat = matrix[begin:end].ravel()
+            row_offsets = (np.arange(end - begin, dtype=np.intp) * n_features)[:, None]
+            nodes = np.broadcast_to(self.roots, (end - begin, self.n_trees))
+
+            for _ in range(self.max_depth):
+                values = flat[row_offsets + self.feature[nodes]]
+                go_right = values >= self.threshold[nodes]
+                if has_missing:
+                    go_right |= np.isnan(values) & self.default_right[nodes]
+                nodes = self.first_child[nodes] + go_right
+
+            margins[begin:end] = self.value[nodes].sum(axis=1)
+        margins += self.base_score
+        return margins
+
+    def predict_proba(self, matrix):
+        """Probability of the positive class per row (logistic link)"""
+        margins = self.predict_margin(matrix)
+        np.clip(margins, -250, 250, out=margins)
+        return 1.0 / (1.0 + np.exp(-margins))
+
+    def to_dict(self):
+        """The flat 'trees' arrays in the model JSON format"""
+        return {
+            'roots': self.roots.tolist(),
+            'feature': np.where(self.is_leaf, -1, self.feature).tolist(),
+            'threshold': np.where(self.is_leaf, 0.0, self.threshold.astype(np.float64)).tolist(),
+            'left': np.where(self.is_leaf, -1, self.first_child).tolist(),
+            'right': np.where(self.is_leaf, -1, self.first_child + 1).tolist(),
+            'default_left': (~self.default_right & ~self.is_leaf).astype(int).tolist(),
+            'value': self.value.tolist()
+        }
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Columnwise validation of prediction input batches
+
+A BatchSchema is compiled once from the model's feature list, the accepted
+field aliases, defaults and valid ranges. validate() then checks a whole
+batch one feature column at a time: every value is classified by type,
+numeric strings are parsed, and NaN/infinity and range checks run as numpy
+array operations. Bad rows come back as per-row error codes rather than
+exceptions, so one malformed record costs no more than a valid one.
+
+Missing features are not an error; they take the feature default, as in the
+single-row prediction path.
+"""
+import numbers
+import re
+
+import numpy as np
+
+# Per-row error codes; the index is the code stored in ValidationResult.codes
+VALID = 0
+NOT_AN_OBJECT = 1
+INVALID_TYPE = 2
+NOT_FINITE = 3
+OUT_OF_RANGE = 4
+ERROR_CODES = ('valid', 'not_an_object', 'invalid_type', 'not_finite', 'out_of_range')
+
+# Value kinds assigned by type before any conversion
+_NUMBER = 0
+_STRING = 1
+_MISSING_KIND = 2
+_INVALID = 3
+_OTHER = 4
+
+# bool is an int subclass but true/false is not a measurement
+_TYPE_KINDS = {int: _NUMBER, float: _NUMBER, str: _STRING, bool: _INVALID}
+
+_NUMBER_RE = re.compile(r'\s*[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?\s*')
+
+_MISSING = object()
+_NO_FIELDS = {}
+
+
+def _to_float64(items):
+    """float64 array of numbers or numeric strings; huge ints become inf"""
+    try:
+        return np.array(items, dtype=np.float64)
+    except OverflowError:
+        return np.array([
+            item if type(item) is not int or abs(item) < 2 ** 1023 else (np.inf if item > 0 else -np.inf)
+            for item in items
+        ], dtype=np.float64)
+
+
+class ValidationResult:
+    """
+    Outcome of validating a batch
+
+    Attributes:
+        columns: Feature name -> float64 array of raw values; missing and
+            invalid entries hold the feature default
+        codes: uint8 array with one error code per row (VALID if usable)
+        fields: int array with the index of the first failing feature per
+            row, -1 for valid rows and rows that are not objects
+    """
+
+    def __init__(self, schema, columns, codes, fields):
+        self.schema = schema
+        self.columns = columns
+        self.codes = codes
+        self.fields = fields
+
+    @property
+    def valid(self):
+        return self.codes == VALID
+
+    def errors(self):
+        """
+        Error details for the invalid rows only
+
+        Returns:
+            Dict of row index -> {'error': message, 'error_code': name}
+        """
+        errors = {}
+        for i in np.flatnonzero(self.codes).tolist():
+            code = int(self.codes[i])
+            errors[i] = {
+                'error': self.schema.describe(code, int(self.fields[i])),
+                'error_code': ERROR_CODES[code]
+            }
+        return errors
+
+
+class BatchSchema:
+    """
+    Validation rules compiled from a model's features
+
+    Args:
+        features: Model feature names, in model order
+        aliases: Feature name -> alternative request field names
+        defaults: Feature name -> value used when the field is absent
+        ranges: Feature name -> (low, high); either bound may be None
+    """
+
+    def __init__(self, features, aliases=None, defaults=None, ranges=None):
+        aliases = aliases or {}
+        defaults = defaults or {}
+        ranges = ranges or {}
+        self.features = list(features)
+        # Lookup order per feature: its own name, then aliases, without repeats
+        self.keys = [
+            tuple(dict.fromkeys([feature] + list(aliases.get(feature, []))))
+            for feature in self.features
+        ]
+        self.defaults = [float(defaults.get(feature, 0.0)) for feature in self.features]
+        self.ranges = [ranges.get(feature, (None, None)) for feature in self.features]
+
+    def validate(self, records):
+        """
+        Validate and convert a list of input records
+
+        Args:
+            records: Decoded JSON records, normally dicts
+
+        Returns:
+            ValidationResult
+        """
+        n_rows = len(records)
+        is_object = np.fromiter((type(r) is dict for r in records), dtype=bool, count=n_rows)
+        rows = records if is_object.all() else [r if type(r) is dict else _NO_FIELDS for r in records]
+
+        codes = np.where(is_object, VALID, NOT_AN_OBJECT).astype(np.uint8)
+        fields = np.full(n_rows, -1, dtype=np.int64)
+        columns = {}
+        for j, feature in enumerate(self.features):
+            values, feature_codes = self._convert(self._gather(rows, self.keys[j]), j)
+
+            # Only the first failing feature of a row is reported
+            first = (codes == VALID) & (feature_codes != VALID)
+            codes[first] = feature_codes[first]
+            fields[first] = j
+            columns[feature] = values
+
+        invalid = codes != VALID
+        if invalid.any():
+            for j, feature in enumerate(self.features):
+                columns[feature][invalid] = self.defaults[j]
+        return ValidationResult(self, columns, codes, fields)
+
+    def validate_column(self, feature, values):
+        """
+        Check raw values for one feature
+
+        Returns:
+            (float64 values, uint8 error codes)
+        """
+        return self._convert(list(values), self.features.index(feature))
+
+    def _gather(self, rows, keys):
+        """Field values for one feature, trying aliases only where needed"""
+        raw = [row.get(keys[0], _MISSING) for row in rows]
+        for key in keys[1:]:
+            missing = [i for i, value in enumerate(raw) if value is _MISSING]
+            if not missing:
+                break
+            for i in missing:
+                raw[i] = rows[i].get(key, _MISSING)
+        return raw
+
+    def _convert(self, raw, j):
+        """
+        Convert one raw column to float64 and error codes
+
+        Returns:
+            (values, codes) arrays
+        """
+        n_rows = len(raw)
+        kinds = np.fromiter(
+            (_TYPE_KINDS.get(type(value), _MISSING_KIND if value is _MISSING else _OTHER) for value in raw),
+            dtype=np.int8, count=n_rows
+        )
+        codes = np.zeros(n_rows, dtype=np.uint8)
+
+        # numpy scalars, Decimal and the like: accept any real number
+        for i in np.flatnonzero(kinds == _OTHER).tolist():
+            value = raw[i]
+            kinds[i] = _NUMBER if isinstance(value, numbers.Real) and not isinstance(value, bool) else _INVALID
+
+        # Strings are accepted when they spell a plain decimal number
+        for i in np.flatnonzero(kinds == _STRING).tolist():
+            if not _NUMBER_RE.fullmatch(raw[i]):
+                kinds[i] = _INVALID
+
+        if (kinds == _NUMBER).all():
+            values = _to_float64(raw)
+        else:
+            values = np.full(n_rows, self.defaults[j], dtype=np.float64)
+            convertible = np.flatnonzero((kinds == _NUMBER) | (kinds == _STRING))
+            if len(convertible):
+                values[convertible] = _to_float64([raw[i] for i in convertible.tolist()])
+            codes[kinds == _INVALID] = INVALID_TYPE
+
+        present = (kinds == _NUMBER) | (kinds == _STRING)
+        codes[present & ~np.isfinite(values)] = NOT_FINITE
+
+        low, high = self.ranges[j]
+        checked = present & (codes == VALID)
+        if low is not None:
+            codes[checked & (values < low)] = OUT_OF_RANGE
+        if high is not None:
+            codes[checked & (values > high)] = OUT_OF_RANGE
+        return values, codes
+
+    def describe(self, code, field):
+        """Human readable message for an error code"""
+        if code == NOT_AN_OBJECT:
+            return "record must be a JSON object"
+        feature = self.features[field]
+        if code == INVALID_TYPE:
+            return f"{feature}: expected a number"
+        if code == NOT_FINITE:
+            return f"{feature}: value must be finite"
+        low, high = self.ranges[field]
+        bounds = f"[{'-inf' if low is None else low}, {'inf' if high is None else high}]"
+        return f"{feature}: value out of range {bounds}"
@@ -12,47 +12,106 @@ L.Icon.Default.mergeOptions({
   shadowUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.7.1/images/marker-shadow.png',
 })
 
+// The map shows a readable subset of the sampled points; live updates
+// recolor those and add new points only while there is room
+const MAX_MAP_POINTS = 15
+
 const FireMap = () => {
   const [fireData, setFireData] = useState([])
   const [geoData, setGeoData] = useState(null)
   const [loading, setLoading] = useState(true)
   const [dataStats, setDataStats] = useState(null)
+  const [tileVersion, setTileVersion] = useState(null)
 
   useEffect(() => {
     fetchRealGeographicalData()
+    fetchTileManifest()
+
+    // Risk updates pushed by the backend: recolor changed points and add
+    // new ones; refetch when the dataset was replaced or updates were missed
+    const events = new EventSource('http://localhost:5001/stream?topics=risk')
+    events.addEventListener('risk', (event) => {
+      const delta = JSON.parse(event.data)
+      if (delta.reload || delta.truncated) {
+        fetchRealGeographicalData()
+        return
+      }
+      const changed = new Map(delta.changed_points.map(point => [point.id, point]))
+      setFireData(points => [
+        ...points.map(point => {
+          const update = changed.get(point.sourceId)
+          return update
+            ? { ...point, riskLevel: update.risk_level, probability: update.fire_probability }
+            : point
+        }),
+        ...delta.new_points
+          .slice(0, Math.max(0, MAX_MAP_POINTS - points.length))
+          .map((location, index) => toMapPoint(location, points.length + index))
+      ])
+    })
+    events.addEventListener('resync', () => fetchRealGeographicalData())
+    return () => events.close()
   }, [])
 
+  // Points from the data service carry lat/lon and a stable id
+  const toMapPoint = (location, index) => ({
+    id: index + 1,
+    sourceId: location.id,
+    lat: location.lat,
+    lon: location.lon,
+    location: `Fire Point ${index + 1}`,
+    riskLevel: location.risk_level || getRiskLevelFromCoordinates(location.lat, location.lon),
+    probability: location.fire_probability || Math.random() * 0.7 + 0.2,
+    temperature: location.temperature || (25 + Math.random() * 20),
+    humidity: location.humidity || (20 + Math.random() * 60),
+    windSpeed: location.wind_speed || (5 + Math.random() * 25),
+    incidents: location.incident_count || Math.floor(Math.random() * 50) + 1
+  })
+
+  // Pre-rendered risk tiles, if the offline build has run; the versioned
+  // URL lets the browser cache tiles until the pyramid changes
+  const fetchTileManifest = async () => {
+    try {
+      const res = await fetch('http://localhost:5000/tiles/manifest.json')
+      if (res.ok) {
+        const manifest = await res.json()
+        setTileVersion(manifest.data.version)
+      }
+    } catch (error) {
+      console.warn('Risk tiles not available:', error)
+    }
+  }
+
   const fetchRealGeographicalData = async () => {
     try {
       setLoading(true)
       
-      // Fetch real geographical data and dataset stats
-      const [geoRes, statsRes] = await Promise.all([
-        fetch('http://localhost:5000/api/geographical-data'),
-        fetch('http://localhost:5000/api/dataset-stats')
-      ])
+      // Fetch real geographical data and dataset stats in one bundled request
+      const dashboardRes = await fetch(
+        `http://localhost:5000/api/dashboard?sections=geographical-data,dataset-stats&sample_size=${MAX_MAP_POINTS}`
+      )
+      const dashboard = await dashboardRes.json()
+      const results = dashboard.success ? dashboard.data.sections : {}
 
-      const geographicalData = await geoRes.json()
-      const stats = await statsRes.json()
+      const geographicalData = results['geographical-data'] || {}
+      const stats = results['dataset-stats'] || {}
+      // The section is the plain list of sampled points
+      const locations = geographicalData.success && Array.isArray(geographicalData.data)
+        ? geographicalData.data
+        : []
 
-      if (geographicalData.success && geographicalData.data) {
-        setGeoData(geographicalData.data)
+      if (locations.length) {
+        const temperatures = locations.map(location => location.temperature).filter(Number.isFinite)
+        setGeoData({
+          unique_locations: new Set(locations.map(location => `${location.lat},${location.lon}`)).size,
+          high_risk_areas: locations.filter(location => ['High', 'Extreme'].includes(location.risk_level)).length,
+          avg_temperature: temperatures.length
+            ? temperatures.reduce((sum, value) => sum + value, 0) / temperatures.length
+            : undefined
+        })
         
         // Convert geographical data to map points with real data
-        const mapPoints = geographicalData.data.locations?.slice(0, 15).map((location, index) => ({
-          id: index + 1,
-          lat: location.latitude,
-          lon: location.longitude,
-          location: `Fire Point ${index + 1}`,
-          riskLevel: location.risk_level || getRiskLevelFromCoordinates(location.latitude, location.longitude),
-          probability: location.fire_probability || Math.random() * 0.7 + 0.2,
-          temperature: location.temperature || (25 + Math.random() * 20),
-          humidity: location.humidity || (20 + Math.random() * 60),
-          windSpeed: location.wind_speed || (5 + Math.random() * 25),
-          incidents: location.incident_count || Math.floor(Math.random() * 50) + 1
-        })) || []
-        
-        setFireData(mapPoints)
+        setFireData(locations.slice(0, MAX_MAP_POINTS).map(toMapPoint))
       }
 
       if (stats.success) {
@@ -60,7 +119,7 @@ const FireMap = () => {
       }
       
       // Fallback to sample data if API fails
-      if (!geographicalData.success || !geographicalData.data?.locations?.length) {
+      if (!locations.length) {
         setFireData(getSampleFireData())
       }
       
@@ -281,6 +340,13 @@ const FireMap = () => {
             url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
             attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
           />
+          {tileVersion && (
+            <TileLayer
+              url={`http://localhost:5000/tiles/${tileVersion}/{z}/{x}/{y}.png`}
+              maxNativeZoom={6}
+              opacity={0.7}
+            />
+          )}
           
           {fireData.map((location) => (
             <React.Fragment key={location.id}>
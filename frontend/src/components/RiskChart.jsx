@@ -14,24 +14,38 @@ const RiskChart = ({ predictionData, historicalData = [] }) => {
 
   useEffect(() => {
     fetchRealData()
+
+    // Risk updates pushed by the backend; refetch everything when the
+    // dataset was replaced or updates were missed
+    const events = new EventSource('http://localhost:5001/stream?topics=risk')
+    events.addEventListener('risk', (event) => {
+      const delta = JSON.parse(event.data)
+      if (delta.reload) {
+        fetchRealData()
+      } else {
+        setRiskDistribution(delta.risk_distribution)
+      }
+    })
+    events.addEventListener('resync', () => fetchRealData())
+    return () => events.close()
   }, [])
 
   const fetchRealData = async () => {
     try {
       setLoading(true)
       
-      // Fetch multiple data sources in parallel
-      const [trendsRes, correlationsRes, riskDistRes, outliersRes] = await Promise.all([
-        fetch('http://localhost:5000/api/historical-trends'),
-        fetch('http://localhost:5000/api/correlations'),
-        fetch('http://localhost:5000/api/risk-distribution'),
-        fetch('http://localhost:5000/api/outlier-analysis')
-      ])
+      // Fetch all chart sections in one bundled request
+      const sections = ['historical-trends', 'correlations', 'risk-distribution', 'outlier-analysis']
+      const dashboardRes = await fetch(
+        `http://localhost:5000/api/dashboard?sections=${sections.join(',')}`
+      )
+      const dashboard = await dashboardRes.json()
+      const results = dashboard.success ? dashboard.data.sections : {}
 
-      const trends = await trendsRes.json()
-      const correlationsData = await correlationsRes.json()
-      const riskDist = await riskDistRes.json()
-      const outliers = await outliersRes.json()
+      const trends = results['historical-trends'] || {}
+      const correlationsData = results['correlations'] || {}
+      const riskDist = results['risk-distribution'] || {}
+      const outliers = results['outlier-analysis'] || {}
 
       if (trends.success) setRealData(trends.data)
       if (correlationsData.success) setCorrelations(correlationsData.data)